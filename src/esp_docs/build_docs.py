@@ -33,12 +33,17 @@ import multiprocessing
 import os
 import os.path
 import re
+import shutil
 import subprocess
 import sys
+import time
 from pathlib import Path
-from .check_docs import check_docs, format_path_for_display, style_text
+from .build_scheduler import BUILD_STATS_FILE, job_id, load_build_stats, run_jobs
+from .check_docs import LiveWarningChecker, check_docs, format_path_for_display, style_text
 from .modified_files import parse_modified_files_arg
 from .check_lang_switch import run_lang_linkcheck
+from .esp_extensions.build_report import BUILD_REPORT_FMT
+from .git_info import GIT_INFO_ENV_VAR, GIT_INFO_FILE, write_git_info
 from esp_docs.constants import TARGETS
 
 LANGUAGES = ['en', 'zh_CN']
@@ -52,6 +57,13 @@ SPHINX_KNOWN_WARNINGS = 'sphinx-known-warnings.txt'
 DXG_WARN_LOG = 'doxygen-warning-log.txt'
 DXG_SANITIZED_LOG = 'doxygen-warning-log-sanitized.txt'
 DXG_KNOWN_WARNINGS = 'doxygen-known-warnings.txt'
+DOXYGEN_CACHE_DIR = 'doxygen_cache'
+# Outputs of the generators which only depend on their inputs, kept between build_docs runs
+GENERATOR_CACHE_DIR = 'generator_cache'
+
+# Report of each language/target build and summary of all the builds of a build_docs run
+BUILD_REPORT_FILE = 'build-report.json'
+BUILD_SUMMARY_FILE = 'build-summary.json'
 
 SPHINX_OUTPUT_LOG_FMT = 'sphinx-build-output-{}.txt'
 
@@ -91,6 +103,15 @@ def main():
     parser.add_argument('--input-docs', '-i', nargs='+', default=[''],
                         help='List of documents to build relative to the doc base folder, i.e. the language folder. Defaults to all documents')
     parser.add_argument('--fast-build', '-f', action='store_true', help='Skips including doxygen generated APIs into the Sphinx build')
+    parser.add_argument('--incremental-doxygen', action='store_true',
+                        help='Only run Doxygen on the headers which changed since the previous build')
+    parser.add_argument('--shared-env', action='store_true',
+                        help='Build the first target of each language first and reuse its parsed target independent documents for the other targets')
+    parser.add_argument('--index-project-paths', action='store_true',
+                        help='List the files of the project with git once per build instead of checking the path of each link role on the filesystem')
+    parser.add_argument('--profile', nargs='?', const='timers', choices=['timers', 'cprofile'],
+                        help='Time the esp-docs event handlers, directives and roles, and optionally profile them with cProfile. '
+                             'The results are written to the build directory')
     parser.add_argument('--modified-files', nargs='+', default=[],
                         help='List of modified files relative to the project path, used by smart build logic')
     parser.add_argument('--skip-reqs-check', action='store_true', help='Skips checking python requirements.txt found in the current directory (deprecated)')
@@ -99,6 +120,8 @@ def main():
 
     build_parser = action_parsers.add_parser('build', help='Build documentation')
     build_parser.add_argument('--check-warnings-only', '-w', action='store_true')
+    build_parser.add_argument('--fail-fast', action='store_true',
+                              help='Check Sphinx warnings while building and stop a build as soon as a new warning appears')
 
     action_parsers.add_parser('linkcheck', help='Check links (a current IDF revision should be uploaded to GitHub)')
 
@@ -126,6 +149,12 @@ def main():
     if args.fast_build:
         os.environ['DOCS_FAST_BUILD'] = 'y'
 
+    if args.incremental_doxygen:
+        os.environ['DOCS_INCREMENTAL_DOXYGEN'] = 'y'
+
+    if args.profile:
+        os.environ['DOCS_PROFILE'] = args.profile
+
     # Add esp-docs blockdiag path to the start of pythonpath
     # to override the externally installed blockdiag package
     blockdiag_path = Path(__file__).parents[0] / 'vendor'
@@ -134,6 +163,7 @@ def main():
     if args.action == 'build' or args.action is None:
         if args.action is None:
             args.check_warnings_only = False
+            args.fail_fast = False
 
         sys.exit(action_build(args))
 
@@ -157,8 +187,6 @@ def parallel_call(args, callback):
     else:
         args.sphinx_parallel_builds = int(args.sphinx_parallel_builds)
 
-    # Force -j1 because sphinx works incorrectly
-    args.sphinx_parallel_jobs = 1
     if args.sphinx_parallel_jobs == 'auto':
         # N CPUs per build job, rounded up - (maybe smarter to round down to avoid contention, idk)
         args.sphinx_parallel_jobs = int(math.ceil(num_cpus / args.sphinx_parallel_builds))
@@ -166,15 +194,21 @@ def parallel_call(args, callback):
         args.sphinx_parallel_jobs = int(args.sphinx_parallel_jobs)
 
     print('Will use %d parallel builds and %d jobs per build' % (args.sphinx_parallel_builds, args.sphinx_parallel_jobs))
-    pool = multiprocessing.Pool(args.sphinx_parallel_builds)
-
-    if args.sphinx_parallel_jobs > 1:
-        print('WARNING: Sphinx parallel jobs currently produce incorrect docs output with Sphinx 1.8.5')
 
     # make a list of all combinations of build_docs() args as tuples
     #
     # there's probably a fancy way to do this with itertools but this way is actually readable
 
+    # Doxygen output is the same for all languages of a target, the first build of each target
+    # runs Doxygen and the others reuse its output. Only shared within a single build_docs run
+    doxygen_cache_dir = os.path.realpath(os.path.join(args.build_dir, DOXYGEN_CACHE_DIR))
+    shutil.rmtree(doxygen_cache_dir, ignore_errors=True)
+
+    # Git metadata is the same for all the builds, query it once instead of in every Sphinx process
+    os.makedirs(args.build_dir, exist_ok=True)
+    git_info_file = os.path.realpath(os.path.join(args.build_dir, GIT_INFO_FILE))
+    write_git_info(git_info_file, cwd=args.build_dir)
+
     entries = []
     for target in targets:
         for language in languages:
@@ -190,10 +224,30 @@ def parallel_call(args, callback):
             build_info['doxyfile_dir'] = args.doxyfile_dir
             build_info['modified_files'] = args.modified_files
             build_info['project_path'] = args.project_path
+            build_info['shared_env'] = args.shared_env
+            build_info['index_project_paths'] = args.index_project_paths
+            build_info['fail_fast'] = getattr(args, 'fail_fast', False)
+            if len(languages) > 1:
+                build_info['doxygen_cache_dir'] = doxygen_cache_dir
+            build_info['generator_cache_dir'] = os.path.realpath(os.path.join(args.build_dir, GENERATOR_CACHE_DIR))
+            build_info['git_info_file'] = git_info_file
 
             entries.append(build_info)
 
-    errcodes = pool.map(callback, entries)
+    if args.shared_env and len(targets) > 1:
+        # The first target of each language is built on its own, the doctrees of the other
+        # targets are then seeded with its environment so only target specific documents are re-read
+        for build_info in entries:
+            if build_info['target'] != targets[0]:
+                seed_build_dir = os.path.realpath(os.path.join(args.build_dir, build_info['language'], targets[0]))
+                build_info['shared_env_seed'] = os.path.join(seed_build_dir, 'doctrees')
+                build_info['depends_on'] = ['%s/%s' % (build_info['language'], targets[0])]
+
+    stats_file = os.path.join(args.build_dir, BUILD_STATS_FILE)
+    errcodes = run_jobs(entries, callback, args.sphinx_parallel_builds, stats_file, callback.__name__,
+                        fail_fast=getattr(args, 'fail_fast', False))
+    write_build_summary(os.path.join(args.build_dir, BUILD_SUMMARY_FILE), entries, errcodes,
+                        load_build_stats(stats_file).get(callback.__name__, {}))
 
     is_error = False
     for ret in errcodes:
@@ -213,7 +267,43 @@ def parallel_call(args, callback):
         return 0
 
 
-def sphinx_call(build_info, builder):
+def write_build_summary(summary_file, entries, errcodes, stats):
+    summary = {}
+    for build_info, ret in zip(entries, errcodes):
+        key = job_id(build_info)
+        summary[key] = {'returncode': ret, 'stats': stats.get(key, {})}
+        report = read_json(os.path.join(build_info['build_dir'], BUILD_REPORT_FILE))
+        if report is not None:
+            summary[key]['report'] = report
+
+    with open(summary_file, 'w') as f:
+        json.dump(summary, f, indent=4, sort_keys=True)
+    print('Saved build summary to %s' % summary_file)
+
+
+def read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def wait_process(p):
+    """Wait for `p` to finish, returns its exit code and peak RSS in kilobytes (None if not available)"""
+    if hasattr(os, 'wait4'):
+        try:
+            _, status, rusage = os.wait4(p.pid, 0)
+        except ChildProcessError:
+            # Already reaped by Popen, e.g. when it was terminated by the warning checker
+            return p.wait(), None
+        p.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        return p.returncode, rusage.ru_maxrss
+
+    return p.wait(), None
+
+
+def sphinx_call(build_info, builder, report=None):
     # Note: because this runs in a multiprocessing Process, everything which happens here should be isolated to a single process
     # (ie it doesn't matter if Sphinx is using global variables, as they're it's own copy of the global variables)
 
@@ -228,15 +318,26 @@ def sphinx_call(build_info, builder):
     except OSError:
         pass
 
+    doctree_dir = os.path.join(build_info['build_dir'], 'doctrees')
+    # Don't reuse any output from a job which failed
+    if build_info.get('shared_env_seed') and not build_info.get('failed_dependencies'):
+        seed_doctrees(build_info['shared_env_seed'], doctree_dir)
+
     environ = {}
     environ.update(os.environ)
     environ['BUILDDIR'] = build_info['build_dir']
     environ['DOCS_MODIFIED_FILES'] = json.dumps(build_info['modified_files'])
+    if build_info.get('doxygen_cache_dir'):
+        environ['DOCS_DOXYGEN_CACHE_DIR'] = build_info['doxygen_cache_dir']
+    if build_info.get('generator_cache_dir'):
+        environ['DOCS_GENERATOR_CACHE_DIR'] = build_info['generator_cache_dir']
+    if build_info.get('git_info_file'):
+        environ[GIT_INFO_ENV_VAR] = build_info['git_info_file']
 
     args = [sys.executable, '-u', '-m', 'sphinx.cmd.build',
             '-j', str(build_info['sphinx_parallel_jobs']),
             '-b', builder,
-            '-d', os.path.join(build_info['build_dir'], 'doctrees'),
+            '-d', doctree_dir,
             '-w', SPHINX_WARN_LOG,
             '-v'
             ]
@@ -244,6 +345,12 @@ def sphinx_call(build_info, builder):
     if build_info['target'] != 'generic':
         args += ['-t', build_info['target'], '-D', 'idf_target={}'.format(build_info['target'])]
 
+    if build_info.get('shared_env'):
+        args += ['-D', 'shared_env=1']
+
+    if build_info.get('index_project_paths'):
+        args += ['-D', 'link_roles_path_index=1']
+
     args += ['-D', 'docs_to_build={}'.format(','. join(build_info['input_docs'])),
              '-D', 'config_dir={}'.format(os.path.abspath(os.path.dirname(__file__))),
              '-D', 'doxyfile_dir={}'.format(os.path.abspath(build_info['doxyfile_dir'])),
@@ -252,36 +359,84 @@ def sphinx_call(build_info, builder):
              os.path.join(build_info['build_dir'], builder)                    # build directory
              ]
 
+    warn_log = os.path.join(build_info['build_dir'], SPHINX_WARN_LOG)
+    known_warnings = os.path.abspath(SPHINX_KNOWN_WARNINGS)
+
+    # Written by the build_report extension at the end of the build, don't keep the one from the previous build
+    builder_report_path = os.path.join(build_info['build_dir'], BUILD_REPORT_FMT.format(builder))
+    if os.path.exists(builder_report_path):
+        os.remove(builder_report_path)
+    checker = None
+    if build_info.get('fail_fast'):
+        # Sphinx only truncates the log once it has started, don't check the one from the previous build
+        try:
+            os.remove(warn_log)
+        except FileNotFoundError:
+            pass
+        checker = LiveWarningChecker(warn_log, known_warnings, on_new_warning=lambda msg: p.terminate())
+
     saved_cwd = os.getcwd()
     os.chdir(build_info['build_dir'])  # also run sphinx in the build directory
     print("Running '%s'" % (' '.join(args)))
     output_log = os.path.join(build_info['build_dir'], SPHINX_OUTPUT_LOG_FMT.format(builder))
 
     ret = 1
+    max_rss = None
+    start = time.time()
     try:
         # Note: we can't call sphinx.cmd.build.main() here as multiprocessing doesn't est >1 layer deep
         # and sphinx.cmd.build() also does a lot of work in the calling thread, especially for j ==1,
         # so using a Python thread for this part is  a poor option (GIL)
         p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=environ)
+        if checker is not None:
+            checker.start()
         with open(output_log, 'w') as output_file:
             for c in iter(lambda: p.stdout.readline(), b''):
                 line = c.decode('utf-8', errors='replace')
                 output_file.write(line)
                 sys.stdout.write(prefix)
                 sys.stdout.write(line)
-            ret = p.wait()
+            ret, max_rss = wait_process(p)
             assert (ret is not None)
             sys.stdout.flush()
     except KeyboardInterrupt:  # this seems to be the only way to get Ctrl-C to kill everything?
         p.kill()
         os.chdir(saved_cwd)
         return 130  # FIXME It doesn't return this errorcode, why? Just prints stacktrace
+    finally:
+        if checker is not None and checker.is_alive():
+            checker.stop()
     os.chdir(saved_cwd)
+
+    if report is not None:
+        builder_report = read_json(builder_report_path) or {}
+        builder_report.update({'duration': round(time.time() - start, 2), 'returncode': ret, 'sphinx_max_rss': max_rss,
+                               'warnings': count_log_messages(warn_log)})
+        report['builders'][builder] = builder_report
+
+    if checker is not None and checker.new_warning is not None:
+        print('%s/%s: Stopped the build on a new Sphinx warning (--fail-fast)' % (build_info['language'], build_info['target']))
+        # Prints the usual summary of the new warnings found so far
+        return check_docs(build_info['language'], build_info['target'], log_file=warn_log, known_warnings_file=known_warnings,
+                          out_sanitized_log_file=os.path.join(build_info['build_dir'], SPHINX_SANITIZED_LOG)) or 1
     if ret != 0:
         print_sphinx_failure_summary(build_info, builder, ret, output_log)
     return ret
 
 
+def seed_doctrees(seed_doctree_dir, doctree_dir):
+    # An existing environment for this target is a better starting point than the one of another target
+    if os.path.exists(os.path.join(doctree_dir, 'environment.pickle')):
+        return
+
+    if not os.path.isdir(seed_doctree_dir):
+        print('No doctrees found in %s, building without a shared environment' % seed_doctree_dir)
+        return
+
+    print('Seeding doctrees from %s' % seed_doctree_dir)
+    shutil.copytree(seed_doctree_dir, doctree_dir, dirs_exist_ok=True)
+
+
 def read_log_tail(log_path, max_lines=12):
     try:
         with open(log_path) as f:
@@ -318,12 +473,36 @@ def action_build(args):
 
 
 def call_build_docs(build_info):
+    report = {'language': build_info['language'], 'target': build_info['target'], 'builders': {}}
+    start = time.time()
+    try:
+        ret = run_builders(build_info, report)
+        report['returncode'] = ret
+        return ret
+    finally:
+        report['duration'] = round(time.time() - start, 2)
+        with open(os.path.join(build_info['build_dir'], BUILD_REPORT_FILE), 'w') as f:
+            json.dump(report, f, indent=4, sort_keys=True)
+
+
+def count_log_messages(log_file):
+    # Continuation lines of multi-line messages are indented
+    try:
+        with open(log_file) as f:
+            return sum(1 for line in f if line.strip() and not line[:1].isspace())
+    except FileNotFoundError:
+        return None
+
+
+def run_builders(build_info, report):
 
     for buildername in build_info['builders']:
-        ret = sphinx_call(build_info, buildername)
+        ret = sphinx_call(build_info, buildername, report)
         if ret != 0:
             return ret
 
+        warnings = report['builders'][buildername].setdefault('warning_logs', {})
+
         # Warnings are checked after each builder as logs are overwritten
         # check Doxygen warnings only if we actually have a doxyfile:
         def has_doxyfile(doxyfile_dir):
@@ -335,18 +514,22 @@ def call_build_docs(build_info):
                 return False
 
         if has_doxyfile(build_info['doxyfile_dir']):
-            ret += check_docs(build_info['language'], build_info['target'],
-                              log_file=os.path.join(build_info['build_dir'], DXG_WARN_LOG),
-                              known_warnings_file=DXG_KNOWN_WARNINGS,
-                              out_sanitized_log_file=os.path.join(build_info['build_dir'], DXG_SANITIZED_LOG))
+            dxg_ret = check_docs(build_info['language'], build_info['target'],
+                                 log_file=os.path.join(build_info['build_dir'], DXG_WARN_LOG),
+                                 known_warnings_file=DXG_KNOWN_WARNINGS,
+                                 out_sanitized_log_file=os.path.join(build_info['build_dir'], DXG_SANITIZED_LOG))
+            warnings['doxygen'] = {'messages': count_log_messages(os.path.join(build_info['build_dir'], DXG_WARN_LOG)), 'new_warnings': dxg_ret != 0}
+            ret += dxg_ret
         else:
             print('No Doxyfile found, skipping check of doxygen errors')
 
         # check Sphinx warnings:
-        ret += check_docs(build_info['language'], build_info['target'],
-                          log_file=os.path.join(build_info['build_dir'], SPHINX_WARN_LOG),
-                          known_warnings_file=SPHINX_KNOWN_WARNINGS,
-                          out_sanitized_log_file=os.path.join(build_info['build_dir'], SPHINX_SANITIZED_LOG))
+        sphinx_ret = check_docs(build_info['language'], build_info['target'],
+                                log_file=os.path.join(build_info['build_dir'], SPHINX_WARN_LOG),
+                                known_warnings_file=SPHINX_KNOWN_WARNINGS,
+                                out_sanitized_log_file=os.path.join(build_info['build_dir'], SPHINX_SANITIZED_LOG))
+        warnings['sphinx'] = {'messages': count_log_messages(os.path.join(build_info['build_dir'], SPHINX_WARN_LOG)), 'new_warnings': sphinx_ret != 0}
+        ret += sphinx_ret
 
         if ret != 0:
             return ret
@@ -354,12 +537,12 @@ def call_build_docs(build_info):
     # Build PDF from tex
     if 'latex' in build_info['builders']:
         latex_dir = os.path.join(build_info['build_dir'], 'latex')
-        ret = build_pdf(build_info['language'], build_info['target'], latex_dir)
+        ret = build_pdf(build_info['language'], build_info['target'], latex_dir, report)
 
     return ret
 
 
-def build_pdf(language, target, latex_dir):
+def build_pdf(language, target, latex_dir, report=None):
     # Note: because this runs in a multiprocessing Process, everything which happens here should be isolated to a single process
 
     # wrap stdout & stderr in a way that lets us see which build_docs instance they come from
@@ -393,12 +576,14 @@ def build_pdf(language, target, latex_dir):
         '-outdir=build',
     ]
 
+    max_rss = None
+    start = time.time()
     try:
         p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
         for c in iter(lambda: p.stdout.readline(), b''):
             sys.stdout.write(prefix)
             sys.stdout.write(c.decode('utf-8'))
-        ret = p.wait()
+        ret, max_rss = wait_process(p)
         assert (ret is not None)
         sys.stdout.flush()
     except KeyboardInterrupt:  # this seems to be the only way to get Ctrl-C to kill everything?
@@ -407,6 +592,9 @@ def build_pdf(language, target, latex_dir):
         return 130  # FIXME It doesn't return this errorcode, why? Just prints stacktrace
     os.chdir(saved_cwd)
 
+    if report is not None:
+        report['pdf'] = {'duration': round(time.time() - start, 2), 'returncode': ret, 'max_rss': max_rss}
+
     return ret
 
 
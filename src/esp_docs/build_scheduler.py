@@ -0,0 +1,120 @@
+# Scheduler for the independent language/target builds started by build_docs.py
+#
+# Jobs are started longest first, based on the durations recorded by the previous build,
+# and only once all the jobs they depend on have finished. Results are handled as soon as
+# each job completes, and the wall time, CPU time and peak RSS of every job is recorded
+# in BUILD_STATS_FILE for the next build.
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, builds will simply not record CPU time and RSS
+    resource = None
+
+BUILD_STATS_FILE = 'build-stats.json'
+SKIPPED_RETURNCODE = -1
+
+
+def job_id(build_info):
+    return '%s/%s' % (build_info['language'], build_info['target'])
+
+
+def load_build_stats(stats_file):
+    try:
+        with open(stats_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_build_stats(stats_file, stats):
+    dir_name = os.path.dirname(stats_file)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+
+    with open(stats_file, 'w') as f:
+        json.dump(stats, f, indent=4, sort_keys=True)
+
+
+def run_job(callback, build_info):
+    # Runs in a pool worker which is not reused for other jobs,
+    # so the rusage of the worker and its children only covers this job
+    start = time.time()
+    ret = callback(build_info)
+
+    stats = {'wall_time': round(time.time() - start, 2), 'returncode': ret}
+    if resource is not None:
+        usage_self = resource.getrusage(resource.RUSAGE_SELF)
+        usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        stats['cpu_time'] = round(usage_self.ru_utime + usage_self.ru_stime + usage_children.ru_utime + usage_children.ru_stime, 2)
+        # Peak RSS of the largest process, in kilobytes on Linux
+        stats['max_rss'] = max(usage_self.ru_maxrss, usage_children.ru_maxrss)
+
+    return job_id(build_info), ret, stats
+
+
+def run_jobs(entries, callback, num_workers, stats_file, stats_key, fail_fast=False):
+    """Run callback for each entry in a pool of num_workers processes.
+
+    Entries with a 'depends_on' list of job ids are only started once those jobs have finished,
+    the ids of the ones which failed are passed to callback in build_info['failed_dependencies'].
+    Durations are read from and recorded to stats_file, under stats_key.
+    With fail_fast no new job is started once a job has failed, the jobs which were not
+    started get the return code SKIPPED_RETURNCODE.
+
+    Returns:
+        List of return codes, in the same order as entries.
+    """
+    all_stats = load_build_stats(stats_file)
+    history = all_stats.get(stats_key, {})
+
+    def expected_duration(build_info):
+        # Jobs we have no history for are started first, they could be the long ones
+        return history.get(job_id(build_info), {}).get('wall_time', float('inf'))
+
+    pending = {job_id(build_info): build_info for build_info in entries}
+    dependencies = {key: [dep for dep in build_info.get('depends_on', []) if dep in pending]
+                    for key, build_info in pending.items()}
+    results = {}
+    finished = queue.Queue()
+    running = 0
+
+    with multiprocessing.Pool(num_workers, maxtasksperchild=1) as pool:
+        while pending or running:
+            if fail_fast and any(ret != 0 for ret in results.values()):
+                for key in pending:
+                    results[key] = SKIPPED_RETURNCODE
+                    print('%s: skipped as another job failed' % key, flush=True)
+                pending.clear()
+                if not running:
+                    break
+
+            ready = [build_info for key, build_info in pending.items() if all(dep in results for dep in dependencies[key])]
+            if not ready and not running:
+                raise RuntimeError('Circular dependency between jobs: {}'.format(', '.join(pending)))
+
+            for build_info in sorted(ready, key=expected_duration, reverse=True):
+                key = job_id(build_info)
+                del pending[key]
+                build_info['failed_dependencies'] = [dep for dep in dependencies[key] if results[dep] != 0]
+
+                pool.apply_async(run_job, (callback, build_info), callback=finished.put,
+                                 error_callback=lambda err, key=key: finished.put((key, 1, {'error': str(err)})))
+                running += 1
+
+            key, ret, stats = finished.get()
+            running -= 1
+            results[key] = ret
+            history[key] = stats
+            print('%s: finished with exit code %d after %.1fs' % (key, ret, stats.get('wall_time', 0)), flush=True)
+
+    all_stats[stats_key] = history
+    save_build_stats(stats_file, all_stats)
+    print('Saved build statistics to %s' % stats_file)
+
+    return [results[job_id(build_info)] for build_info in entries]
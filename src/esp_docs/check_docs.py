@@ -1,16 +1,28 @@
 import os
 import re
 import sys
+import threading
 
-from collections import namedtuple
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
 
 LogMessage = namedtuple('LogMessage', 'original_text sanitized_text')
 
-SANITIZE_FILENAME_REGEX = re.compile('[^:]*/([^/:]*)(:.*)')
-SANITIZE_LINENUM_REGEX = re.compile('([^:]*)(:[0-9]+:)(.*)')
-SANITIZE_DUPLICATE_LINENUM_REGEX = re.compile(r'([^:]*)(:[0-9]+\.)(.*)')
+SANITIZE_DUPLICATE_LINENUM_REGEX = re.compile(r'[0-9]+\.')
 SANITIZE_TERMINAL_CONTROL_REGEX = re.compile(r'\x1B\[[0-9;]*[a-zA-Z]|\[[0-9;]+m')
 
+# Clean a known Doxygen limitation: it's expected to always document anonymous
+# structs/unions but we don't do this in our docs, so filter these all out with a regex
+# (this won't match any named field, only anonymous members -
+# ie the last part of the field is is just <something>::@NUM not <something>::name)
+RE_ANONYMOUS_FIELD = re.compile(r'.+:line: warning: parameters of member [^:\s]+(::[^:\s]+)*(::@\d+)+ are not \(all\) documented')
+
+# The sanitized log is written in large chunks instead of line by line
+SANITIZED_LOG_BUFFER_SIZE = 1024 * 1024
+
+# How often a warning log is checked for new lines while the build is running, in seconds
+LIVE_CHECK_POLL_INTERVAL = 0.2
+
 ANSI_RESET = '\033[0m'
 ANSI_BOLD = '\033[1m'
 ANSI_RED = '\033[31m'
@@ -26,13 +38,50 @@ def sanitize_line(line):
         - no line numbers after the filename
         - no line numbers from duplicate definitions
         - terminal control characters (like color codes [39;49;00m)
+
+    The line is split on ':' once and each filter is applied to the first field it matches,
+    instead of running a backtracking regex over the whole line for each of them
     """
 
-    line = re.sub(SANITIZE_TERMINAL_CONTROL_REGEX, '', line)  # Remove terminal control characters first
-    line = re.sub(SANITIZE_FILENAME_REGEX, r'\1\2', line)
-    line = re.sub(SANITIZE_LINENUM_REGEX, r'\1:line:\3', line)
-    line = re.sub(SANITIZE_DUPLICATE_LINENUM_REGEX, r'\1:line.\3', line)
-    return line
+    if '[' in line:
+        line = SANITIZE_TERMINAL_CONTROL_REGEX.sub('', line)  # Remove terminal control characters first
+
+    if ':' not in line:
+        return line
+
+    fields = line.split(':')
+    last = len(fields) - 1
+
+    # Path of the first field followed by a ':' that contains one
+    for i in range(last):
+        slash = fields[i].rfind('/')
+        if slash >= 0:
+            fields[i] = fields[i][slash + 1:]
+            break
+
+    # ':<num>:'
+    for i in range(1, last):
+        if fields[i].isdigit() and fields[i].isascii():
+            fields[i] = 'line'
+            break
+
+    # ':<num>.'
+    for i in range(1, last + 1):
+        if fields[i][:1].isdigit():
+            match = SANITIZE_DUPLICATE_LINENUM_REGEX.match(fields[i])
+            if match:
+                fields[i] = 'line.' + fields[i][match.end():]
+                break
+
+    return ':'.join(fields)
+
+
+def sanitize_log(log, out_sanitized_log):
+    """Sanitize the lines of `log` one by one, writing them to `out_sanitized_log` and yielding a LogMessage for each"""
+    for line in log:
+        sanitized_line = sanitize_line(line)
+        out_sanitized_log.write(sanitized_line)
+        yield LogMessage(line, sanitized_line)
 
 
 def supports_color():
@@ -95,28 +144,47 @@ def group_log_messages(messages, text_attr):
     return grouped
 
 
-def check_docs(language, target, log_file, known_warnings_file, out_sanitized_log_file):
+def index_known_messages(known_messages):
+    """Map each known message to the sorted list of its positions in `known_messages`"""
+    positions = defaultdict(list)
+    for idx, known_message in enumerate(known_messages):
+        positions[known_message].append(idx)
+
+    return positions
+
+
+class KnownMessageMatcher:
     """
-    Check for Documentation warnings in `log_file`: should only contain (fuzzy) matches to `known_warnings_file`
+    Match sanitized messages against the known messages, one at a time
 
-    It prints all unknown messages with `target`/`language` prefix
-    It leaves `out_sanitized_log_file` file for observe and debug
+    Messages must match the known messages in order: each message is looked up from the position
+    of the last match onwards, so a known message can match several consecutive messages but an
+    earlier one can not be matched again once a later known message has been seen
     """
 
-    # Sanitize all messages
-    all_messages = list()
+    def __init__(self, known_messages):
+        self.positions = index_known_messages(known_messages)
+        self.known_idx = 0
+
+    def match(self, sanitized_text):
+        msg_positions = self.positions.get(sanitized_text)
+        if msg_positions:
+            # First occurrence at or after the current position, same as known_messages.index(text, known_idx)
+            pos = bisect_left(msg_positions, self.known_idx)
+            if pos < len(msg_positions):
+                self.known_idx = msg_positions[pos]
+                return True
+
+        return False
 
-    try:
-        with open(log_file) as f, open(out_sanitized_log_file, 'w') as o:
-            for line in f:
-                sanitized_line = sanitize_line(line)
-                all_messages.append(LogMessage(line, sanitized_line))
-                o.write(sanitized_line)
-    except FileNotFoundError:
-        print(style_text('=== BUILD FAILED ===', color='red', bold=True))
-        print(style_text('{}: expected warning log was not generated'.format(format_path_for_display(log_file)), color='red', bold=True))
-        return 1
 
+def find_new_messages(messages, known_messages):
+    """Return the messages that do not match `known_messages`, see KnownMessageMatcher"""
+    matcher = KnownMessageMatcher(known_messages)
+    return [msg for msg in messages if not matcher.match(msg.sanitized_text)]
+
+
+def read_known_messages(known_warnings_file):
     known_messages = list()
 
     try:
@@ -126,23 +194,98 @@ def check_docs(language, target, log_file, known_warnings_file, out_sanitized_lo
     except FileNotFoundError:
         pass
 
-    if 'doxygen' in known_warnings_file:
-        # Clean a known Doxygen limitation: it's expected to always document anonymous
-        # structs/unions but we don't do this in our docs, so filter these all out with a regex
-        # (this won't match any named field, only anonymous members -
-        # ie the last part of the field is is just <something>::@NUM not <something>::name)
-        RE_ANONYMOUS_FIELD = re.compile(r'.+:line: warning: parameters of member [^:\s]+(::[^:\s]+)*(::@\d+)+ are not \(all\) documented')
-        all_messages = [msg for msg in all_messages if not re.match(RE_ANONYMOUS_FIELD, msg.sanitized_text)]
-
-    # Collect all new messages that are not match with the known messages.
-    # The order is an important.
-    new_messages = list()
-    known_idx = 0
-    for msg in all_messages:
+    return known_messages
+
+
+class LiveWarningChecker(threading.Thread):
+    """
+    Follow a warning log while it is being written and call `on_new_warning` with the
+    first message that does not match `known_warnings_file`
+
+    Only complete lines are checked, the messages are matched in the same way as check_docs() does
+    once the build has finished, so a message reported here is also reported by check_docs()
+    """
+
+    def __init__(self, log_file, known_warnings_file, on_new_warning, poll_interval=LIVE_CHECK_POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.log_file = log_file
+        self.known_warnings_file = known_warnings_file
+        self.on_new_warning = on_new_warning
+        self.poll_interval = poll_interval
+        self.filter_anonymous_fields = 'doxygen' in known_warnings_file
+        self.new_warning = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        matcher = KnownMessageMatcher(read_known_messages(self.known_warnings_file))
+
+        log = None
+        partial_line = ''
         try:
-            known_idx = known_messages.index(msg.sanitized_text, known_idx)
-        except ValueError:
-            new_messages.append(msg)
+            while self.new_warning is None:
+                # Read everything which was written before stop() was called before giving up
+                stopping = self.stopped.is_set()
+
+                if log is None:
+                    try:
+                        log = open(self.log_file)
+                    except FileNotFoundError:
+                        pass
+
+                while log is not None:
+                    line = partial_line + log.readline()
+                    # The last line of the log may not end with a newline once the build is done
+                    if not line.endswith('\n') and not (stopping and line):
+                        partial_line = line
+                        break
+
+                    partial_line = ''
+                    sanitized_line = sanitize_line(line)
+                    if self.filter_anonymous_fields and RE_ANONYMOUS_FIELD.match(sanitized_line):
+                        continue
+                    if not matcher.match(sanitized_line):
+                        self.new_warning = LogMessage(line, sanitized_line)
+                        self.on_new_warning(self.new_warning)
+                        break
+
+                if stopping:
+                    break
+                self.stopped.wait(self.poll_interval)
+        finally:
+            if log is not None:
+                log.close()
+
+    def stop(self):
+        """Check the rest of the log and wait for the checker to finish"""
+        self.stopped.set()
+        self.join()
+
+
+def check_docs(language, target, log_file, known_warnings_file, out_sanitized_log_file):
+    """
+    Check for Documentation warnings in `log_file`: should only contain (fuzzy) matches to `known_warnings_file`
+
+    It prints all unknown messages with `target`/`language` prefix
+    It leaves `out_sanitized_log_file` file for observe and debug
+    """
+
+    known_messages = read_known_messages(known_warnings_file)
+
+    # Sanitize the log as a stream, only the new messages are kept in memory
+    try:
+        with open(log_file) as f, open(out_sanitized_log_file, 'w', buffering=SANITIZED_LOG_BUFFER_SIZE) as o:
+            messages = sanitize_log(f, o)
+
+            if 'doxygen' in known_warnings_file:
+                messages = (msg for msg in messages if not RE_ANONYMOUS_FIELD.match(msg.sanitized_text))
+
+            # Collect all new messages that are not match with the known messages.
+            # The order is an important.
+            new_messages = find_new_messages(messages, known_messages)
+    except FileNotFoundError:
+        print(style_text('=== BUILD FAILED ===', color='red', bold=True))
+        print(style_text('{}: expected warning log was not generated'.format(format_path_for_display(log_file)), color='red', bold=True))
+        return 1
 
     if new_messages:
         build_id = '%s/%s' % (language, target)
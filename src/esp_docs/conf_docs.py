@@ -18,10 +18,10 @@ from __future__ import print_function, unicode_literals
 
 import os
 import os.path
-import subprocess
 import sys
 
 from .get_github_rev import get_github_rev
+from .git_info import get_git_info
 from .sanitize_version import sanitize_version
 from .constants import TARGET_NAMES
 
@@ -40,10 +40,7 @@ suppress_warnings = ['image.nonlocal_uri']
 
 # This is the full exact version, canonical git version description
 # visible when you open index.html.
-try:
-    version = subprocess.check_output(['git', 'describe', '--abbrev=10']).strip().decode('utf-8')
-except subprocess.CalledProcessError:
-    version = 'master'
+version = get_git_info().describe or 'master'
 
 # The 'release' version is the same as version for non-CI builds, but for CI
 # builds on a branch then it's replaced with the branch name
@@ -71,6 +68,9 @@ extensions = ['breathe',
               'sphinxcontrib.packetdiag',
               'sphinxcontrib.cairosvgconverter',
 
+              # first, so it can wrap the handlers of the other esp-docs extensions
+              'esp_docs.esp_extensions.profiling',
+
               'esp_docs.generic_extensions.html_redirects',
               'esp_docs.generic_extensions.toctree_filter',
               'esp_docs.generic_extensions.list_filter',
@@ -83,6 +83,8 @@ extensions = ['breathe',
               'esp_docs.esp_extensions.latex_builder',
               'esp_docs.esp_extensions.link_roles',
               'esp_docs.esp_extensions.exclude_docs',
+              'esp_docs.esp_extensions.shared_env',
+              'esp_docs.esp_extensions.build_report',
 
               # from https://github.com/pfalcon/sphinx_selective_exclude
               'sphinx_selective_exclude.eager_only',
@@ -342,6 +344,7 @@ def setup(app):
     app.connect('config-inited',  setup_diag_font)
     app.connect('config-inited',  setup_html)
     app.connect('config-inited',  setup_user)
+    app.connect('builder-inited', setup_eager_only_tag)
 
 
 def setup_config_values(app, config):
@@ -349,6 +352,13 @@ def setup_config_values(app, config):
     app.add_config_value('idf_target_title_dict', TARGET_NAMES, 'env')
 
 
+def setup_eager_only_tag(app):
+    # eager_only replaces the expression of the '.. only::' blocks it keeps with 'TRUE' and only adds
+    # that tag while reading. With parallel reads that happens in the worker processes, so the tag
+    # has to exist before they are forked or the blocks are dropped again when writing
+    app.builder.tags.add('TRUE')
+
+
 def setup_html_context(app, config):
     # Setup path for 'edit on github'-link
     config.html_context['conf_py_path'] = '/docs/{}/'.format(app.config.language)
@@ -0,0 +1,88 @@
+# Extension to write a machine readable report of each Sphinx build
+#
+# Other extensions time their steps with `with phase(app, 'doxygen'):`, the reading and writing
+# of the documents are timed here. At the end of the build the report is written to
+# BUILD_REPORT_FMT in the build directory, build_docs.py then adds the number of warnings from the
+# warning log, the steps which run outside of Sphinx (warning checks, PDF) and aggregates the reports of all the builds.
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, reports will simply not contain the RSS
+    resource = None
+
+BUILD_REPORT_FMT = 'build-report-{}.json'
+
+
+def setup(app):
+    app.connect('env-before-read-docs', start_read, priority=900)
+    app.connect('env-updated', finish_read)
+    app.connect('doctree-resolved', count_written_doc)
+    app.connect('build-finished', write_report)
+
+    return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
+
+
+def get_report(app):
+    if not hasattr(app, 'esp_build_report'):
+        app.esp_build_report = {'phases': {}, 'docs_read': 0, 'docs_written': 0}
+    return app.esp_build_report
+
+
+def children_max_rss():
+    # Peak RSS of the largest subprocess which has finished so far, in kilobytes on Linux
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+@contextmanager
+def phase(app, name):
+    """Record the duration of the enclosed block as phase `name` of the build report"""
+    start = time.time()
+    try:
+        yield
+    finally:
+        phases = get_report(app)['phases']
+        duration = phases.get(name, {}).get('duration', 0) + time.time() - start
+        phases[name] = {'duration': round(duration, 2), 'children_max_rss': children_max_rss()}
+
+
+def start_read(app, env, docnames):
+    # Runs after the other handlers, which can still remove documents from the list
+    report = get_report(app)
+    report['docs_read'] = len(docnames)
+    report['read_start'] = time.time()
+
+
+def finish_read(app, env):
+    report = get_report(app)
+    if 'read_start' in report:
+        report['phases']['read'] = {'duration': round(time.time() - report.pop('read_start'), 2)}
+    report['write_start'] = time.time()
+
+
+def count_written_doc(app, doctree, docname):
+    # Also emitted in the main process for parallel writes, before the doctrees are sent to the workers
+    get_report(app)['docs_written'] += 1
+
+
+def write_report(app, exception):
+    report = get_report(app)
+    if 'write_start' in report:
+        report['phases']['write'] = {'duration': round(time.time() - report.pop('write_start'), 2)}
+
+    report['builder'] = app.builder.name
+    report['docs_total'] = len(app.env.found_docs)
+    report['failed'] = exception is not None
+    if resource is not None:
+        report['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report['children_max_rss'] = children_max_rss()
+
+    report_path = os.path.join(app.config.build_dir, BUILD_REPORT_FMT.format(app.builder.name))
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4, sort_keys=True)
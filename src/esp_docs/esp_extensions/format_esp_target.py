@@ -1,3 +1,4 @@
+import functools
 import os
 import os.path
 import pprint
@@ -12,6 +13,10 @@ from esp_docs.constants import TARGET_NAMES, TOOLCHAIN_PREFIX
 
 
 def setup(app):
+    # Substitutions belong to this Sphinx application, they are shared between the source-read callback and
+    # the include directive, but only modified before any documents are read
+    sub = StringSubstituter()
+    app.esp_target_substituter = sub
 
     # Config values not available when setup is called
     app.connect('config-inited', lambda _, config: sub.init_sub_strings(config))
@@ -25,7 +30,12 @@ def setup(app):
     # This is needed since there are no source-read events for includes
     app.add_directive('include', FormatedInclude, override=True)
 
-    return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.2'}
+    return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.3'}
+
+
+def get_substituter(app):
+    """Returns the StringSubstituter of the Sphinx application, or None if this extension is not enabled"""
+    return getattr(app, 'esp_target_substituter', None)
 
 
 def check_content(content, docname):
@@ -38,6 +48,44 @@ def check_content(content, docname):
         logger.warning('Badly formatted string substitution: {}'.format(err), location=docname)
 
 
+# Tokens of the values of a local substitution define, e.g. 'default="IO3", esp32, esp32s2="IO4"'
+RE_DEFINE_TOKEN = re.compile(r'\s*(?:(\w+)|"([^"]*)"|(=)|(,)|(\S))')
+
+
+@functools.lru_cache(maxsize=None)
+def parse_local_sub_define(define):
+    """Parse the values of a local substitution define into a dict of the value of each target and the default value
+
+    The same defines are found in the documents of every target, so they are only parsed once.
+    """
+    values = {}
+    names = []
+    expect_value = False
+
+    for match in RE_DEFINE_TOKEN.finditer(define):
+        name, value, equals, comma, other = match.groups()
+        if value is not None and expect_value:
+            # A value applies to all the targets listed before it, e.g. esp32, esp32s2="IO4"
+            values.update(dict.fromkeys(names, value))
+            names = []
+            expect_value = False
+        elif name and not expect_value:
+            names.append(name)
+        elif equals and names and not expect_value:
+            expect_value = True
+        elif not comma or expect_value:
+            raise ValueError('IDF_TARGET_X substitution define invalid, val={}'.format(define))
+
+    if names or expect_value:
+        raise ValueError('IDF_TARGET_X substitution define invalid, val={}'.format(define))
+
+    if next(iter(values), None) != 'default':
+        # There should always be a default value
+        raise ValueError('No default value in IDF_TARGET_X substitution define, val={}'.format(define))
+
+    return values
+
+
 class StringSubstituter:
     """ Allows for string substitution of target related strings
         before any markup is parsed
@@ -126,14 +174,23 @@ class StringSubstituter:
                         'other': 'N/A'}
 
     RE_PATTERN = re.compile(r'^\s*{IDF_TARGET_(\w+?):(.+?)}', re.MULTILINE)
+    # All the substitution tags, replaced in a single pass over the content
+    RE_TAG = re.compile(r'{IDF_TARGET_\w+}')
 
     SUB_LOG_FILE = "IDF_TARGET-substitutions.txt"
 
     def __init__(self):
         self.substitute_strings = {}
+        # Tags which RE_TAG does not match, replaced one by one
+        self.other_tags = []
+        # Formatted lines of the files included by FormatedInclude
+        self.include_cache = {}
 
     def add_pair(self, tag, replace_value):
+        if not self.RE_TAG.fullmatch(tag) and tag not in self.substitute_strings:
+            self.other_tags.append(tag)
         self.substitute_strings[tag] = replace_value
+        self.include_cache.clear()
 
     def log_subs_to_file(self, config):
         with open(os.path.join(config.build_dir, self.SUB_LOG_FILE), 'w') as f:
@@ -157,6 +214,10 @@ class StringSubstituter:
 
         self.log_subs_to_file(config)
 
+    def local_sub_value(self, define):
+        values = parse_local_sub_define(define)
+        return values.get(self.target_name, values['default'])
+
     def add_local_subs(self, matches):
         local_sub_strings = {}
 
@@ -164,41 +225,31 @@ class StringSubstituter:
             if len(sub_def) != 2:
                 raise ValueError('IDF_TARGET_X substitution define invalid, val={}'.format(sub_def))
 
-            tag = '{' + 'IDF_TARGET_{}'.format(sub_def[0]) + '}'
-
-            match_default = re.match(r'^\s*default(\s*)=(\s*)\"(.*?)\"', sub_def[1])
-
-            if match_default is None:
-                # There should always be a default value
-                raise ValueError('No default value in IDF_TARGET_X substitution define, val={}'.format(sub_def))
-
-            match_target = re.match(r'^.*{}\b(.*?)=(\s*)\"(.*?)\"'.format(self.target_name), sub_def[1])
-
-            if match_target is None:
-                sub_value = match_default.groups()[2]
-            else:
-                sub_value = match_target.groups()[2]
-
-            local_sub_strings[tag] = sub_value
+            local_sub_strings['{' + 'IDF_TARGET_{}'.format(sub_def[0]) + '}'] = self.local_sub_value(sub_def[1])
 
         return local_sub_strings
 
     def substitute(self, content):
-        # Add any new local tags that matches the reg.ex.
-        sub_defs = re.findall(self.RE_PATTERN, content)
-
         local_sub_strings = {}
 
-        if len(sub_defs) != 0:
-            local_sub_strings.update(self.add_local_subs(sub_defs))
+        # Collect the local tags defined in the content and remove the defines
+        def remove_define(match):
+            local_sub_strings['{' + 'IDF_TARGET_{}'.format(match.group(1)) + '}'] = self.local_sub_value(match.group(2))
+            return ''
 
-        # Remove the tag defines
-        content = re.sub(self.RE_PATTERN, '', content)
+        content = self.RE_PATTERN.sub(remove_define, content)
 
-        for key in local_sub_strings:
-            content = content.replace(key, local_sub_strings[key])
+        # Local substitutions take precedence over the global ones
+        def replace_tag(match):
+            tag = match.group(0)
+            value = local_sub_strings.get(tag)
+            if value is None:
+                value = self.substitute_strings.get(tag, tag)
+            return value
 
-        for key in self.substitute_strings:
+        content = self.RE_TAG.sub(replace_tag, content)
+
+        for key in self.other_tags:
             content = content.replace(key, self.substitute_strings[key])
 
         return content
@@ -229,10 +280,6 @@ class StringSubstituter:
         self.log_subs_to_file(app.config)
 
 
-# Shared between read source callbacks and .. include:: directive, but read only
-sub = StringSubstituter()
-
-
 class FormatedInclude(BaseInclude):
 
     """
@@ -273,6 +320,25 @@ class FormatedInclude(BaseInclude):
         e_handler = self.state.document.settings.input_encoding_error_handler
         tab_width = self.options.get(
             'tab-width', self.state.document.settings.tab_width)
+        startline = self.options.get('start-line', None)
+        endline = self.options.get('end-line', None)
+        after_text = self.options.get('start-after', None)
+        before_text = self.options.get('end-before', None)
+
+        # Snippets are included by many documents, they are only read and formatted again when modified
+        sub = get_substituter(self.env.app)
+        try:
+            stat = os.stat(path)
+            cache_key = (path, stat.st_mtime_ns, stat.st_size, encoding, tab_width, startline, endline, after_text, before_text)
+        except OSError:
+            cache_key = None
+
+        if cache_key in sub.include_cache:
+            include_lines = sub.include_cache[cache_key]
+            self.state.document.settings.record_dependencies.add(path)
+            self.state_machine.insert_input(list(include_lines), path)
+            return []
+
         try:
             self.state.document.settings.record_dependencies.add(path)
             include_file = io.FileInput(source_path=path,
@@ -286,8 +352,6 @@ class FormatedInclude(BaseInclude):
         except IOError as error:
             raise self.severe(u'Problems with "%s" directive path:\n%s.' %
                               (self.name, ErrorString(error)))
-        startline = self.options.get('start-line', None)
-        endline = self.options.get('end-line', None)
         try:
             if startline or (endline is not None):
                 lines = include_file.readlines()
@@ -303,7 +367,6 @@ class FormatedInclude(BaseInclude):
 
         # start-after/end-before: no restrictions on newlines in match-text,
         # and no restrictions on matching inside lines vs. line boundaries
-        after_text = self.options.get('start-after', None)
         if after_text:
             # skip content in rawtext before *and incl.* a matching text
             after_index = rawtext.find(after_text)
@@ -311,7 +374,6 @@ class FormatedInclude(BaseInclude):
                 raise self.severe('Problem with "start-after" option of "%s" '
                                   'directive:\nText not found.' % self.name)
             rawtext = rawtext[after_index + len(after_text):]
-        before_text = self.options.get('end-before', None)
         if before_text:
             # skip content in rawtext after *and incl.* a matching text
             before_index = rawtext.find(before_text)
@@ -322,6 +384,8 @@ class FormatedInclude(BaseInclude):
 
         include_lines = statemachine.string2lines(rawtext, tab_width,
                                                   convert_whitespace=True)
+        if cache_key is not None:
+            sub.include_cache[cache_key] = include_lines
 
-        self.state_machine.insert_input(include_lines, path)
+        self.state_machine.insert_input(list(include_lines), path)
         return []
@@ -4,40 +4,148 @@ from __future__ import print_function, unicode_literals
 
 import os
 import re
+import stat
 import subprocess
+import time
 from collections import namedtuple
 
 from docutils import nodes
 from ..get_github_rev import get_github_rev
+from ..git_info import get_git_info
 from sphinx.transforms.post_transforms import SphinxPostTransform
 
+LINE_COUNT_CHUNK_SIZE = 1024 * 1024
+# Modes of the git index entries which are not regular files
+GIT_MODE_SUBMODULE = '160000'
+GIT_MODE_SYMLINK = '120000'
+# Tag of the skip-worktree entries in 'git ls-files -t'
+GIT_STATUS_SKIP_WORKTREE = 'S'
+
 
 # Creates a dict of all submodules with the format {submodule_path : (url absolute or relative to git root), commit)}
 def get_submodules():
-    git_root = subprocess.check_output(['git', 'rev-parse', '--show-toplevel']).strip().decode('utf-8')
-    gitmodules_file = os.path.join(git_root, '.gitmodules')
-
-    submodules = subprocess.check_output(['git', 'submodule', 'status'], cwd=git_root).strip().decode('utf-8').split('\n')
-
-    if submodules[0] == '':
-        return {}
-
-    submodule_dict = {}
     Submodule = namedtuple('Submodule', 'url rev')
-
-    for sub in submodules:
-        sub_info = sub.lstrip().split(' ')
-
-        # Get short hash, 7 digits
-        rev = sub_info[0].lstrip('-')[0:7]
-        path = sub_info[1].lstrip('./')
-
-        config_key_arg = 'submodule.{}.url'.format(path)
-        rel_url = subprocess.check_output(['git', 'config', '--file', gitmodules_file, '--get', config_key_arg]).decode('utf-8').lstrip('./').rstrip('\n')
-
-        submodule_dict[path] = Submodule(rel_url, rev)
-
-    return submodule_dict
+    return {path: Submodule(url, rev) for path, (url, rev) in get_git_info().submodules.items()}
+
+
+class SubmoduleTrie():
+    """Submodules indexed by the components of their path, to find the submodule of a path without comparing it to all of them"""
+
+    def __init__(self, submods):
+        # Each node is [children, (submodule path, submodule) if a submodule ends at this node]
+        self.root = {}
+        for key, value in submods.items():
+            children = self.root
+            for part in key.split('/'):
+                node = children.setdefault(part, [{}, None])
+                children = node[0]
+            node[1] = node[1] or (key, value)
+
+    def find(self, path):
+        """Returns (submodule path, submodule) of the submodule containing path, or None"""
+        children = self.root
+        # The last component is inside the submodule, not the submodule itself
+        for part in path.lstrip('/').split('/')[:-1]:
+            if part not in children:
+                return None
+            children, submodule = children[part]
+            if submodule:
+                return submodule
+        return None
+
+
+class PathCache():
+    """Type and number of lines of the files linked to, each path is only checked once per build"""
+
+    def __init__(self):
+        self.kinds = {}
+        self.line_counts = {}
+
+    def kind(self, path):
+        """'dir', 'file' or None if path does not exist"""
+        if path not in self.kinds:
+            try:
+                self.kinds[path] = 'dir' if stat.S_ISDIR(os.stat(path).st_mode) else 'file'
+            except (OSError, ValueError):
+                self.kinds[path] = None
+        return self.kinds[path]
+
+    def line_count(self, path):
+        if path not in self.line_counts:
+            self.line_counts[path] = count_lines(path)
+        return self.line_counts[path]
+
+    def add_index(self, root, entries):
+        """Record the kind of the paths listed in entries, relative to root, and of all their parent directories"""
+        dirs = set()
+        for rel_path, kind in entries:
+            path = os.path.join(root, rel_path)
+            self.kinds[path] = kind
+            parent = os.path.dirname(path)
+            while parent not in dirs and len(parent) > len(root):
+                dirs.add(parent)
+                parent = os.path.dirname(parent)
+        self.kinds.update(dict.fromkeys(dirs, 'dir'))
+
+
+def git_ls_files(args, cwd):
+    output = subprocess.check_output(['git', 'ls-files', '-z'] + args, cwd=cwd).decode('utf-8')
+    return [entry for entry in output.split('\0') if entry]
+
+
+def git_deleted_files(project_path):
+    """Tracked files deleted from the worktree of the project or of its checked out submodules"""
+    deleted = set(git_ls_files(['--deleted'], project_path))
+    # 'ls-files --deleted' doesn't support --recurse-submodules
+    submodules = subprocess.check_output(['git', 'submodule', 'foreach', '--quiet', '--recursive', 'echo "$displaypath"'],
+                                         cwd=project_path).decode('utf-8').splitlines()
+    for submodule in submodules:
+        deleted.update(submodule + '/' + rel_path for rel_path in git_ls_files(['--deleted'], os.path.join(project_path, submodule)))
+    return deleted
+
+
+def index_project_paths(app, path_cache):
+    """Index the files of the project tracked by git, plus the untracked ones which are not ignored
+
+    The index trusts git: files deleted from the worktree and skip-worktree entries (sparse checkouts) are
+    left out. Paths missing from the index, e.g. ignored files, are still checked on the filesystem when linked to.
+    """
+    if not app.config.link_roles_path_index:
+        return
+
+    project_path = app.config.project_path
+    start = time.time()
+    try:
+        entries = []
+        for entry in git_ls_files(['--stage', '-t', '--recurse-submodules'], project_path):
+            status, mode, rel_path = entry[0], entry.split(' ', 2)[1], entry.split('\t', 1)[1]
+            if status == GIT_STATUS_SKIP_WORKTREE:
+                # Sparse checkout, git doesn't check whether the file exists
+                continue
+            elif mode == GIT_MODE_SUBMODULE:
+                # Submodule which is not checked out, only its directory exists
+                entries.append((rel_path, 'dir'))
+            elif mode != GIT_MODE_SYMLINK:
+                entries.append((rel_path, 'file'))
+        entries += [(rel_path, 'file') for rel_path in git_ls_files(['--others', '--exclude-standard'], project_path)]
+        deleted = git_deleted_files(project_path)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print('Could not index the project paths with git, checking the paths of link roles on the filesystem: {}'.format(e))
+        return
+
+    path_cache.add_index(project_path, [entry for entry in entries if entry[0] not in deleted])
+    print('Indexed {} project paths in {:.2f}s'.format(len(path_cache.kinds), time.time() - start))
+
+
+def count_lines(path):
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(LINE_COUNT_CHUNK_SIZE), b''):
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+    # The last line is not terminated by a newline
+    return lines if last == b'\n' else lines + 1
 
 
 def url_join(*url_parts):
@@ -48,7 +156,7 @@ def url_join(*url_parts):
     return result
 
 
-def github_link(link_type, idf_rev, submods, root_path, app_config):
+def github_link(link_type, idf_rev, submods, root_path, app_config, path_cache):
     def role(name, rawtext, text, lineno, inliner, options={}, content=[]):
         msgs = []
         BASE_URL = 'https://github.com/'
@@ -61,10 +169,10 @@ def github_link(link_type, idf_rev, submods, root_path, app_config):
 
         # Redirects to submodule repo if path is a submodule, else default to IDF repo
         def redirect_submodule(path, submods, rev):
-            for key, value in submods.items():
-                # Add path separator to end of submodule path to ensure we are matching a directory
-                if path.lstrip('/').startswith(os.path.join(key, '')):
-                    return value.url.replace('.git', ''), value.rev, re.sub('^/{}/'.format(key), '', path)
+            submodule = submods.find(path)
+            if submodule:
+                key, value = submodule
+                return value.url.replace('.git', ''), value.rev, re.sub('^/{}/'.format(key), '', path)
 
             return REPO, rev, path
 
@@ -107,22 +215,22 @@ def github_link(link_type, idf_rev, submods, root_path, app_config):
 
         is_dir = (link_type == 'tree')
 
-        if not os.path.exists(abs_path):
+        kind = path_cache.kind(abs_path)
+        if kind is None:
             warning('IDF path %s does not appear to exist (absolute path %s)' % (rel_path, abs_path))
-        elif is_dir and not os.path.isdir(abs_path):
+        elif is_dir and kind != 'dir':
             # note these "wrong type" warnings are not strictly needed  as GitHub will apply a redirect,
             # but the may become important in the future (plus make for cleaner links)
             warning('IDF path %s is not a directory but role :%s: is for linking to a directory, try :%s_file:' % (rel_path, name, name))
-        elif not is_dir and os.path.isdir(abs_path):
+        elif not is_dir and kind == 'dir':
             warning('IDF path %s is a directory but role :%s: is for linking to a file' % (rel_path, name))
 
         # check the line number is valid
         if line_no:
             if is_dir:
                 warning('URL %s contains a line number anchor but role :%s: is for linking to a directory' % (rel_path, name))
-            elif os.path.exists(abs_path) and not os.path.isdir(abs_path):
-                with open(abs_path, 'r') as f:
-                    lines = len(f.readlines())
+            elif kind == 'file':
+                lines = path_cache.line_count(abs_path)
                 if any(True for ln in line_no if ln > lines):
                     warning('URL %s specifies a range larger than file (file has %d lines)' % (rel_path, lines))
 
@@ -175,24 +283,26 @@ class TranslationLinkNodeTransform(SphinxPostTransform):
 
 def setup(app):
     rev = get_github_rev()
-    submods = get_submodules()
+    submods = SubmoduleTrie(get_submodules())
+    path_cache = PathCache()
+    app.connect('builder-inited', lambda app: index_project_paths(app, path_cache))
 
     # links to files or folders on the GitHub
-    app.add_role('project', github_link('tree', rev, submods, '/', app.config))
-    app.add_role('project_file', github_link('blob', rev, submods, '/', app.config))
-    app.add_role('project_raw', github_link('raw', rev, submods, '/', app.config))
+    app.add_role('project', github_link('tree', rev, submods, '/', app.config, path_cache))
+    app.add_role('project_file', github_link('blob', rev, submods, '/', app.config, path_cache))
+    app.add_role('project_raw', github_link('raw', rev, submods, '/', app.config, path_cache))
 
     # These are the same as :project:, but kept for backwards compatibility reasons
-    app.add_role('idf', github_link('tree', rev, submods, '/', app.config))
-    app.add_role('idf_file', github_link('blob', rev, submods, '/', app.config))
-    app.add_role('idf_raw', github_link('raw', rev, submods, '/', app.config))
+    app.add_role('idf', github_link('tree', rev, submods, '/', app.config, path_cache))
+    app.add_role('idf_file', github_link('blob', rev, submods, '/', app.config, path_cache))
+    app.add_role('idf_raw', github_link('raw', rev, submods, '/', app.config, path_cache))
 
-    app.add_role('component', github_link('tree', rev, submods, '/components/', app.config))
-    app.add_role('component_file', github_link('blob', rev, submods, '/components/', app.config))
-    app.add_role('component_raw', github_link('raw', rev, submods, '/components/', app.config))
-    app.add_role('example', github_link('tree', rev, submods, '/examples/', app.config))
-    app.add_role('example_file', github_link('blob', rev, submods, '/examples/', app.config))
-    app.add_role('example_raw', github_link('raw', rev, submods, '/examples/', app.config))
+    app.add_role('component', github_link('tree', rev, submods, '/components/', app.config, path_cache))
+    app.add_role('component_file', github_link('blob', rev, submods, '/components/', app.config, path_cache))
+    app.add_role('component_raw', github_link('raw', rev, submods, '/components/', app.config, path_cache))
+    app.add_role('example', github_link('tree', rev, submods, '/examples/', app.config, path_cache))
+    app.add_role('example_file', github_link('blob', rev, submods, '/examples/', app.config, path_cache))
+    app.add_role('example_raw', github_link('raw', rev, submods, '/examples/', app.config, path_cache))
 
     # link to the current documentation file in specific language version
     app.add_role('link_to_translation', link_to_translation)
@@ -200,5 +310,7 @@ def setup(app):
     app.add_post_transform(TranslationLinkNodeTransform)
 
     app.add_config_value('github_repo', None, 'env')
+    # Index the project paths with git when the build starts instead of checking the path of each link
+    app.add_config_value('link_roles_path_index', False, '')
 
     return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.5'}
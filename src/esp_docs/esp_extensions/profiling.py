@@ -0,0 +1,149 @@
+# Extension to profile the event handlers, directives and roles of esp-docs
+#
+# Enabled by setting the environment variable PROFILE_ENV_VAR (build-docs --profile). Every esp-docs
+# event handler, directive and role is then wrapped with a timer, the number of calls, total and longest
+# duration of each are written to PROFILE_STATS_FMT in the build directory at the end of the build.
+# The durations are inclusive: the handler which emits an event also counts the time of the handlers of
+# that event. With DOCS_PROFILE=cprofile the main Sphinx process is also profiled with cProfile, the
+# result is written to PROFILE_CPROFILE_FMT and can be viewed with e.g. `python -m pstats`.
+#
+# Handlers connected before this extension is set up are wrapped as well, but as it patches the
+# connect() of the application it should be the first esp-docs extension.
+import cProfile
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+from docutils.parsers.rst import directives, roles
+
+PROFILE_ENV_VAR = 'DOCS_PROFILE'
+PROFILE_STATS_FMT = 'profile-{}.json'
+PROFILE_CPROFILE_FMT = 'profile-{}.prof'
+
+# Stats recorded by parallel read processes, sent back to the main process with their environment
+WORKER_STATS_ATTR = 'esp_docs_profile_worker'
+
+
+def setup(app):
+    mode = os.environ.get(PROFILE_ENV_VAR)
+    if mode:
+        Profiler(app, use_cprofile=mode == 'cprofile').install()
+
+    return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
+
+
+def is_profiled(obj):
+    module = getattr(obj, '__module__', None) or ''
+    return module.startswith('esp_docs.') and module != __name__
+
+
+def handler_name(handler):
+    return '{}.{}'.format(handler.__module__, getattr(handler, '__qualname__', repr(handler)))
+
+
+def add_stats(stats, name, calls, total, longest):
+    entry = stats.setdefault(name, {'calls': 0, 'total': 0.0, 'max': 0.0})
+    entry['calls'] += calls
+    entry['total'] += total
+    entry['max'] = max(entry['max'], longest)
+
+
+class Profiler:
+
+    def __init__(self, app, use_cprofile=False):
+        self.app = app
+        self.pid = os.getpid()
+        self.stats = {}
+        self.cprofile = cProfile.Profile() if use_cprofile else None
+        # Some generators run in a thread pool, only the handlers of the main thread are profiled with cProfile
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def install(self):
+        events = self.app.events
+
+        for event, listeners in events.listeners.items():
+            listeners[:] = [listener._replace(handler=self.wrap_handler(event, listener.handler)) for listener in listeners]
+
+        connect = events.connect
+
+        def profiled_connect(name, callback, priority):
+            return connect(name, self.wrap_handler(name, callback), priority)
+
+        events.connect = profiled_connect
+
+        connect('builder-inited', self.wrap_directives_and_roles, 0)
+        connect('env-merge-info', self.merge_worker_stats, 500)
+        connect('build-finished', self.write_stats, 1000)
+
+    def wrap(self, name, func):
+        @wraps(func)
+        def profiled(*args, **kwargs):
+            main_process = os.getpid() == self.pid
+            use_cprofile = self.cprofile is not None and main_process and threading.current_thread() is threading.main_thread()
+            depth = getattr(self.local, 'depth', 0)
+            if use_cprofile and depth == 0:
+                self.cprofile.enable()
+            self.local.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                self.local.depth = depth
+                if use_cprofile and depth == 0:
+                    self.cprofile.disable()
+                self.record(name, duration, main_process)
+
+        return profiled
+
+    def wrap_handler(self, event, handler):
+        if not is_profiled(handler):
+            return handler
+        return self.wrap('{}: {}'.format(event, handler_name(handler)), handler)
+
+    def wrap_directives_and_roles(self, app):
+        # Directives and roles are registered in docutils, some of them without going through the application
+        for name, directive in list(directives._directives.items()):
+            if isinstance(directive, type) and is_profiled(directive):
+                run = self.wrap('directive {}: {}'.format(name, handler_name(directive)), directive.run)
+                directives._directives[name] = type(directive.__name__, (directive,), {'run': run, '__module__': directive.__module__})
+
+        for name, role in list(roles._roles.items()):
+            if callable(role) and is_profiled(role):
+                roles._roles[name] = self.wrap('role {}: {}'.format(name, handler_name(role)), role)
+
+    def record(self, name, duration, main_process):
+        if main_process:
+            stats = self.stats
+        else:
+            # Parallel read process, the stats are merged back from its environment
+            env = self.app.env
+            if not hasattr(env, WORKER_STATS_ATTR):
+                setattr(env, WORKER_STATS_ATTR, {})
+            stats = getattr(env, WORKER_STATS_ATTR)
+
+        with self.lock:
+            add_stats(stats, name, 1, duration, duration)
+
+    def merge_worker_stats(self, app, env, docnames, other):
+        for name, entry in getattr(other, WORKER_STATS_ATTR, {}).items():
+            add_stats(self.stats, name, entry['calls'], entry['total'], entry['max'])
+
+    def write_stats(self, app, exception):
+        build_dir = app.config.build_dir
+        builder = app.builder.name
+
+        stats = {name: {'calls': entry['calls'], 'total': round(entry['total'], 4), 'max': round(entry['max'], 4)}
+                 for name, entry in sorted(self.stats.items(), key=lambda item: item[1]['total'], reverse=True)}
+        stats_path = os.path.join(build_dir, PROFILE_STATS_FMT.format(builder))
+        with open(stats_path, 'w') as f:
+            json.dump(stats, f, indent=4)
+        print('Saved profile of esp-docs handlers to %s' % stats_path)
+
+        if self.cprofile is not None:
+            cprofile_path = os.path.join(build_dir, PROFILE_CPROFILE_FMT.format(builder))
+            self.cprofile.dump_stats(cprofile_path)
+            print('Saved cProfile output to %s' % cprofile_path)
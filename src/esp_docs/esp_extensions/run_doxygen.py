@@ -1,16 +1,33 @@
 # Extension to generate Doxygen XML include files, with IDF config & soc macros included
 from __future__ import print_function, unicode_literals
 
+import hashlib
+import json
 import os
 import os.path
 import re
+import shutil
 import subprocess
 from io import open
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 
 from ..modified_files import get_modified_files, normalize_modified_file_path
-from ..util.util import copy_if_modified
+from .build_report import phase
+from ..util.util import copy_file_if_modified, get_manifest, sync_tree
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, each build then runs Doxygen on its own
+    fcntl = None
 
 ALL_KINDS = [
     ('function', 'Functions'),
@@ -24,6 +41,22 @@ ALL_KINDS = [
 """list of items that will be generated for a single API file
 """
 
+# Kinds which are listed as 'innerclass' of the header, the others are 'memberdef' in one of its sections
+CONTAINER_KINDS = ('union', 'struct', 'class')
+
+DOXYGEN_STATE_FILE = 'doxygen-state.json'
+PARTIAL_XML_DIR = 'xml_partial'
+# Written by the full Doxygen runs of the incremental mode, gives the partial runs the declarations of all the headers
+DOXYGEN_TAG_FILE = 'doxygen.tag'
+RE_XML_REF = re.compile(r'<ref refid="([^"]+)"')
+# References resolved through the tag file point to the same ids as in the full output, without being marked as external
+RE_XML_EXTERNAL_REF = re.compile(r'(<ref [^>]*?) external="[^"]*"')
+# Compounds which only hold the declarations of a single header. Anything else in the output
+# of a partial run (groups, namespaces, pages) can span several headers and needs a full Doxygen run
+SINGLE_HEADER_KINDS = ('file', 'struct', 'union', 'class', 'dir')
+# Marks a complete entry of the Doxygen output shared between the builds of a target, see run_doxygen_shared
+SHARED_OUTPUT_MARKER = 'complete'
+
 
 @dataclass
 class ApiPath:
@@ -98,16 +131,304 @@ def generate_doxygen(app, defines):
     # So take all of stderr and redirect it to a logfile (will contain warnings and errors)
     logfile = os.path.join(build_dir, 'doxygen-warning-log.txt')
 
+    xml_dir = os.path.join(build_dir, 'xml')
+    xml_in_dir = os.path.join(build_dir, 'xml_in')
+
+    with phase(app, 'doxygen'):
+        shared_dir = os.environ.get('DOCS_DOXYGEN_CACHE_DIR', None)
+        if shared_dir and fcntl is not None:
+            updated = run_doxygen_shared(app, shared_dir, doxyfile_main, doxygen_paths, doxy_env, logfile)
+        else:
+            updated = run_doxygen_local(app, doxyfile_main, doxygen_paths, doxy_env, logfile)
+
+        if updated is None:
+            # Doxygen has generated XML files in 'xml' directory.
+            # Copy them to 'xml_in', only touching the files which have changed.
+            sync_tree(xml_dir, xml_in_dir, delete_stale=True)
+        else:
+            modified_files, removed_files = updated
+            for file_name in modified_files:
+                copy_file_if_modified(os.path.join(xml_dir, file_name), os.path.join(xml_in_dir, file_name))
+            for file_name in removed_files:
+                if os.path.isfile(os.path.join(xml_in_dir, file_name)):
+                    os.remove(os.path.join(xml_in_dir, file_name))
+
+    # Generate 'api_name.inc' files from the Doxygen XML files
+    with phase(app, 'api_includes'):
+        convert_api_xml_to_inc(app, doxygen_paths)
+
+
+def run_doxygen(doxyfile, doxy_env, build_dir, logfile, config_overrides=None):
     with open(logfile, 'w') as f:
         # note: run Doxygen in the build directory, so the xml & xml_in files end up in there
-        subprocess.check_call(['doxygen', doxyfile_main], env=doxy_env, cwd=build_dir, stderr=f)
+        if config_overrides is None:
+            subprocess.check_call(['doxygen', doxyfile], env=doxy_env, cwd=build_dir, stderr=f)
+        else:
+            # Doxygen reads its configuration from stdin when given '-'
+            config = '@INCLUDE = {}\n'.format(doxyfile) + ''.join('{} = {}\n'.format(key, value) for key, value in config_overrides.items())
+            subprocess.run(['doxygen', '-'], input=config.encode('utf-8'), env=doxy_env, cwd=build_dir, stderr=f, check=True)
 
-    # Doxygen has generated XML files in 'xml' directory.
-    # Copy them to 'xml_in', only touching the files which have changed.
-    copy_if_modified(os.path.join(build_dir, 'xml/'), os.path.join(build_dir, 'xml_in/'))
 
-    # Generate 'api_name.inc' files from the Doxygen XML files
-    convert_api_xml_to_inc(app, doxygen_paths)
+def run_doxygen_local(app, doxyfile_main, doxygen_paths, doxy_env, logfile):
+    if os.environ.get('DOCS_INCREMENTAL_DOXYGEN', None):
+        return run_doxygen_incremental(app, doxyfile_main, doxygen_paths, doxy_env, logfile)
+
+    run_doxygen(doxyfile_main, doxy_env, app.config.build_dir, logfile)
+    return None
+
+
+@contextmanager
+def locked(lock_path):
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_doxygen_shared(app, shared_dir, doxyfile_main, doxygen_paths, doxy_env, logfile):
+    """Run Doxygen once for all the builds with the same Doxyfiles, macro definitions and target
+
+    The first build to get here runs Doxygen and stores its output in shared_dir, the others
+    (i.e. the other languages of the same target) wait for it and copy the output instead.
+
+    Returns:
+        same as run_doxygen_incremental
+    """
+    build_dir = app.config.build_dir
+    entry_dir = os.path.join(shared_dir, doxygen_config_hash(doxygen_paths, doxy_env))
+    os.makedirs(entry_dir, exist_ok=True)
+
+    with locked(os.path.join(entry_dir, 'lock')):
+        if os.path.isfile(os.path.join(entry_dir, SHARED_OUTPUT_MARKER)):
+            print('Reusing Doxygen XML from {}'.format(entry_dir))
+            sync_tree(os.path.join(entry_dir, 'xml'), os.path.join(build_dir, 'xml'), delete_stale=True)
+            shutil.copyfile(os.path.join(entry_dir, os.path.basename(logfile)), logfile)
+            # The state of the incremental mode does not describe this output anymore
+            if os.path.isfile(os.path.join(build_dir, DOXYGEN_STATE_FILE)):
+                os.remove(os.path.join(build_dir, DOXYGEN_STATE_FILE))
+            return None
+
+        updated = run_doxygen_local(app, doxyfile_main, doxygen_paths, doxy_env, logfile)
+
+        shutil.rmtree(os.path.join(entry_dir, 'xml'), ignore_errors=True)
+        shutil.copytree(os.path.join(build_dir, 'xml'), os.path.join(entry_dir, 'xml'))
+        shutil.copyfile(logfile, os.path.join(entry_dir, os.path.basename(logfile)))
+        open(os.path.join(entry_dir, SHARED_OUTPUT_MARKER), 'w').close()
+
+    return updated
+
+
+def file_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        # Missing headers are reported by Doxygen itself
+        return None
+
+
+def doxygen_config_hash(doxygen_paths, doxy_env):
+    hasher = hashlib.sha256()
+    for path in doxygen_paths:
+        hasher.update((file_hash(path) or 'missing').encode('utf-8'))
+    for key in ['ENV_DOXYGEN_DEFINES', 'PROJECT_PATH', 'IDF_TARGET']:
+        hasher.update('{}={}\n'.format(key, doxy_env.get(key, '')).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def get_compound_refids(xml_file_path):
+    """Get the ids of the compounds Doxygen generated for a header: the file itself and the structs, unions and classes it declares"""
+    if not os.path.isfile(xml_file_path):
+        # Nothing documented in the header
+        return []
+
+    compound = ET.parse(xml_file_path).getroot().find('compounddef')
+    return [compound.get('id')] + [inner.get('refid') for inner in compound.iterfind('innerclass')]
+
+
+def get_index_refids(index_path, compound_refids=None):
+    """Get the ids of the compounds listed in index.xml and of their members, only of compound_refids if given"""
+    refids = set()
+    for compound in ET.parse(index_path).getroot().iterfind('compound'):
+        if compound_refids is None or compound.get('refid') in compound_refids:
+            refids.add(compound.get('refid'))
+            refids.update(member.get('refid') for member in compound.iterfind('member'))
+    return refids
+
+
+def get_xml_refs(xml_dir, compound_refids):
+    """Get the ids referenced from the XML of the compounds"""
+    refs = set()
+    for refid in compound_refids:
+        xml_file_path = os.path.join(xml_dir, refid + '.xml')
+        if os.path.isfile(xml_file_path):
+            with open(xml_file_path, 'r', encoding='utf-8') as f:
+                refs.update(RE_XML_REF.findall(f.read()))
+    return refs
+
+
+def merge_partial_output(xml_dir, partial_dir, old_refids, new_refids):
+    """Move the XML of a partial Doxygen run into 'xml' and update index.xml with its compounds
+
+    Returns:
+        names of the updated and of the removed XML files
+    """
+    for refid in old_refids - new_refids:
+        if os.path.isfile(os.path.join(xml_dir, refid + '.xml')):
+            os.remove(os.path.join(xml_dir, refid + '.xml'))
+    for refid in new_refids:
+        with open(os.path.join(partial_dir, refid + '.xml'), 'r', encoding='utf-8') as f:
+            xml = RE_XML_EXTERNAL_REF.sub(r'\1', f.read())
+        with open(os.path.join(xml_dir, refid + '.xml'), 'w', encoding='utf-8') as f:
+            f.write(xml)
+
+    new_compounds = {compound.get('refid'): compound for compound in ET.parse(os.path.join(partial_dir, 'index.xml')).getroot().iterfind('compound')
+                     if compound.get('refid') in new_refids}
+
+    ET.register_namespace('xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+    index = ET.parse(os.path.join(xml_dir, 'index.xml'))
+    root = index.getroot()
+    compounds = []
+    # Keep the order of the existing index, compounds of new structs etc. are added at the end
+    for compound in root:
+        refid = compound.get('refid')
+        if refid in new_compounds:
+            compounds.append(new_compounds.pop(refid))
+        elif refid not in old_refids:
+            compounds.append(compound)
+    root[:] = compounds + list(new_compounds.values())
+    index.write(os.path.join(xml_dir, 'index.xml'), encoding='UTF-8', xml_declaration=True)
+
+    return sorted(refid + '.xml' for refid in new_refids) + ['index.xml'], sorted(refid + '.xml' for refid in old_refids - new_refids)
+
+
+def merge_warning_logs(logfile, partial_logfile, changed_paths):
+    """Replace the warnings about the changed headers in logfile with the ones from partial_logfile"""
+    kept_lines = []
+    keep = True
+    with open(logfile, 'r', encoding='utf-8') as f:
+        for line in f:
+            # Warnings start with the path of the header, multi-line warnings continue with indented lines
+            if not line[:1].isspace():
+                keep = line.split(':', 1)[0] not in changed_paths
+            if keep:
+                kept_lines.append(line)
+
+    with open(partial_logfile, 'r', encoding='utf-8') as f:
+        kept_lines += f.readlines()
+
+    with open(logfile, 'w', encoding='utf-8') as f:
+        f.writelines(kept_lines)
+
+
+def run_doxygen_incremental(app, doxyfile_main, doxygen_paths, doxy_env, logfile):
+    """Run Doxygen only on the INPUT headers which changed since the previous build
+
+    The partial run reads the declarations of the other headers from the tag file of the last full run,
+    so the references of the changed headers to them are kept. Falls back to a full run when:
+
+    - the Doxyfiles, the macro definitions or the list of headers changed
+    - the changed headers generate compounds shared with other headers (groups, namespaces, ...)
+    - the changed headers added or removed declarations, which the other headers may refer to
+    - references of the changed headers to the other headers were not resolved like in the previous output
+
+    What remains: a changed header which starts referring to a declaration of another header
+    only gets the reference if Doxygen resolves it through the tag file. The output of the
+    other headers is reused as it is, a full run (e.g. with a clean build directory) regenerates everything.
+
+    Returns:
+        names of the updated and of the removed XML files, or None after a full Doxygen run
+    """
+    build_dir = app.config.build_dir
+    xml_dir = os.path.join(build_dir, 'xml')
+    partial_dir = os.path.join(build_dir, PARTIAL_XML_DIR)
+    state_path = os.path.join(build_dir, DOXYGEN_STATE_FILE)
+    tag_path = os.path.join(build_dir, DOXYGEN_TAG_FILE)
+
+    api_paths = get_header_paths(app, doxygen_paths, '', xml_dir)
+    header_hashes = {api_path.header_path: file_hash(os.path.join(app.config.project_path, api_path.header_path)) for api_path in api_paths}
+    config_hash = doxygen_config_hash(doxygen_paths, doxy_env)
+
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    previous = state.get('headers', {})
+
+    changed = [api_path for api_path in api_paths if previous.get(api_path.header_path, {}).get('hash') != header_hashes[api_path.header_path]]
+    updated = ([], [])
+
+    if not state or not os.path.isfile(os.path.join(xml_dir, 'index.xml')):
+        full_run_reason = 'no previous Doxygen output'
+    elif state.get('config') != config_hash:
+        full_run_reason = 'Doxyfile or macro definitions changed'
+    elif set(previous) != set(header_hashes):
+        full_run_reason = 'INPUT headers were added or removed'
+    elif any(os.path.basename(api_path.xml_file_path) != os.path.basename(header_to_xml_path(api_path.api_name, xml_dir)) for api_path in changed):
+        # Doxygen names the output of headers with the same name after their shortest unique path, which depends on the other headers
+        full_run_reason = 'a changed header has the same name as another header'
+    elif not changed:
+        print('Doxygen INPUT headers unchanged, reusing the previous Doxygen XML')
+        return updated
+    elif not os.path.isfile(tag_path):
+        full_run_reason = 'no Doxygen tag file of the other headers'
+    else:
+        full_run_reason = None
+        print('Running doxygen on {} changed header(s)'.format(len(changed)))
+        changed_paths = [os.path.abspath(os.path.join(app.config.project_path, api_path.header_path)) for api_path in changed]
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        partial_logfile = logfile + '.partial'
+        run_doxygen(doxyfile_main, doxy_env, build_dir, partial_logfile, {
+            'INPUT': ' '.join('"{}"'.format(path) for path in changed_paths),
+            'XML_OUTPUT': PARTIAL_XML_DIR,
+            'GENERATE_HTML': 'NO',
+            'GENERATE_LATEX': 'NO',
+            'GENERATE_MAN': 'NO',
+            'GENERATE_RTF': 'NO',
+            'GENERATE_TAGFILE': '',
+            'TAGFILES': '"{}"'.format(tag_path),
+        })
+
+        partial_kinds = {compound.get('kind') for compound in ET.parse(os.path.join(partial_dir, 'index.xml')).getroot().iterfind('compound')}
+        if not partial_kinds.issubset(SINGLE_HEADER_KINDS):
+            full_run_reason = 'changed headers contain {}'.format(', '.join(sorted(partial_kinds.difference(SINGLE_HEADER_KINDS))))
+        else:
+            outputs = {api_path.header_path: get_compound_refids(os.path.join(partial_dir, os.path.basename(api_path.xml_file_path))) for api_path in changed}
+            old_refids = {refid for api_path in changed for refid in previous[api_path.header_path]['outputs']}
+            new_refids = {refid for refids in outputs.values() for refid in refids}
+
+            index_refids = get_index_refids(os.path.join(xml_dir, 'index.xml'))
+            old_ids = get_index_refids(os.path.join(xml_dir, 'index.xml'), old_refids)
+            new_ids = get_index_refids(os.path.join(partial_dir, 'index.xml'), new_refids)
+            new_refs = get_xml_refs(partial_dir, new_refids)
+            if old_ids != new_ids:
+                full_run_reason = 'changed headers added or removed declarations'
+            elif not (get_xml_refs(xml_dir, old_refids) - old_ids).issubset(new_refs) or not new_refs.issubset(index_refids):
+                full_run_reason = 'references of the changed headers to other headers changed'
+            else:
+                updated = merge_partial_output(xml_dir, partial_dir, old_refids, new_refids)
+                merge_warning_logs(logfile, partial_logfile, set(changed_paths))
+
+                for api_path in changed:
+                    previous[api_path.header_path] = {'hash': header_hashes[api_path.header_path], 'outputs': outputs[api_path.header_path]}
+
+        os.remove(partial_logfile)
+        shutil.rmtree(partial_dir, ignore_errors=True)
+
+    if full_run_reason:
+        print('Running doxygen on all headers: {}'.format(full_run_reason))
+        run_doxygen(doxyfile_main, doxy_env, build_dir, logfile, {'GENERATE_TAGFILE': '"{}"'.format(tag_path)})
+        previous = {api_path.header_path: {'hash': header_hashes[api_path.header_path], 'outputs': get_compound_refids(api_path.xml_file_path)}
+                    for api_path in api_paths}
+        updated = None
+
+    with open(state_path, 'w') as f:
+        json.dump({'config': config_hash, 'headers': previous}, f, indent=4)
+
+    return updated
 
 
 def get_header_paths(app, doxyfiles, inc_directory_path, xml_directory_path):
@@ -170,10 +491,21 @@ def convert_api_xml_to_inc(app, doxyfiles):
         os.makedirs(inc_directory_path)
 
     api_paths = get_header_paths(app, doxyfiles, inc_directory_path, xml_directory_path)
+    manifest = get_manifest(build_dir)
 
     print("Generating 'api_name.inc' files with Doxygen directives")
-    for api_path in api_paths:
-        final_rst_output = generate_directives(app, api_path.header_path, api_path.xml_file_path)
+
+    # Parsing the XML is the expensive part, spread it over the same number of processes Sphinx uses
+    jobs = getattr(app, 'parallel', 1)
+    if jobs > 1 and len(api_paths) > 1:
+        with ProcessPoolExecutor(jobs) as executor:
+            all_api_directives = list(executor.map(get_api_directives, [api_path.xml_file_path for api_path in api_paths],
+                                                   chunksize=max(1, len(api_paths) // (jobs * 4))))
+    else:
+        all_api_directives = [None] * len(api_paths)
+
+    for api_path, api_directives in zip(api_paths, all_api_directives):
+        final_rst_output = generate_directives(app, api_path.header_path, api_path.xml_file_path, api_directives)
 
         # For fast builds we skip unchanged API reference includes, but still keep
         # the ones generated from modified headers.
@@ -185,15 +517,10 @@ def convert_api_xml_to_inc(app, doxyfiles):
         if dir_name:
             os.makedirs(dir_name, exist_ok=True)
 
-        inc_exists = os.path.isfile(api_path.inc_file_path)
-        previous_rst_output = ''
-        if inc_exists:
-            with open(api_path.inc_file_path, 'r', encoding='utf-8') as inc_file_old:
-                previous_rst_output = inc_file_old.read()
+        # Only touch the files which changed, without reading back the ones in the manifest
+        manifest.write_if_modified(api_path.inc_file_path, final_rst_output)
 
-        if (not inc_exists) or previous_rst_output != final_rst_output:
-            with open(api_path.inc_file_path, 'w', encoding='utf-8') as inc_file:
-                inc_file.write(final_rst_output)
+    manifest.save()
 
 
 def get_doxyfile_input_paths(app, doxyfile_path):
@@ -270,11 +597,12 @@ def header_to_xml_path(header_file, xml_directory_path):
     return xml_file_path
 
 
-def generate_directives(app, header_file_path, xml_file_path):
+def generate_directives(app, header_file_path, xml_file_path, api_directives=None):
     """Generate API reference with Doxygen directives for a header file.
 
     Args:
         header_file_path: a path to the header file with API.
+        api_directives: directives already extracted from xml_file_path, if any
 
     Returns:
         Doxygen directives for the header file.
@@ -291,16 +619,10 @@ def generate_directives(app, header_file_path, xml_file_path):
     if (app.config.run_doxygen_header_edit_callback):
         rst_output = app.config.run_doxygen_header_edit_callback(rst_output, header_file_path)
 
-    try:
-        import xml.etree.cElementTree as ET
-    except ImportError:
-        import xml.etree.ElementTree as ET
-
-    tree = ET.ElementTree(file=xml_file_path)
-    for kind, label in ALL_KINDS:
-        rst_output += get_directives(tree, kind)
+    if api_directives is None:
+        api_directives = get_api_directives(xml_file_path)
 
-    return rst_output
+    return rst_output + api_directives
 
 
 def get_rst_header(header_name):
@@ -322,69 +644,48 @@ def get_rst_header(header_name):
     return rst_output
 
 
-def select_container(innerclass_list, container):
-    """Select container (struct, union, class) type from innerclass list.
+def get_api_directives(xml_file_path):
+    """Get directives for all 'kinds' of API in a single pass over the XML generated by Doxygen.
 
     Args:
-        innerclass_list: raw list with structs, unions or classes
-                         extracted from Dogygen's xml file.
+        xml_file_path: path to the XML file generated for the header
 
     Returns:
-        Doxygen directives with containers (structs, unions, classes) selected from the list.
-        Note: some structs are excluded as described on code below.
-
-    """
-
-    rst_output = ''
-    for line in innerclass_list.splitlines():
-        # container is denoted by the keyword "struct", "union" or "class" at the beginning of line
-        if line.startswith(container):
-            # skip structures that are part of union
-            # they are documented by 'doxygenunion' directive
-            if container == "struct" and line.find('::') > 0:
-                continue
-            _, name = re.split(r'\t+', line)
-
-            rst_output += '.. doxygen%s:: ' % (container)
-            rst_output += name
-            rst_output += '\n'
-            if container in ["struct", "class"]:
-                rst_output += '    :members:\n'
-                rst_output += '\n'
-
-    return rst_output
-
-
-def get_directives(tree, kind):
-    """Get directives for specific 'kind'.
-
-    Args:
-        tree: the ElementTree 'tree' of XML by Doxygen
-        kind: name of API "kind" to be generated
-
-    Returns:
-        Doxygen directives for selected 'kind'.
+        Doxygen directives, grouped by 'kind' in the order of ALL_KINDS.
         Note: the header with "kind" name is included.
 
     """
 
-    rst_output = ''
-    if kind in ['union', 'struct', 'class']:
-        innerclass_list = ''
-        for elem in tree.iterfind('compounddef/innerclass'):
-            innerclass_list += elem.attrib['refid'] + '\t' + elem.text + '\n'
-        rst_output += select_container(innerclass_list, kind)
-    else:
-        for elem in tree.iterfind(
-                'compounddef/sectiondef/memberdef[@kind="%s"]' % kind):
-            name = elem.find('name')
-
-            if name.text:
-                rst_output += '.. doxygen%s:: ' % kind
-                rst_output += name.text + '\n'
-
-    if rst_output:
-        all_kinds_dict = dict(ALL_KINDS)
-        rst_output = get_rst_header(all_kinds_dict[kind]) + rst_output + '\n'
+    directives = {kind: [] for kind, _ in ALL_KINDS}
+
+    # Parsing the whole file with the C parser and walking the children of the compound once is faster
+    # than iterparse, which has to call back into Python for every element of the descriptions
+    for compound in ET.parse(xml_file_path).getroot().iterfind('compounddef'):
+        for elem in compound:
+            if elem.tag == 'sectiondef':
+                for member in elem.iterfind('memberdef'):
+                    kind = member.get('kind')
+                    name = member.findtext('name')
+                    if kind in directives and kind not in CONTAINER_KINDS and name:
+                        directives[kind].append('.. doxygen%s:: %s\n' % (kind, name))
+            elif elem.tag == 'innerclass':
+                # container is denoted by the keyword "struct", "union" or "class" at the beginning of the refid
+                container = next((kind for kind in CONTAINER_KINDS if elem.attrib['refid'].startswith(kind)), None)
+                if container is None:
+                    continue
+                # skip structures that are part of union
+                # they are documented by 'doxygenunion' directive
+                if container == 'struct' and '::' in elem.text:
+                    continue
+
+                directive = '.. doxygen%s:: %s\n' % (container, elem.text)
+                if container in ['struct', 'class']:
+                    directive += '    :members:\n\n'
+                directives[container].append(directive)
+
+    rst_output = []
+    for kind, label in ALL_KINDS:
+        if directives[kind]:
+            rst_output += [get_rst_header(label)] + directives[kind] + ['\n']
 
-    return rst_output
+    return ''.join(rst_output)
@@ -0,0 +1,123 @@
+# Extension to reuse the doctrees of target independent documents between targets
+#
+# When building with build-docs --shared-env the first target of each language is built as usual,
+# the doctree directory of the remaining targets is then seeded with its environment. As idf_target
+# is an 'env' config value Sphinx would re-read every document anyway, so we store a fingerprint of the
+# effective source of each document (after IDF_TARGET substitution and with the result of all
+# only/:filter: conditions) and only re-read the documents whose fingerprint differs for the current target.
+import hashlib
+import os
+import re
+
+from .format_esp_target import get_substituter
+
+# Matches both '.. only:: <expr>' directives and ':<expr>: <entry>' filter clauses used in
+# toctrees and lists. Other field lists (e.g. :maxdepth:) are evaluated as well, which is harmless
+RE_CONDITION = re.compile(r'^\s*(?:\.\.\s+only::\s*(.+?)|:(.+?):\s*\S.*?)\s*$', re.MULTILINE)
+
+
+def setup(app):
+    app.add_config_value('shared_env', False, '')
+
+    app.connect('env-before-read-docs', skip_unchanged_docs)
+    app.connect('env-updated', store_fingerprints)
+
+    return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
+
+
+def is_inside(path, directory):
+    return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+
+
+def eval_conditions(app, content):
+    results = []
+    for only_expr, filter_expr in RE_CONDITION.findall(content):
+        expr = only_expr or filter_expr
+        try:
+            results.append('{}={}'.format(expr, app.tags.eval_condition(expr)))
+        except Exception:
+            results.append('{}=invalid'.format(expr))
+    return results
+
+
+def source_fingerprint(app, path, hasher):
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    sub = get_substituter(app)
+    if sub is not None:
+        content = sub.substitute(content)
+
+    hasher.update(content.encode('utf-8'))
+    for result in eval_conditions(app, content):
+        hasher.update(result.encode('utf-8'))
+
+
+def get_breathe_docnames(env):
+    """Documents which read Doxygen XML through breathe directives"""
+    return {docname for _, docnames in getattr(env, 'breathe_file_state', {}).values() for docname in docnames}
+
+
+def doc_fingerprint(app, env, docname, breathe_docnames=None):
+    """Fingerprint of a document and everything it includes, as seen by the current target.
+
+    Returns None if the document can not be shared between targets
+    """
+    # The Doxygen XML is generated in the build directory of each target, breathe doesn't record it in env.dependencies
+    if docname in (get_breathe_docnames(env) if breathe_docnames is None else breathe_docnames):
+        return None
+
+    paths = [env.doc2path(docname)]
+
+    for dep in sorted(env.dependencies.get(docname, ())):
+        dep_path = os.path.normpath(os.path.join(app.srcdir, dep))
+        # Generated includes (API reference, kconfig etc.) are written to the build directory of each target
+        if is_inside(dep_path, app.config.build_dir):
+            return None
+        paths.append(dep_path)
+
+    hasher = hashlib.sha256()
+    try:
+        for path in paths:
+            hasher.update(path.encode('utf-8'))
+            source_fingerprint(app, path, hasher)
+    except (OSError, ValueError):
+        # Missing includes or invalid substitutions, let Sphinx read the document and report the error
+        return None
+
+    return hasher.hexdigest()
+
+
+def skip_unchanged_docs(app, env, docnames):
+    if not app.config.shared_env:
+        return
+
+    seed_target = getattr(env, 'shared_env_target', None)
+    fingerprints = getattr(env, 'shared_env_fingerprints', {})
+
+    # Only environments seeded from another target need this, otherwise Sphinx already knows what changed
+    if seed_target is None or seed_target == app.config.idf_target:
+        return
+
+    skipped = set()
+    breathe_docnames = get_breathe_docnames(env)
+    for docname in docnames:
+        stored = fingerprints.get(docname)
+        if stored is None or not os.path.isfile(os.path.join(env.doctreedir, docname + '.doctree')):
+            continue
+        if doc_fingerprint(app, env, docname, breathe_docnames) == stored:
+            skipped.add(docname)
+
+    # Sphinx reads the list we were given, so it has to be modified in place
+    docnames[:] = [docname for docname in docnames if docname not in skipped]
+
+    print('Reusing {} document(s) parsed for target {}, re-reading {}'.format(len(skipped), seed_target, len(docnames)))
+
+
+def store_fingerprints(app, env):
+    if not app.config.shared_env:
+        return
+
+    env.shared_env_target = app.config.idf_target
+    breathe_docnames = get_breathe_docnames(env)
+    env.shared_env_fingerprints = {docname: doc_fingerprint(app, env, docname, breathe_docnames) for docname in env.found_docs}
@@ -50,3 +50,5 @@ def setup(app):
     app.add_config_value('add_warnings_content', None, 'env')
 
     app.connect('source-read', add_warning)
+
+    return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
@@ -1,13 +1,11 @@
-import subprocess
+from .git_info import get_git_info
 
 
 # Get revision used for constructing github URLs
 def get_github_rev():
-    path = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).strip().decode('utf-8')
-    try:
-        tag = subprocess.check_output(['git', 'describe', '--exact-match'], stderr=subprocess.DEVNULL).strip().decode('utf-8')
-    except subprocess.CalledProcessError:
-        tag = None
+    git_info = get_git_info()
+    path = git_info.short_rev
+    tag = git_info.exact_tag
     print('Git commit ID: ', path)
     if tag:
         print('Git tag: ', tag)
@@ -0,0 +1,162 @@
+# Git metadata used by the configuration and the extensions of a build
+#
+# build_docs.py collects it once with write_git_info() and passes the file to all the language/target
+# builds in GIT_INFO_ENV_VAR, so they don't each run the same git commands. Values missing from the file
+# (or all of them, when Sphinx is run directly) are queried from git the first time they are needed.
+import json
+import os
+import re
+import subprocess
+import threading
+
+GIT_INFO_ENV_VAR = 'DOCS_GIT_INFO'
+GIT_INFO_FILE = 'git-info.json'
+
+RE_GITMODULES_SECTION = re.compile(r'\[\s*(?:submodule\s+"(.*)"|[^\]]*)\s*\]')
+RE_GITMODULES_VALUE = re.compile(r'([A-Za-z][\w-]*)\s*=\s*(.*)')
+
+_git_info = None
+_git_info_lock = threading.Lock()
+
+
+def git_output(args, cwd=None, stderr=None):
+    return subprocess.check_output(['git'] + args, cwd=cwd, stderr=stderr).strip().decode('utf-8')
+
+
+class GitInfo():
+    """Git metadata of the project, each value is only queried once"""
+
+    def __init__(self, values=None, cwd=None):
+        self.values = dict(values or {})
+        self.cwd = cwd
+
+    def _get(self, key, query):
+        if key not in self.values:
+            self.values[key] = query()
+        return self.values[key]
+
+    def _optional(self, args):
+        try:
+            return git_output(args, cwd=self.cwd, stderr=subprocess.DEVNULL)
+        except subprocess.CalledProcessError:
+            return None
+
+    @property
+    def describe(self):
+        """Output of `git describe --abbrev=10`, or None if there is no tag to describe HEAD"""
+        return self._get('describe', lambda: self._optional(['describe', '--abbrev=10']))
+
+    @property
+    def exact_tag(self):
+        """Tag of HEAD, or None"""
+        return self._get('exact_tag', lambda: self._optional(['describe', '--exact-match']))
+
+    @property
+    def short_rev(self):
+        return self._get('short_rev', lambda: git_output(['rev-parse', '--short', 'HEAD'], cwd=self.cwd))
+
+    @property
+    def branch(self):
+        """Name of the checked out branch, 'HEAD' if detached"""
+        return self._get('branch', lambda: git_output(['rev-parse', '--abbrev-ref', 'HEAD'], cwd=self.cwd))
+
+    @property
+    def toplevel(self):
+        return self._get('toplevel', lambda: git_output(['rev-parse', '--show-toplevel'], cwd=self.cwd))
+
+    @property
+    def submodules(self):
+        """Dict of {submodule path: [url absolute or relative to git root, short commit hash]}"""
+        return self._get('submodules', self._query_submodules)
+
+    def _query_submodules(self):
+        git_root = self.toplevel
+
+        submodules = git_output(['submodule', 'status'], cwd=git_root).split('\n')
+        if submodules[0] == '':
+            return {}
+
+        gitmodules = parse_gitmodules(os.path.join(git_root, '.gitmodules'))
+        urls_by_path = {values.get('path'): values.get('url') for values in gitmodules.values()}
+
+        submodule_dict = {}
+        for sub in submodules:
+            sub_info = sub.lstrip().split(' ')
+
+            # Get short hash, 7 digits
+            rev = sub_info[0].lstrip('-+U')[0:7]
+            path = sub_info[1].lstrip('./')
+
+            # Submodules are normally named after their path
+            rel_url = gitmodules.get(path, {}).get('url') or urls_by_path.get(sub_info[1])
+            if rel_url is None:
+                raise RuntimeError('No url for submodule {} in .gitmodules'.format(path))
+
+            submodule_dict[path] = [rel_url.lstrip('./'), rev]
+
+        return submodule_dict
+
+    def collect(self):
+        """Query all the values, the ones git can't provide are left out"""
+        for name in ['describe', 'exact_tag', 'short_rev', 'branch', 'toplevel', 'submodules']:
+            try:
+                getattr(self, name)
+            except (subprocess.CalledProcessError, OSError, RuntimeError) as e:
+                print('Could not get git {}: {}'.format(name, e))
+        return self.values
+
+
+def parse_gitmodules(path):
+    """Parse a .gitmodules file into a dict of {submodule name: {key: value}}
+
+    Only the subset of the git config syntax used in .gitmodules files is supported: [submodule "name"]
+    sections, one key = value per line, quoted values and comments.
+    """
+    submodules = {}
+    section = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+
+            match = RE_GITMODULES_SECTION.match(line)
+            if match:
+                section = submodules.setdefault(match.group(1), {}) if match.group(1) is not None else None
+                continue
+
+            match = RE_GITMODULES_VALUE.match(line)
+            if match and section is not None:
+                value = match.group(2)
+                if value.startswith('"'):
+                    value = value[1:value.index('"', 1)] if '"' in value[1:] else value[1:]
+                else:
+                    value = re.split(r'\s[#;]', value, maxsplit=1)[0].rstrip()
+                section[match.group(1).lower()] = value
+
+    return submodules
+
+
+def write_git_info(path, cwd=None):
+    values = GitInfo(cwd=cwd).collect()
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(values, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def get_git_info():
+    """Git metadata of the current build, shared by the configuration and all the extensions"""
+    global _git_info
+    with _git_info_lock:
+        if _git_info is None:
+            values = None
+            path = os.environ.get(GIT_INFO_ENV_VAR)
+            if path:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        values = json.load(f)
+                except (OSError, ValueError) as e:
+                    print('Could not read git metadata from {}: {}'.format(path, e))
+            _git_info = GitInfo(values)
+        return _git_info
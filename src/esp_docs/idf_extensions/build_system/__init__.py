@@ -6,18 +6,123 @@
 #
 # Then emits the new 'project-build-info' event which has information read from IDF
 # build system, that other extensions can use to generate relevant data.
+#
+# The configured dummy project is reused by later builds as long as the fingerprint of
+# its inputs (component CMakeLists/Kconfig/sdkconfig files, the root Kconfig and sdkconfig.rename,
+# IDF cmake scripts, the kconfig_new config generator and the target)
+# is unchanged, see config_fingerprint().
+#
+# The 'project-build-info' handlers made with @concurrent_generator each shell out to a separate
+# tool to generate their include files, these are run concurrently, see emit_project_build_info().
+import functools
+import hashlib
 import json
 import os.path
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from sphinx.util import logging
 
+from ...esp_extensions.build_report import phase
+
 # this directory also contains the dummy IDF project
 project_path = os.path.abspath(os.path.dirname(__file__))
 
+# Stored next to project_description.json, holds the fingerprint of the inputs it was generated from
+CONFIG_HASH_FILE = 'esp_docs_config_hash'
+
+
+def concurrent_generator(produce):
+    """Make a 'project-build-info' handler out of a generator which can run concurrently with the others
+
+    produce(app, project_description) only writes its own output files, it runs in a worker thread
+    before the event is emitted, see emit_project_build_info(). It can return a callable which is
+    then called on the main thread when the handler is called by the event, in priority order, to
+    do what isn't safe from another thread: adding tags, emitting events, ... e.g. Doxygen runs on the
+    'defines-generated' event which gen_defines emits from there.
+
+    The handler runs produce itself if the event wasn't emitted by emit_project_build_info().
+    """
+    @functools.wraps(produce)
+    def handler(app, project_description):
+        future = _produced.pop((id(app), produce), None)
+        finish = future.result() if future else produce(app, project_description)
+        if finish:
+            finish()
+
+    handler.produce = produce
+    return handler
+
+
+# Results of the generators run by emit_project_build_info(), by (id(app), produce function)
+_produced = {}
+
+
+def emit_project_build_info(app, project_description):
+    """Emit 'project-build-info', running the generators in a thread pool first
+
+    The generators mostly wait for their subprocesses, so the startup of the build only takes as
+    long as the slowest of them. The event itself is emitted on this thread as usual, so the handlers
+    are called in priority order and their errors are reported by Sphinx, a generator's error
+    is raised when its handler is called.
+    """
+    generators = [listener.handler.produce for listener in app.events.listeners['project-build-info']
+                  if hasattr(listener.handler, 'produce')]
+
+    try:
+        if generators:
+            with ThreadPoolExecutor(len(generators)) as executor:
+                for produce in generators:
+                    _produced[(id(app), produce)] = executor.submit(produce, app, project_description)
+
+        app.emit('project-build-info', project_description)
+    finally:
+        for produce in generators:
+            _produced.pop((id(app), produce), None)
+
+
+def is_config_input(filename):
+    return (filename in ('CMakeLists.txt', 'idf_component.yml')
+            or filename.startswith(('Kconfig', 'sdkconfig'))
+            or filename.endswith('.cmake'))
+
+
+def config_fingerprint(idf_path, target, extra_files=()):
+    """Hash of everything 'idf.py reconfigure' reads to generate project_description.json
+
+    Args:
+        idf_path: root of the IDF tree
+        target: the IDF target the dummy project is configured for
+        extra_files: other files the configuration depends on, e.g. the dummy project CMakeLists.txt
+
+    Returns:
+        hex digest of the fingerprint
+    """
+    hasher = hashlib.sha256()
+    hasher.update('target={}\nidf_path={}\n'.format(target, os.path.realpath(idf_path)).encode('utf-8'))
+
+    paths = list(extra_files)
+    for top_dir in [os.path.join(idf_path, 'components'), os.path.join(idf_path, 'tools', 'cmake')]:
+        for root, dirs, files in os.walk(top_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            paths += [os.path.join(root, f) for f in files if is_config_input(f)]
+
+    # The root Kconfig and renames, and the generator of sdkconfig.h itself
+    paths += [path for path in [os.path.join(idf_path, 'Kconfig'), os.path.join(idf_path, 'sdkconfig.rename')] if os.path.isfile(path)]
+    for root, dirs, files in os.walk(os.path.join(idf_path, 'tools', 'kconfig_new')):
+        dirs[:] = [d for d in dirs if d != '__pycache__' and not d.startswith('.')]
+        paths += [os.path.join(root, f) for f in files]
+
+    for path in sorted(paths):
+        hasher.update(os.path.relpath(path, idf_path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            hasher.update(hashlib.sha256(f.read()).digest())
+
+    return hasher.hexdigest()
+
 
 class IdfBuilder():
     def __init__(self) -> None:
@@ -51,6 +156,9 @@ class IdfBuilder():
 
         build_dir = os.path.dirname(app.doctreedir.rstrip(os.sep))
         cmake_build_dir = os.path.join(build_dir, 'build_dummy_project')
+        sdkconfig_path = os.path.join(build_dir, 'dummy_project_sdkconfig')
+        project_description_path = os.path.join(cmake_build_dir, 'project_description.json')
+        hash_path = os.path.join(cmake_build_dir, CONFIG_HASH_FILE)
         idf_py_path = os.path.join(app.config.project_path, 'tools', 'idf.py')
         print('Running idf.py...')
         idf_py = [sys.executable,
@@ -60,21 +168,32 @@ class IdfBuilder():
                   '-C',
                   project_path,
                   '-D',
-                  'SDKCONFIG={}'.format(os.path.join(build_dir, 'dummy_project_sdkconfig'))
+                  'SDKCONFIG={}'.format(sdkconfig_path)
                   ]
 
-        # force a clean idf.py build w/ new sdkconfig each time
-        # (not much slower than 'reconfigure', avoids any potential config & build versioning problems
-        shutil.rmtree(cmake_build_dir, ignore_errors=True)
-        print('Starting new dummy IDF project... ')
+        with phase(app, 'idf_py'):
+            config_hash = config_fingerprint(app.config.project_path, app.config.idf_target,
+                                             [os.path.join(project_path, 'CMakeLists.txt')])
+
+            if self.read_config_hash(hash_path) == config_hash and os.path.isfile(project_description_path) and os.path.isfile(sdkconfig_path):
+                print('Dummy IDF project inputs unchanged, reusing {}'.format(project_description_path))
+            else:
+                # force a clean idf.py build w/ new sdkconfig each time the inputs change
+                # (not much slower than 'reconfigure', avoids any potential config & build versioning problems
+                shutil.rmtree(cmake_build_dir, ignore_errors=True)
+                print('Starting new dummy IDF project... ')
+
+                # Always append preview in-case we are building a preview only target
+                subprocess.check_call(idf_py + ['--preview', 'set-target', app.config.idf_target])
 
-        # Always append preview in-case we are building a preview only target
-        subprocess.check_call(idf_py + ['--preview', 'set-target', app.config.idf_target])
+                print('Running CMake on dummy project...')
+                subprocess.check_call(idf_py + ['reconfigure'])
 
-        print('Running CMake on dummy project...')
-        subprocess.check_call(idf_py + ['reconfigure'])
+                # Only written once the project is configured, an interrupted build is never reused
+                with open(hash_path, 'w') as f:
+                    f.write(config_hash)
 
-        with open(os.path.join(cmake_build_dir, 'project_description.json')) as f:
+        with open(project_description_path) as f:
             self.project_description = json.load(f)
         if self.project_description['target'] != app.config.idf_target:
             # this shouldn't really happen unless someone has been moving around directories inside _build, as
@@ -84,10 +203,18 @@ class IdfBuilder():
                                 'Is build directory contents corrupt?')
                                .format(app.config.idf_target, self.project_description['target']))
 
-        app.emit('project-build-info', self.project_description)
+        emit_project_build_info(app, self.project_description)
 
         return []
 
+    @staticmethod
+    def read_config_hash(hash_path):
+        try:
+            with open(hash_path, 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
     def append_component_info(self, rst_output, header_file_path):
         """Appends build specific component info to the rst for the API-reference header include.
 
@@ -188,9 +315,6 @@ class IdfBuilder():
         return rst_output
 
 
-idf_builder = IdfBuilder()
-
-
 def setup(app):
     # Setup some common paths
 
@@ -222,6 +346,10 @@ def setup(app):
 
     app.add_event('project-build-info')
 
+    # One builder per Sphinx application, the project description is only read by later
+    # extensions and the doxygen header callback, so it's safe to share with parallel workers
+    idf_builder = IdfBuilder()
+
     # we want this to run early in the docs build but unclear exactly when
     app.connect('config-inited', idf_builder.generate_idf_info)
 
@@ -1,5 +1,6 @@
 # Extension to generate esp_err definition as .rst
-from ..util.util import call_with_python, copy_if_modified
+from ..util.util import call_with_python_cached, copy_if_modified, get_generator_cache_dir
+from .build_system import concurrent_generator
 
 
 def setup(app):
@@ -7,8 +8,13 @@ def setup(app):
     return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
 
 
+@concurrent_generator
 def generate_err_defs(app, project_description):
     # Generate 'esp_err_defs.inc' file with ESP_ERR_ error code definitions from inc file
     esp_err_inc_path = '{}/inc/esp_err_defs.inc'.format(app.config.build_dir)
-    call_with_python('{}/tools/gen_esp_err_to_name.py --rst_output {}.in'.format(app.config.project_path, esp_err_inc_path))
+    # The error codes are collected from the headers of the components. The rest of the project is not part
+    # of the inputs, it contains the headers generated by each build (e.g. sdkconfig.h) in docs/_build
+    call_with_python_cached('{}/tools/gen_esp_err_to_name.py --rst_output {{output}}'.format(app.config.project_path), esp_err_inc_path + '.in',
+                            ['tools/gen_esp_err_to_name.py', 'components/**/*.h'], app.config.project_path,
+                            get_generator_cache_dir(app.config.build_dir))
     copy_if_modified(esp_err_inc_path + '.in', esp_err_inc_path)
@@ -4,14 +4,28 @@
 #
 # Then emits the new 'defines-generated' event which has a dictionary of raw text define values
 # that other extensions can use to generate relevant data.
+#
+# All headers are preprocessed in a single compiler call through a generated umbrella header.
+# The result is cached together with the hashes of every file the preprocessor read, so
+# warm builds don't need to run the compiler at all.
 
 import glob
+import hashlib
+import json
 import os
 import pprint
 import re
+import shlex
 import subprocess
 
+from ..esp_extensions.build_report import phase
+from .build_system import concurrent_generator
+
+DEFINES_CACHE_FILE = 'macro-definitions-cache.json'
+UMBRELLA_HEADER = 'macro-definitions-headers.h'
+
 
+@concurrent_generator
 def generate_defines(app, project_description):
     sdk_config_path = os.path.join(project_description['build_dir'], 'config')
     compiler = project_description['monitor_toolprefix'] + 'gcc'
@@ -19,8 +33,7 @@ def generate_defines(app, project_description):
     #
     # TODO: this should use the set of "config which can't be changed" eventually,
     # not the header
-    defines = get_defines(os.path.join(project_description['build_dir'],
-                                       'config', 'sdkconfig.h'), sdk_config_path, compiler)
+    sdkconfig_header = os.path.join(project_description['build_dir'], 'config', 'sdkconfig.h')
 
     # Add all SOC _caps.h headers and kconfig macros to the defines
     #
@@ -33,28 +46,84 @@ def generate_defines(app, project_description):
     rom_path = [p for p in project_description['build_component_paths'] if p.endswith('/esp_rom')][0]
     rom_headers = [os.path.join(rom_path, project_description['target'], 'esp_rom_caps.h')]
 
-    for header in (soc_headers + rom_headers):
-        defines.update(get_defines(header, sdk_config_path, compiler))
+    with phase(app, 'defines'):
+        defines = get_cached_defines([sdkconfig_header] + sorted(soc_headers) + rom_headers, sdk_config_path, compiler, app.config.build_dir)
 
     # write a list of definitions to make debugging easier
     with open(os.path.join(app.config.build_dir, 'macro-definitions.txt'), 'w') as f:
         pprint.pprint(defines, f)
         print('Saved macro list to %s' % f.name)
 
-    add_tags(app, defines)
+    def finish():
+        # On the main thread, see concurrent_generator
+        add_tags(app, defines)
+
+        app.emit('defines-generated', defines)
+        app.emit('format-esp-target-add-sub', defines)
+
+    return finish
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def parse_dependencies(deps_path):
+    # Make rule written by the compiler with -MD, "target: dep1 dep2 ..." continued over several lines
+    with open(deps_path, 'r') as f:
+        rule = f.read().replace('\\\n', ' ')
+    return shlex.split(rule.partition(': ')[2])
+
 
-    app.emit('defines-generated', defines)
-    app.emit('format-esp-target-add-sub', defines)
+def dependencies_unchanged(dependencies):
+    try:
+        return all(file_hash(path) == digest for path, digest in dependencies.items())
+    except OSError:
+        return False
 
 
-def get_defines(header_path, sdk_config_path, compiler):
+def get_cached_defines(headers, sdk_config_path, compiler, build_dir):
+    """Return the macros defined by headers, reusing the previous result if none of the files they read changed"""
+    cache_path = os.path.join(build_dir, DEFINES_CACHE_FILE)
+    try:
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    if cache.get('compiler') == compiler and cache.get('headers') == headers and dependencies_unchanged(cache.get('dependencies', {})):
+        print('Macro headers unchanged, reusing %s' % cache_path)
+        return cache['defines']
+
+    defines, dependencies = get_defines(headers, sdk_config_path, compiler, build_dir)
+
+    cache = {'compiler': compiler, 'headers': headers, 'dependencies': dependencies, 'defines': defines}
+    with open(cache_path, 'w') as f:
+        json.dump(cache, f, indent=4)
+
+    return defines
+
+
+def get_defines(headers, sdk_config_path, compiler, build_dir):
+    """Run the preprocessor once over all headers
+
+    Returns:
+        dict of macro names to values, and dict of hashes for every file read by the preprocessor
+    """
     defines = {}
     # Note: we run C preprocessor here without any -I arguments (except "sdkconfig.h"), so assumption is
     # that these headers are all self-contained and don't include any other headers
     # not in the same directory
-    print('Reading macros from %s...' % (header_path))
-    processed_output = subprocess.check_output([compiler, '-I', sdk_config_path,
-                                                '-dM', '-E', header_path]).decode()
+    umbrella_path = os.path.join(build_dir, UMBRELLA_HEADER)
+    deps_path = umbrella_path + '.d'
+    with open(umbrella_path, 'w') as f:
+        for header_path in headers:
+            print('Reading macros from %s...' % (header_path))
+            f.write('#include "%s"\n' % header_path)
+
+    processed_output = subprocess.check_output([compiler, '-I', sdk_config_path, '-MD', '-MF', deps_path,
+                                                '-dM', '-E', umbrella_path]).decode()
     for line in processed_output.split('\n'):
         line = line.strip()
         m = re.search('#define ([^ ]+) ?(.*)', line)
@@ -67,7 +136,9 @@ def get_defines(header_path, sdk_config_path, compiler):
                 value = ''  # macros that expand to multiple tokens (ie function macros) cause doxygen errors, so just mark as 'defined'
             defines[name] = value
 
-    return defines
+    dependencies = {path: file_hash(path) for path in parse_dependencies(deps_path)}
+
+    return defines, dependencies
 
 
 def add_tags(app, defines):
@@ -3,7 +3,8 @@ from __future__ import print_function
 
 import os.path
 
-from ..util.util import call_with_python, copy_if_modified
+from ..util.util import call_with_python_cached, copy_if_modified, get_generator_cache_dir
+from .build_system import concurrent_generator
 
 
 def setup(app):
@@ -13,10 +14,12 @@ def setup(app):
     return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
 
 
+@concurrent_generator
 def generate_idf_tools_links(app, project_description):
     print('Generating IDF Tools list')
-    os.environ['IDF_MAINTAINER'] = '1'
     tools_rst = os.path.join(app.config.build_dir, 'inc', 'idf-tools-inc.rst')
     tools_rst_tmp = os.path.join(app.config.build_dir, 'idf-tools-inc.rst')
-    call_with_python('{}/tools/idf_tools.py gen-doc --output {}'.format(app.config.project_path, tools_rst_tmp))
+    call_with_python_cached('{}/tools/idf_tools.py gen-doc --output {{output}}'.format(app.config.project_path), tools_rst_tmp,
+                            ['tools/idf_tools.py', 'tools/tools.json'], app.config.project_path, get_generator_cache_dir(app.config.build_dir),
+                            extra_env={'IDF_MAINTAINER': '1'})
     copy_if_modified(tools_rst_tmp, tools_rst)
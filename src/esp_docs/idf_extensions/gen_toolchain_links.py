@@ -5,6 +5,7 @@ import os.path
 from collections import namedtuple
 
 from ..util.util import copy_if_modified
+from .build_system import concurrent_generator
 
 BASE_URL = 'https://dl.espressif.com/dl/'
 
@@ -24,6 +25,7 @@ def setup(app):
     return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
 
 
+@concurrent_generator
 def generate_toolchain_download_links(app, project_description):
     print('Generating toolchain download links')
     toolchain_tmpdir = '{}/toolchain_inc'.format(app.config.build_dir)
@@ -8,10 +8,11 @@ from __future__ import print_function, unicode_literals
 
 import os
 import re
-import subprocess
 from io import open
 
+from ..git_info import get_git_info
 from ..util.util import copy_if_modified
+from .build_system import concurrent_generator
 
 TEMPLATES = {
     'en': {
@@ -127,6 +128,7 @@ def setup(app):
     return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
 
 
+@concurrent_generator
 def generate_version_specific_includes(app, project_description):
     language = app.config.language
     tmp_out_dir = os.path.join(app.config.build_dir, 'version_inc')
@@ -195,13 +197,13 @@ def get_version():
     """
     Returns a tuple of (name of branch/tag/commit-id, type branch/tag/commit, is_stable)
     """
+    git_info = get_git_info()
+
     # Use git to look for a tag
-    try:
-        tag = subprocess.check_output(['git', 'describe', '--exact-match']).strip().decode('utf-8')
+    tag = git_info.exact_tag
+    if tag:
         is_stable = re.match(r'v[0-9\.]+$', tag) is not None
         return (tag, 'tag', is_stable)
-    except subprocess.CalledProcessError:
-        pass
 
     # No tag, look at branch name from CI, this will give the correct branch name even if the ref for the branch we
     # merge into has moved forward before the pipeline runs
@@ -210,9 +212,9 @@ def get_version():
         return (branch, 'branch', False)
 
     # Try to find the branch name even if docs are built locally
-    branch = subprocess.check_output(['git', 'rev-parse', '--abbrev-ref', 'HEAD']).strip().decode('utf-8')
+    branch = git_info.branch
     if branch != 'HEAD':
         return (branch, 'branch', False)
 
     # As a last resort we return commit SHA-1, should never happen in CI/docs that should be published
-    return (subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).strip().decode('utf-8'), 'commit', False)
+    return (git_info.short_rev, 'commit', False)
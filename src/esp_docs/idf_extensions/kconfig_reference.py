@@ -1,9 +1,17 @@
 # Extension to generate the KConfig reference list
+#
+# kconfig.inc only depends on the Kconfig files of the project and on the target, so it is cached
+# under the hash of these inputs in KCONFIG_CACHE_DIR and reused by the other languages and builds.
+import hashlib
 import os.path
 import subprocess
 import sys
 
-from ..util.util import copy_if_modified
+from ..util.util import copy_if_modified, get_generator_cache_dir, hash_file, store_cached_file
+from .build_system import concurrent_generator
+
+
+KCONFIG_CACHE_DIR = 'kconfig_cache'
 
 
 def setup(app):
@@ -14,6 +22,7 @@ def setup(app):
     return {'parallel_read_safe': True, 'parallel_write_safe': True, 'version': '0.1'}
 
 
+@concurrent_generator
 def generate_reference(app, project_description):
     build_dir = os.path.dirname(app.doctreedir.rstrip(os.sep))
 
@@ -33,6 +42,18 @@ def generate_reference(app, project_description):
         if os.path.exists(sdkconfig_rename):
             sdkconfig_renames.add(sdkconfig_rename)
 
+    fingerprint = kconfig_fingerprint(app.config.project_path, app.config.idf_target, kconfigs, kconfig_projbuilds, sdkconfig_renames)
+    cache_dir = os.path.join(get_generator_cache_dir(build_dir), KCONFIG_CACHE_DIR)
+    cached_inc_path = os.path.join(cache_dir, '{}-{}.inc'.format(app.config.idf_target, fingerprint))
+    if os.path.isfile(cached_inc_path):
+        print('Kconfig inputs unchanged, reusing {}'.format(cached_inc_path))
+        try:
+            copy_if_modified(cached_inc_path, kconfig_inc_path)
+            return
+        except FileNotFoundError:
+            # Replaced by a build with different inputs in the meantime
+            pass
+
     kconfigs_source_path = '{}/inc/kconfigs_source.in'.format(build_dir)
     kconfig_projbuilds_source_path = '{}/inc/kconfig_projbuilds_source.in'.format(build_dir)
 
@@ -61,3 +82,35 @@ def generate_reference(app, project_description):
                     ]
     subprocess.check_call(confgen_args, cwd=app.config.project_path)
     copy_if_modified(kconfig_inc_path + '.in', kconfig_inc_path)
+    store_cached_file(kconfig_inc_path + '.in', cached_inc_path, app.config.idf_target + '-')
+
+
+def kconfig_files(kconfigs):
+    """All the Kconfig files of the components, including the ones they source"""
+    paths = set()
+    for component_dir in {os.path.dirname(k) for k in kconfigs if k}:
+        for root, dirs, files in os.walk(component_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            paths.update(os.path.join(root, f) for f in files if f.startswith('Kconfig'))
+    return paths
+
+
+def kconfig_fingerprint(idf_path, target, kconfigs, kconfig_projbuilds, sdkconfig_renames):
+    """Hash of everything confgen.py reads to generate kconfig.inc"""
+    hasher = hashlib.sha256()
+    hasher.update('target={}\n'.format(target).encode('utf-8'))
+    for name, values in [('kconfigs', kconfigs), ('projbuilds', kconfig_projbuilds), ('renames', sorted(sdkconfig_renames))]:
+        hasher.update('{}={}\n'.format(name, ';'.join(values)).encode('utf-8'))
+
+    paths = kconfig_files(kconfigs + kconfig_projbuilds) | set(sdkconfig_renames)
+    paths |= {os.path.join(idf_path, 'Kconfig'), os.path.join(idf_path, 'sdkconfig.rename')}
+    # The generator itself
+    for root, dirs, files in os.walk(os.path.join(idf_path, 'tools', 'kconfig_new')):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        paths.update(os.path.join(root, f) for f in files)
+
+    for path in sorted(paths):
+        if os.path.isfile(path):
+            hasher.update('{}={}\n'.format(os.path.relpath(path, idf_path), hash_file(path)).encode('utf-8'))
+
+    return hasher.hexdigest()
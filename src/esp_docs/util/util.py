@@ -16,12 +16,19 @@
 
 from __future__ import unicode_literals
 
+import glob
+import hashlib
+import json
 import os
 import shutil
 import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import sys
 from io import open
+from stat import S_ISREG
 import re
 
 import packaging.version
@@ -37,37 +44,236 @@ except ImportError:
     _urlretrieve = urllib.urlretrieve
 
 
-def files_equal(path_1, path_2):
+# Hashes of the files generated and copied by the extensions, stored in the build directory
+MANIFEST_FILE = 'generated-files-manifest.json'
+HASH_CHUNK_SIZE = 1024 * 1024
+# Set by build_docs.py to share the outputs of call_with_python_cached between builds
+GENERATOR_CACHE_ENV_VAR = 'DOCS_GENERATOR_CACHE_DIR'
+# Suffix of the files being written to the generator cache
+CACHE_TMP_SUFFIX = '.tmp'
+
+
+def hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class FileManifest():
+    """Hashes of generated files, so unchanged outputs can be detected without reading them back.
+
+    The hash of a file is stored together with the size and mtime the file had when it was hashed,
+    and is only trusted as long as those are unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.modified = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def record(self, file_path, digest):
+        stat = os.stat(file_path)
+        with self.lock:
+            self.entries[os.path.abspath(file_path)] = [digest, stat.st_size, stat.st_mtime_ns]
+            self.modified = True
+
+    def file_hash(self, file_path):
+        """Hash of the current content of file_path, or None if it does not exist"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry and entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns:
+            return entry[0]
+
+        digest = hash_file(file_path)
+        self.record(file_path, digest)
+        return digest
+
+    def write_if_modified(self, file_path, content):
+        """Write content to file_path unless it already has this content.
+
+        Returns:
+            True if the file was written
+        """
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        if self.file_hash(file_path) == digest:
+            return False
+
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        self.record(file_path, digest)
+        return True
+
+    def save(self):
+        # Generators running in threads save the same manifest, the temporary file is only used by one of them at a time
+        with self.lock:
+            if not self.modified:
+                return
+            self.modified = False
+
+            tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                # dumps() uses the C encoder, dump() does not
+                f.write(json.dumps(self.entries))
+            os.replace(tmp_path, self.path)
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(build_dir):
+    """Get the manifest of build_dir, shared by all the extensions of a build"""
+    path = os.path.join(build_dir, MANIFEST_FILE)
+    with _manifests_lock:
+        if path not in _manifests:
+            _manifests[path] = FileManifest(path)
+        return _manifests[path]
+
+
+def files_equal(path_1, path_2, manifest=None):
     if not os.path.exists(path_1) or not os.path.exists(path_2):
         return False
-    file_1_contents = ''
-    with open(path_1, 'r', encoding='utf-8') as f_1:
-        file_1_contents = f_1.read()
-    file_2_contents = ''
-    with open(path_2, 'r', encoding='utf-8') as f_2:
-        file_2_contents = f_2.read()
-    return file_1_contents == file_2_contents
+    if manifest is not None:
+        return manifest.file_hash(path_1) == manifest.file_hash(path_2)
+    if os.path.getsize(path_1) != os.path.getsize(path_2):
+        return False
+    return hash_file(path_1) == hash_file(path_2)
+
+
+def chunks_equal(path_1, path_2, size):
+    """Compare two files of the same size, files which fit in a chunk are read with a single call"""
+    chunk_size = min(size + 1, HASH_CHUNK_SIZE)
+    with open(path_1, 'rb', buffering=0) as f_1, open(path_2, 'rb', buffering=0) as f_2:
+        while True:
+            chunk_1 = f_1.read(chunk_size)
+            if chunk_1 != f_2.read(chunk_size):
+                return False
+            if len(chunk_1) < chunk_size:
+                return True
+
+
+def fast_copy(src_file_path, dst_file_path, src_stat):
+    """Copy a file in the kernel when possible and give it the mtime of the source"""
+    try:
+        with open(src_file_path, 'rb') as src, open(dst_file_path, 'wb') as dst:
+            # Lets file systems which support it share the data instead of copying it
+            remaining = src_stat.st_size
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+    except (AttributeError, OSError):
+        # copy_file_range is only available on Linux and not for all file systems,
+        # shutil uses sendfile where it can
+        shutil.copyfile(src_file_path, dst_file_path)
+
+    shutil.copymode(src_file_path, dst_file_path)
+    os.utime(dst_file_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+
+
+def sync_file(src_file_path, dst_file_path, src_stat=None):
+    """Copy src_file_path to dst_file_path unless they are already equal.
+
+    Files are compared by size and mtime first, copies keep the mtime of their source. Files with the same size
+    but a different mtime, e.g. regenerated with the same content, are compared chunk by chunk, which is cheaper
+    than hashing the source.
+
+    Returns:
+        True if the file was copied
+    """
+    src_stat = src_stat or os.stat(src_file_path)
+    try:
+        dst_stat = os.stat(dst_file_path)
+    except OSError:
+        dst_stat = None
+
+    if dst_stat is not None and dst_stat.st_size == src_stat.st_size:
+        if dst_stat.st_mtime_ns == src_stat.st_mtime_ns or chunks_equal(src_file_path, dst_file_path, src_stat.st_size):
+            return False
+
+    dst_dir_name = os.path.dirname(dst_file_path)
+    if dst_dir_name:
+        os.makedirs(dst_dir_name, exist_ok=True)
+    fast_copy(src_file_path, dst_file_path, src_stat)
+
+    return True
+
+
+def scan_tree(path):
+    """Get all the files below path, as a dict of relative path to stat result"""
+    files = {}
+    dirs = ['']
+    while dirs:
+        rel_dir = dirs.pop()
+        try:
+            entries = list(os.scandir(os.path.join(path, rel_dir)))
+        except OSError:
+            continue
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name)
+            if entry.is_dir():
+                dirs.append(rel_path)
+            else:
+                files[rel_path] = entry.stat()
+    return files
+
+
+def sync_tree(src_path, dst_path, delete_stale=False, jobs=None):
+    """Make dst_path contain the same files as src_path, only touching the files which changed.
+
+    Args:
+        delete_stale: also remove the files in dst_path which are not in src_path
+        jobs: number of threads copying files, defaults to the same as ThreadPoolExecutor
+
+    Returns:
+        relative paths of the copied files and of the removed files
+    """
+    src_files = scan_tree(src_path)
+
+    def sync(rel_paths):
+        return [rel_path for rel_path in rel_paths
+                if sync_file(os.path.join(src_path, rel_path), os.path.join(dst_path, rel_path), src_files[rel_path])]
+
+    jobs = jobs or min(32, (os.cpu_count() or 1) + 4)
+    rel_paths = list(src_files)
+    # A few batches per thread, submitting every file on its own costs more than comparing it
+    batch_size = max(1, len(rel_paths) // (jobs * 4))
+    with ThreadPoolExecutor(jobs) as executor:
+        batches = executor.map(sync, [rel_paths[i:i + batch_size] for i in range(0, len(rel_paths), batch_size)])
+        copied = [rel_path for batch in batches for rel_path in batch]
+
+    removed = []
+    if delete_stale:
+        removed = [rel_path for rel_path in scan_tree(dst_path) if rel_path not in src_files]
+        for rel_path in removed:
+            os.remove(os.path.join(dst_path, rel_path))
+
+    return copied, removed
 
 
 def copy_file_if_modified(src_file_path, dst_file_path):
-    if not files_equal(src_file_path, dst_file_path):
-        dst_dir_name = os.path.dirname(dst_file_path)
-        if not os.path.isdir(dst_dir_name):
-            os.makedirs(dst_dir_name)
-        shutil.copy(src_file_path, dst_file_path)
+    sync_file(src_file_path, dst_file_path)
 
 
 def copy_if_modified(src_path, dst_path):
+    """Copy src_path to dst_path, file or directory, only touching the files which changed."""
     if os.path.isfile(src_path):
         copy_file_if_modified(src_path, dst_path)
-        return
-
-    src_path_len = len(src_path)
-    for root, dirs, files in os.walk(src_path):
-        for src_file_name in files:
-            src_file_path = os.path.join(root, src_file_name)
-            dst_file_path = os.path.join(dst_path + root[src_path_len:], src_file_name)
-            copy_file_if_modified(src_file_path, dst_file_path)
+    else:
+        sync_tree(src_path, dst_path)
 
 
 def download_file_if_missing(from_url, to_path):
@@ -82,12 +288,94 @@ def download_file_if_missing(from_url, to_path):
                 fobj.write(tmp.read())
 
 
-def call_with_python(cmd):
+def call_with_python(cmd, extra_env=None):
     # using sys.executable ensures that the scripts are called with the same Python interpreter
-    if os.system('{} {}'.format(sys.executable, cmd)) != 0:
+    # extra_env is only set for the script, os.environ is shared by the generators running in other threads
+    env = dict(os.environ, **extra_env) if extra_env else None
+    if subprocess.call('{} {}'.format(sys.executable, cmd), shell=True, env=env) != 0:
         raise RuntimeError('{} failed'.format(cmd))
 
 
+def get_generator_cache_dir(build_dir):
+    """Directory of the generator outputs shared by all the builds of a build_docs run, see call_with_python_cached"""
+    return os.environ.get(GENERATOR_CACHE_ENV_VAR, os.path.join(build_dir, 'generator_cache'))
+
+
+def inputs_fingerprint(base_dir, patterns, key=''):
+    """Hash of the files matching the glob patterns relative to base_dir.
+
+    The files are identified by their path, size and mtime rather than by their content, so
+    large input sets (e.g. all the headers of a project) can be fingerprinted without reading them.
+    """
+    hasher = hashlib.sha256(key.encode('utf-8'))
+    paths = set()
+    for pattern in patterns:
+        paths.update(glob.glob(os.path.join(base_dir, pattern), recursive=True))
+
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Removed since it was listed, e.g. by another build cleaning up its files
+            continue
+        if not S_ISREG(stat.st_mode):
+            continue
+        hasher.update('{}:{}:{}\n'.format(os.path.relpath(path, base_dir), stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def store_cached_file(path, cached_path, prefix):
+    """Copy path to cached_path, removing the other entries starting with prefix in the same directory"""
+    cache_dir = os.path.dirname(cached_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # The directory is shared by the builds of all the languages and targets, which store their entries
+    # concurrently. Their temporary files are left alone and an entry can be removed by several of them
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and not name.endswith(CACHE_TMP_SUFFIX) and os.path.join(cache_dir, name) != cached_path:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    # Other builds can read the cache at any time, so it is only replaced once complete
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(cached_path) + '.', suffix=CACHE_TMP_SUFFIX, dir=cache_dir)
+    os.close(fd)
+    try:
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, cached_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def call_with_python_cached(cmd, output_path, inputs, base_dir, cache_dir, extra_env=None):
+    """call_with_python for scripts whose output only depends on the files matching the inputs globs.
+
+    The output of the script is kept in cache_dir under the fingerprint of the inputs and copied to
+    output_path instead of calling the script again as long as they are unchanged.
+
+    Args:
+        cmd: Command to run, with '{output}' in place of the path of the file it generates
+        output_path: File generated by the command
+        inputs: Glob patterns, relative to base_dir, of the files read by the command, including the script itself
+        extra_env: Environment variables set for the command, see call_with_python
+    """
+    name = os.path.basename(output_path)
+    fingerprint = inputs_fingerprint(base_dir, inputs, key=cmd + repr(sorted((extra_env or {}).items())))
+    cached_path = os.path.join(cache_dir, '{}-{}'.format(name, fingerprint))
+
+    try:
+        shutil.copyfile(cached_path, output_path)
+        print('Inputs of {} unchanged, reusing {}'.format(name, cached_path))
+        return
+    except FileNotFoundError:
+        pass
+
+    call_with_python(cmd.format(output=output_path), extra_env)
+    store_cached_file(output_path, cached_path, name + '-')
+
+
 def is_stable_version(version):
     """Heuristic for whether this is the latest stable release"""
     if not version.startswith('v'):
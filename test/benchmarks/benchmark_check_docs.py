@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+# Benchmark of matching the sanitized warning log of a build against the known warnings file,
+# on a synthetic log where part of the warnings are new
+#
+# Usage: ./benchmark_check_docs.py [number of log lines] [number of known warnings]
+
+import sys
+import time
+
+from esp_docs.check_docs import LogMessage, find_new_messages
+
+
+def legacy_find_new_messages(messages, known_messages):
+    # List based implementation used before the known messages were indexed
+    new_messages = list()
+    known_idx = 0
+    for msg in messages:
+        try:
+            known_idx = known_messages.index(msg.sanitized_text, known_idx)
+        except ValueError:
+            new_messages.append(msg)
+    return new_messages
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    result = func()
+    print('{:<40} {:8.2f}s'.format(name, time.perf_counter() - start))
+    return result
+
+
+def main():
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_known = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    known_messages = ['components/api_{0}.h:line: warning: Member api_{0} (function) of file api_{0}.h is not documented.\n'.format(i)
+                      for i in range(num_known)]
+    # Every other log line is a known warning, in order, the rest are new warnings
+    lines = []
+    for i in range(num_lines):
+        if i % 2:
+            lines.append('new_{0}.rst:line: WARNING: undefined label: new_{0}\n'.format(i))
+        else:
+            lines.append(known_messages[i // 2 * num_known // num_lines])
+    messages = [LogMessage(line, line) for line in lines]
+    print('{} log lines, {} known warnings'.format(num_lines, num_known))
+
+    indexed = measure('indexed', lambda: find_new_messages(messages, known_messages))
+    legacy = measure('list search', lambda: legacy_find_new_messages(messages, known_messages))
+
+    assert legacy == indexed, 'Outputs differ'
+
+
+if __name__ == '__main__':
+    main()
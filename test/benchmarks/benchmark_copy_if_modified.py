@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#
+# Benchmark of the synchronisation of the Doxygen 'xml' directory to 'xml_in',
+# on a synthetic tree of XML files
+#
+# Usage: ./benchmark_copy_if_modified.py [number of files]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from esp_docs.util.util import sync_tree
+
+
+def legacy_files_equal(path_1, path_2):
+    if not os.path.exists(path_1) or not os.path.exists(path_2):
+        return False
+    with open(path_1, 'r', encoding='utf-8') as f_1:
+        file_1_contents = f_1.read()
+    with open(path_2, 'r', encoding='utf-8') as f_2:
+        file_2_contents = f_2.read()
+    return file_1_contents == file_2_contents
+
+
+def legacy_copy_if_modified(src_path, dst_path):
+    # Implementation used before sync_tree: text comparison of every file
+    src_path_len = len(src_path)
+    for root, dirs, files in os.walk(src_path):
+        for src_file_name in files:
+            src_file_path = os.path.join(root, src_file_name)
+            dst_file_path = os.path.join(dst_path + root[src_path_len:], src_file_name)
+            if not legacy_files_equal(src_file_path, dst_file_path):
+                os.makedirs(os.path.dirname(dst_file_path), exist_ok=True)
+                shutil.copy(src_file_path, dst_file_path)
+
+
+def generate_tree(path, num_files):
+    member = '<memberdef kind="function"><name>func_{}</name><detaileddescription><para>{}</para></detaileddescription></memberdef>'
+    text = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 4
+    for i in range(num_files):
+        sub_dir = os.path.join(path, 'dir{}'.format(i % 10)) if i % 3 == 0 else path
+        os.makedirs(sub_dir, exist_ok=True)
+        with open(os.path.join(sub_dir, 'api_{}_8h.xml'.format(i)), 'w') as f:
+            f.write('<doxygen>{}</doxygen>'.format(''.join(member.format(j, text) for j in range(10 + i % 40))))
+
+
+def regenerate_tree(path):
+    # Doxygen writes all files again on every run, with the same content for unchanged headers
+    now = time.time_ns()
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            os.utime(os.path.join(root, name), ns=(now, now))
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    func()
+    print('{:<50} {:8.2f}s'.format(name, time.perf_counter() - start))
+
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        src = os.path.join(temp_dir, 'xml')
+        generate_tree(src, num_files)
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(src) for name in files)
+        print('{} files, {:.1f} MB'.format(num_files, size / 1e6))
+
+        legacy_dst = os.path.join(temp_dir, 'legacy')
+        measure('legacy: first copy', lambda: legacy_copy_if_modified(src, legacy_dst))
+        measure('legacy: unchanged', lambda: legacy_copy_if_modified(src, legacy_dst))
+
+        dst = os.path.join(temp_dir, 'xml_in')
+        measure('sync_tree: first copy', lambda: sync_tree(src, dst, delete_stale=True))
+        measure('sync_tree: unchanged', lambda: sync_tree(src, dst, delete_stale=True))
+        regenerate_tree(src)
+        measure('sync_tree: regenerated with the same content', lambda: sync_tree(src, dst, delete_stale=True))
+
+        regenerate_tree(src)
+        measure('legacy: regenerated with the same content', lambda: legacy_copy_if_modified(src, legacy_dst))
+        measure('sync_tree, single thread: regenerated with the same content', lambda: sync_tree(src, dst, delete_stale=True, jobs=1))
+
+
+if __name__ == '__main__':
+    main()
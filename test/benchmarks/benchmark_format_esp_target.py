@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#
+# Benchmark of the IDF_TARGET substitutions of StringSubstituter on a documentation tree, e.g. the docs
+# directory of ESP-IDF, with as many SOC defines added as substitutions as an ESP-IDF build has.
+# Each document also gets local substitution defines, as used in e.g. the peripherals docs of ESP-IDF.
+#
+# Usage: ./benchmark_format_esp_target.py [docs directory] [number of SOC defines]
+
+import os
+import re
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from esp_docs.esp_extensions.format_esp_target import StringSubstituter
+
+DEFAULT_DOCS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'docs')
+
+LOCAL_DEFINES = ''.join('{{IDF_TARGET_PIN_{0}:default="IO{0}", esp32="IO{1}", esp32s2, esp32s3="IO{2}", esp32c3="IO{3}"}}\n'
+                        .format(i, i + 1, i + 2, i + 3) for i in range(20))
+
+
+class LegacyStringSubstituter(StringSubstituter):
+
+    def add_local_subs(self, matches):
+        # Regex matching of each define, done before the defines were parsed once
+        local_sub_strings = {}
+        for sub_def in matches:
+            match_default = re.match(r'^\s*default(\s*)=(\s*)\"(.*?)\"', sub_def[1])
+            match_target = re.match(r'^.*{}\b(.*?)=(\s*)\"(.*?)\"'.format(self.target_name), sub_def[1])
+            local_sub_strings['{' + 'IDF_TARGET_{}'.format(sub_def[0]) + '}'] = (match_target or match_default).groups()[2]
+        return local_sub_strings
+
+    def substitute(self, content):
+        # One str.replace() per substitution, as done before the tags were replaced in a single pass
+        sub_defs = self.RE_PATTERN.findall(content)
+        local_sub_strings = self.add_local_subs(sub_defs) if sub_defs else {}
+        content = self.RE_PATTERN.sub('', content)
+
+        for key in local_sub_strings:
+            content = content.replace(key, local_sub_strings[key])
+        for key in self.substitute_strings:
+            content = content.replace(key, self.substitute_strings[key])
+        return content
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    result = func()
+    print('{:<40} {:8.2f}s'.format(name, time.perf_counter() - start))
+    return result
+
+
+def make_substituter(cls, num_defines, build_dir):
+    sub = cls()
+    config = SimpleNamespace(idf_target='esp32s3', build_dir=build_dir)
+    sub.init_sub_strings(config)
+    sub.add_sub(SimpleNamespace(config=config), {'SOC_DEFINE_{}'.format(i): '({}U)'.format(i) for i in range(num_defines)})
+    return sub
+
+
+def main():
+    docs_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DOCS_DIR
+    num_defines = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+
+    documents = []
+    for root, _, files in os.walk(docs_dir):
+        for name in files:
+            if name.endswith(('.rst', '.inc')):
+                with open(os.path.join(root, name), encoding='utf-8') as f:
+                    documents.append(LOCAL_DEFINES + f.read())
+    print('{} documents, {:.1f} MB, {} SOC defines'.format(len(documents), sum(len(d) for d in documents) / 1e6, num_defines))
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        current = make_substituter(StringSubstituter, num_defines, build_dir)
+        legacy = make_substituter(LegacyStringSubstituter, num_defines, build_dir)
+
+    single_pass = measure('single pass', lambda: [current.substitute(d) for d in documents])
+    replace = measure('str.replace per substitution', lambda: [legacy.substitute(d) for d in documents])
+
+    assert single_pass == replace, 'Outputs differ'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+#
+# Benchmark of the extraction of Doxygen directives from the XML generated for each header,
+# on a synthetic set of XML files of about the size of the ESP-IDF API reference
+#
+# Usage: ./benchmark_run_doxygen.py [number of headers] [number of processes]
+
+import os
+import re
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+from esp_docs.esp_extensions.run_doxygen import ALL_KINDS, get_api_directives, get_rst_header
+
+MEMBER = ('<memberdef kind="{kind}" id="{file_id}_1a{index}" prot="public" static="no">'
+          '<type>esp_err_t</type><name>{name}</name>'
+          '<param><type><ref refid="struct_1a" kindref="compound">uart_config_t</ref> *</type><declname>config</declname></param>'
+          '<briefdescription><para>Brief description of {name}.</para></briefdescription>'
+          '<detaileddescription><para>{text}</para><para><parameterlist kind="param"><parameteritem>'
+          '<parameternamelist><parametername>config</parametername></parameternamelist>'
+          '<parameterdescription><para>{text}</para></parameterdescription></parameteritem></parameterlist>'
+          '</para></detaileddescription><location file="components/driver/include/{file_id}.h" line="{index}"/></memberdef>')
+
+
+def generate_xml(path, file_id, num_members=60, num_containers=10):
+    text = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8
+    inner = ''.join('<innerclass refid="{0}{1}_{2}" prot="public">{1}_{2}{3}</innerclass>'.format(kind, file_id, i, '::inner' if i % 5 == 4 else '')
+                    for i in range(num_containers) for kind in ['struct', 'union'])
+    sections = ''
+    for section_kind in ['func', 'define', 'typedef', 'enum']:
+        member_kind = {'func': 'function'}.get(section_kind, section_kind)
+        members = ''.join(MEMBER.format(kind=member_kind, file_id=file_id, index=i, name='{}_{}_{}'.format(file_id, member_kind, i), text=text)
+                          for i in range(num_members // 4))
+        sections += '<sectiondef kind="{}">{}</sectiondef>'.format(section_kind, members)
+
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n<doxygen version="1.9.1">'
+                '<compounddef id="{0}_8h" kind="file" language="C++"><compoundname>{0}.h</compoundname>{1}{2}'
+                '</compounddef></doxygen>'.format(file_id, inner, sections))
+
+
+def legacy_select_container(innerclass_list, container):
+    rst_output = ''
+    for line in innerclass_list.splitlines():
+        if line.startswith(container):
+            if container == "struct" and line.find('::') > 0:
+                continue
+            _, name = re.split(r'\t+', line)
+
+            rst_output += '.. doxygen%s:: ' % (container)
+            rst_output += name
+            rst_output += '\n'
+            if container in ["struct", "class"]:
+                rst_output += '    :members:\n'
+                rst_output += '\n'
+
+    return rst_output
+
+
+def legacy_get_directives(tree, kind):
+    rst_output = ''
+    if kind in ['union', 'struct', 'class']:
+        innerclass_list = ''
+        for elem in tree.iterfind('compounddef/innerclass'):
+            innerclass_list += elem.attrib['refid'] + '\t' + elem.text + '\n'
+        rst_output += legacy_select_container(innerclass_list, kind)
+    else:
+        for elem in tree.iterfind('compounddef/sectiondef/memberdef[@kind="%s"]' % kind):
+            name = elem.find('name')
+
+            if name.text:
+                rst_output += '.. doxygen%s:: ' % kind
+                rst_output += name.text + '\n'
+
+    if rst_output:
+        all_kinds_dict = dict(ALL_KINDS)
+        rst_output = get_rst_header(all_kinds_dict[kind]) + rst_output + '\n'
+
+    return rst_output
+
+
+def legacy_get_api_directives(xml_file_path):
+    # ElementTree based implementation used before the single-pass extraction
+    tree = ET.ElementTree(file=xml_file_path)
+    rst_output = ''
+    for kind, label in ALL_KINDS:
+        rst_output += legacy_get_directives(tree, kind)
+    return rst_output
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    result = func()
+    print('{:<40} {:8.2f}s'.format(name, time.perf_counter() - start))
+    return result
+
+
+def main():
+    num_headers = int(sys.argv[1]) if len(sys.argv) > 1 else 700
+    jobs = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    with tempfile.TemporaryDirectory() as xml_dir:
+        paths = [os.path.join(xml_dir, 'api_{}_8h.xml'.format(i)) for i in range(num_headers)]
+        for i, path in enumerate(paths):
+            generate_xml(path, 'api_{}'.format(i))
+        size = sum(os.path.getsize(path) for path in paths)
+        print('{} headers, {:.1f} MB of XML, {} processes'.format(num_headers, size / 1e6, jobs))
+
+        legacy = measure('one pass per kind', lambda: [legacy_get_api_directives(path) for path in paths])
+        single_pass = measure('single pass', lambda: [get_api_directives(path) for path in paths])
+        with ProcessPoolExecutor(jobs) as executor:
+            pooled = measure('single pass, process pool',
+                             lambda: list(executor.map(get_api_directives, paths, chunksize=max(1, num_headers // (jobs * 4)))))
+
+        assert legacy == single_pass == pooled, 'Outputs differ'
+
+
+if __name__ == '__main__':
+    main()
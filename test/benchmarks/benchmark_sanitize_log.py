@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+# Benchmark of the sanitization of a warning log, either a real log (e.g. doxygen-warning-log.txt of an
+# ESP-IDF build) or a synthetic log with the kind of warnings Doxygen emits
+#
+# Usage: ./benchmark_sanitize_log.py [log file | number of lines]
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+from esp_docs.check_docs import RE_ANONYMOUS_FIELD, sanitize_line, sanitize_log
+
+LEGACY_FILENAME_REGEX = re.compile('[^:]*/([^/:]*)(:.*)')
+LEGACY_LINENUM_REGEX = re.compile('([^:]*)(:[0-9]+:)(.*)')
+LEGACY_DUPLICATE_LINENUM_REGEX = re.compile(r'([^:]*)(:[0-9]+\.)(.*)')
+LEGACY_TERMINAL_CONTROL_REGEX = re.compile(r'\x1B\[[0-9;]*[a-zA-Z]|\[[0-9;]+m')
+
+WARNINGS = [
+    '{path}/components/driver/include/driver/uart_{i}.h:{i}: warning: Member uart_set_{i} (function) of file uart_{i}.h is not documented.\n',
+    "{path}/components/esp_wifi/include/esp_wifi_{i}.h:{i}: warning: argument 'cfg' of command @param is not found "
+    'in the argument list of esp_wifi_init_{i}(const wifi_init_config_t *config)\n',
+    '{path}/components/soc/include/soc/uart_struct_{i}.h:{i}: warning: parameters of member uart_dev_t::@{i} are not (all) documented\n',
+    "  parameter 'config'\n",
+    '{path}/components/esp_hw_support/include/esp_intr_{i}.h:{i}: warning: Found ; while parsing initializer list! '
+    '(doxygen could be confused by a macro call without semicolon)\n',
+]
+
+
+def legacy_sanitize_line(line):
+    line = re.sub(LEGACY_TERMINAL_CONTROL_REGEX, '', line)
+    line = re.sub(LEGACY_FILENAME_REGEX, r'\1\2', line)
+    line = re.sub(LEGACY_LINENUM_REGEX, r'\1:line:\3', line)
+    line = re.sub(LEGACY_DUPLICATE_LINENUM_REGEX, r'\1:line.\3', line)
+    return line
+
+
+def legacy_check(log_file, out_file):
+    # Implementation used before the sanitizer was rewritten: one regex pass per filter and the whole log in memory
+    all_messages = []
+    with open(log_file) as f, open(out_file, 'w') as o:
+        for line in f:
+            sanitized_line = legacy_sanitize_line(line)
+            all_messages.append((line, sanitized_line))
+            o.write(sanitized_line)
+    return [msg for msg in all_messages if not re.match(RE_ANONYMOUS_FIELD, msg[1])]
+
+
+def streamed_check(log_file, out_file):
+    with open(log_file) as f, open(out_file, 'w', buffering=1024 * 1024) as o:
+        return [tuple(msg) for msg in sanitize_log(f, o) if not RE_ANONYMOUS_FIELD.match(msg.sanitized_text)]
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    result = func()
+    print('{:<40} {:8.2f}s'.format(name, time.perf_counter() - start))
+    return result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if len(sys.argv) > 1 and os.path.isfile(sys.argv[1]):
+            log_file = sys.argv[1]
+        else:
+            num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+            log_file = os.path.join(temp_dir, 'doxygen-warning-log.txt')
+            with open(log_file, 'w') as f:
+                for i in range(num_lines):
+                    f.write(WARNINGS[i % len(WARNINGS)].format(path='/builds/espressif/esp-idf', i=i))
+
+        with open(log_file) as f:
+            num_lines = sum(1 for _ in f)
+        print('{}: {} lines, {:.1f} MB'.format(log_file, num_lines, os.path.getsize(log_file) / 1e6))
+
+        legacy = measure('one regex pass per filter', lambda: legacy_check(log_file, os.path.join(temp_dir, 'legacy.txt')))
+        streamed = measure('single pass, streamed', lambda: streamed_check(log_file, os.path.join(temp_dir, 'streamed.txt')))
+
+        assert legacy == streamed, 'Outputs differ'
+        with open(log_file) as f:
+            assert all(legacy_sanitize_line(line) == sanitize_line(line) for line in f), 'Outputs differ'
+
+
+if __name__ == '__main__':
+    main()
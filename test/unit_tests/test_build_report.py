@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from esp_docs.build_docs import count_log_messages, write_build_summary
+from esp_docs.esp_extensions import build_report
+
+
+class TestBuildReport(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = SimpleNamespace(config=SimpleNamespace(build_dir=self.temp_dir.name), builder=SimpleNamespace(name='html'),
+                                   env=SimpleNamespace(found_docs={'index', 'api'}))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_phases_are_accumulated(self):
+        with build_report.phase(self.app, 'doxygen'):
+            pass
+        with build_report.phase(self.app, 'doxygen'):
+            pass
+
+        self.assertEqual(list(build_report.get_report(self.app)['phases']), ['doxygen'])
+
+    def test_phase_recorded_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with build_report.phase(self.app, 'idf_py'):
+                raise RuntimeError('idf.py failed')
+
+        self.assertIn('idf_py', build_report.get_report(self.app)['phases'])
+
+    def test_write_report(self):
+        build_report.start_read(self.app, None, ['index'])
+        build_report.finish_read(self.app, None)
+        build_report.count_written_doc(self.app, None, 'index')
+        build_report.write_report(self.app, None)
+
+        with open(os.path.join(self.temp_dir.name, build_report.BUILD_REPORT_FMT.format('html'))) as f:
+            report = json.load(f)
+
+        self.assertEqual(report['docs_read'], 1)
+        self.assertEqual(report['docs_written'], 1)
+        self.assertEqual(report['docs_total'], 2)
+        self.assertEqual(sorted(report['phases']), ['read', 'write'])
+        self.assertFalse(report['failed'])
+
+
+class TestBuildSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_summary_aggregates_reports(self):
+        entries = []
+        for target in ['esp32', 'esp32s2']:
+            build_dir = os.path.join(self.temp_dir.name, 'en', target)
+            os.makedirs(build_dir)
+            entries.append({'language': 'en', 'target': target, 'build_dir': build_dir})
+        with open(os.path.join(entries[0]['build_dir'], 'build-report.json'), 'w') as f:
+            json.dump({'duration': 1.0}, f)
+
+        summary_file = os.path.join(self.temp_dir.name, 'build-summary.json')
+        write_build_summary(summary_file, entries, [0, 1], {'en/esp32': {'wall_time': 1.5}})
+
+        with open(summary_file) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['en/esp32'], {'returncode': 0, 'stats': {'wall_time': 1.5}, 'report': {'duration': 1.0}})
+        self.assertEqual(summary['en/esp32s2'], {'returncode': 1, 'stats': {}})
+
+    def test_count_log_messages(self):
+        log_file = os.path.join(self.temp_dir.name, 'doxygen-warning-log.txt')
+        with open(log_file, 'w') as f:
+            f.write("uart.h:10: warning: bad docs\n  parameter 'max'\nuart.h:12: warning: more bad docs\n")
+
+        self.assertEqual(count_log_messages(log_file), 2)
+        self.assertIsNone(count_log_messages(os.path.join(self.temp_dir.name, 'missing.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from esp_docs.build_scheduler import SKIPPED_RETURNCODE, load_build_stats, run_jobs
+
+
+def record_job(build_info):
+    # Appends (job, start, end) to a log file shared by all the jobs of a test
+    start = time.time()
+    time.sleep(build_info.get('sleep', 0))
+    with open(build_info['log'], 'a') as f:
+        f.write('%s/%s %f %f\n' % (build_info['language'], build_info['target'], start, time.time()))
+    return build_info.get('ret', 0)
+
+
+class TestRunJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.temp_dir.name, 'jobs.log')
+        self.stats_file = os.path.join(self.temp_dir.name, 'build-stats.json')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _entry(self, target, **kwargs):
+        build_info = {'language': 'en', 'target': target, 'log': self.log}
+        build_info.update(kwargs)
+        return build_info
+
+    def _read_log(self):
+        with open(self.log) as f:
+            return [(job, float(start), float(end)) for job, start, end in (line.split() for line in f)]
+
+    def test_returns_errcodes_in_entry_order(self):
+        entries = [self._entry('esp32', ret=1), self._entry('esp32s2')]
+        self.assertEqual(run_jobs(entries, record_job, 2, self.stats_file, 'record_job'), [1, 0])
+
+    def test_records_stats(self):
+        run_jobs([self._entry('esp32')], record_job, 1, self.stats_file, 'record_job')
+
+        stats = load_build_stats(self.stats_file)['record_job']['en/esp32']
+        self.assertIn('wall_time', stats)
+        self.assertEqual(stats['returncode'], 0)
+
+    def test_longest_job_first(self):
+        with open(self.stats_file, 'w') as f:
+            json.dump({'record_job': {'en/esp32': {'wall_time': 1.0}, 'en/esp32s2': {'wall_time': 100.0}}}, f)
+
+        run_jobs([self._entry('esp32'), self._entry('esp32s2')], record_job, 1, self.stats_file, 'record_job')
+
+        self.assertEqual([job for job, _, _ in self._read_log()], ['en/esp32s2', 'en/esp32'])
+
+    def test_dependencies_finish_first(self):
+        entries = [self._entry('esp32', sleep=0.3), self._entry('esp32s2', depends_on=['en/esp32'])]
+        run_jobs(entries, record_job, 2, self.stats_file, 'record_job')
+
+        times = {job: (start, end) for job, start, end in self._read_log()}
+        self.assertGreaterEqual(times['en/esp32s2'][0], times['en/esp32'][1])
+
+    def test_failed_dependencies_are_reported(self):
+        entries = [self._entry('esp32', ret=1), self._entry('esp32s2', depends_on=['en/esp32'], shared_env_seed='seed')]
+        self.assertEqual(run_jobs(entries, record_job, 1, self.stats_file, 'record_job'), [1, 0])
+        self.assertEqual(entries[1]['failed_dependencies'], ['en/esp32'])
+        self.assertEqual(entries[1]['shared_env_seed'], 'seed')
+
+    def test_successful_dependencies_are_not_reported(self):
+        entries = [self._entry('esp32'), self._entry('esp32s2', depends_on=['en/esp32'])]
+        run_jobs(entries, record_job, 1, self.stats_file, 'record_job')
+        self.assertEqual(entries[1]['failed_dependencies'], [])
+
+    def test_fail_fast_skips_remaining_jobs(self):
+        entries = [self._entry('esp32', ret=1), self._entry('esp32s2', depends_on=['en/esp32'])]
+        self.assertEqual(run_jobs(entries, record_job, 1, self.stats_file, 'record_job', fail_fast=True), [1, SKIPPED_RETURNCODE])
+        self.assertEqual([job for job, _, _ in self._read_log()], ['en/esp32'])
+
+
+if __name__ == '__main__':
+    unittest.main()
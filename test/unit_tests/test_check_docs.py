@@ -1,11 +1,12 @@
 import io
 import os
 import tempfile
+import time
 import unittest
 from contextlib import redirect_stdout
 
 from esp_docs.build_docs import print_sphinx_failure_summary
-from esp_docs.check_docs import sanitize_line, check_docs, group_log_messages
+from esp_docs.check_docs import LiveWarningChecker, LogMessage, sanitize_line, check_docs, find_new_messages, group_log_messages
 
 
 class TestSanitizeLine(unittest.TestCase):
@@ -42,6 +43,17 @@ class TestSanitizeLine(unittest.TestCase):
         self.assertIn('file.rst', result)
         self.assertIn(':line:', result)
 
+    def test_path_after_first_field(self):
+        line = 'Warning: /long/path/to/file.h:12: something\n'
+        self.assertEqual(sanitize_line(line), 'Warning:file.h:line: something\n')
+
+    def test_only_first_line_number_replaced(self):
+        line = '/path/file.h:12:34: warning: see file.h:56: and 7.\n'
+        self.assertEqual(sanitize_line(line), 'file.h:line:34: warning: see file.h:56: and 7.\n')
+
+    def test_line_number_after_removed_color_code(self):
+        self.assertEqual(sanitize_line('file.h:1\x1B[0m2: warning\n'), 'file.h:line: warning\n')
+
     def test_plain_line_unchanged(self):
         line = 'simple warning text without path or line number'
         result = sanitize_line(line)
@@ -118,6 +130,16 @@ class TestCheckDocs(unittest.TestCase):
         result = check_docs('en', 'esp32', log, known, out)
         self.assertEqual(result, 0)
 
+    def test_sanitized_log_keeps_filtered_lines(self):
+        anonymous = 'file.h:3: warning: parameters of member SomeStruct::@1 are not (all) documented'
+        log = self._write_file('log.txt', ['/path/file.h:3: warning: known', anonymous])
+        known = self._write_file('doxygen-known.txt', ['file.h:line: warning: known'])
+        out = os.path.join(self.temp_dir, 'sanitized.txt')
+
+        self.assertEqual(check_docs('en', 'esp32', log, known, out), 0)
+        with open(out) as f:
+            self.assertEqual(f.read(), 'file.h:line: warning: known\n' + sanitize_line(anonymous) + '\n')
+
     def test_known_warning_matches(self):
         warning_line = 'file.rst:10: WARNING: known issue'
         sanitized = sanitize_line(warning_line) + '\n'
@@ -128,6 +150,91 @@ class TestCheckDocs(unittest.TestCase):
         self.assertEqual(result, 0)
 
 
+class TestFindNewMessages(unittest.TestCase):
+
+    def _new_messages(self, log_lines, known_lines):
+        messages = [LogMessage(line, line) for line in log_lines]
+        return [msg.sanitized_text for msg in find_new_messages(messages, known_lines)]
+
+    def test_messages_in_order(self):
+        self.assertEqual(self._new_messages(['a', 'b', 'c'], ['a', 'b', 'c']), [])
+
+    def test_unknown_message(self):
+        self.assertEqual(self._new_messages(['a', 'x', 'c'], ['a', 'b', 'c']), ['x'])
+
+    def test_repeated_message_matches_same_known_message(self):
+        self.assertEqual(self._new_messages(['a', 'a', 'b'], ['a', 'b']), [])
+
+    def test_out_of_order_message_is_new(self):
+        self.assertEqual(self._new_messages(['b', 'a'], ['a', 'b']), ['a'])
+
+    def test_duplicate_known_messages(self):
+        self.assertEqual(self._new_messages(['b', 'a', 'b', 'a'], ['a', 'b', 'a', 'b']), ['a'])
+
+    def test_same_result_as_list_search(self):
+        log_lines = ['w{}'.format(i % 7) for i in range(200)]
+        known_lines = ['w{}'.format(i * 3 % 5) for i in range(50)]
+
+        expected = []
+        known_idx = 0
+        for line in log_lines:
+            try:
+                known_idx = known_lines.index(line, known_idx)
+            except ValueError:
+                expected.append(line)
+
+        self.assertEqual(self._new_messages(log_lines, known_lines), expected)
+
+
+class TestLiveWarningChecker(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.temp_dir.name, 'sphinx-warning-log.txt')
+        self.known = os.path.join(self.temp_dir.name, 'known.txt')
+        with open(self.known, 'w') as f:
+            f.write('index.rst:line: WARNING: known issue\n')
+        self.new_warnings = []
+        self.checker = LiveWarningChecker(self.log, self.known, self.new_warnings.append, poll_interval=0.01)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_reports_first_new_warning(self):
+        self.checker.start()
+        with open(self.log, 'w') as f:
+            f.write('/docs/en/index.rst:10: WARNING: known issue\n')
+            f.flush()
+            time.sleep(0.05)
+            self.assertEqual(self.new_warnings, [])
+
+            f.write('/docs/en/index.rst:12: WARNING: new issue\n')
+            f.write('/docs/en/index.rst:14: WARNING: another new issue\n')
+            f.flush()
+            self.checker.join(5)
+
+        self.assertEqual([msg.sanitized_text for msg in self.new_warnings], ['index.rst:line: WARNING: new issue\n'])
+
+    def test_partial_line_is_checked_once_complete(self):
+        self.checker.start()
+        with open(self.log, 'w') as f:
+            f.write('/docs/en/index.rst:10: WARNING: known')
+            f.flush()
+            time.sleep(0.05)
+            f.write(' issue\n')
+
+        self.checker.stop()
+        self.assertEqual(self.new_warnings, [])
+
+    def test_log_checked_until_stopped(self):
+        self.checker.start()
+        with open(self.log, 'w') as f:
+            f.write('index.rst:10: WARNING: new issue')
+
+        self.checker.stop()
+        self.assertEqual(len(self.new_warnings), 1)
+
+
 class TestBuildFailureSummary(unittest.TestCase):
     def test_sphinx_failure_summary_mentions_fatal_error(self):
         temp_dir = tempfile.mkdtemp()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import json
 import os
 import subprocess
 import unittest
@@ -92,5 +93,30 @@ class TestBuildSubset(unittest.TestCase):
         self.assertTrue(os.path.isfile(esp32_doc), 'Found {}'.format(esp32_doc))
 
 
+class TestParallelBuild(unittest.TestCase):
+    def test_parallel_jobs_output_identical(self):
+        serial_builder = DocBuilder('.', '_build/test_parallel_j1', 'esp32s2', 'en')
+        parallel_builder = DocBuilder('.', '_build/test_parallel_j4', 'esp32s2', 'en')
+
+        self.assertFalse(serial_builder.build(['-j', '1']))
+        self.assertFalse(parallel_builder.build(['-j', '4']))
+
+        for root, _, files in os.walk(serial_builder.html_out_dir):
+            for name in files:
+                serial_file = os.path.join(root, name)
+                parallel_file = os.path.join(parallel_builder.html_out_dir, os.path.relpath(serial_file, serial_builder.html_out_dir))
+                with open(serial_file, 'rb') as f_serial, open(parallel_file, 'rb') as f_parallel:
+                    if name == 'searchindex.js':
+                        # Terms are collected in sets, so only the content of the index is comparable
+                        self.assertEqual(self.load_search_index(f_serial.read()), self.load_search_index(f_parallel.read()))
+                    else:
+                        self.assertEqual(f_serial.read(), f_parallel.read(), 'Output differs for {}'.format(name))
+
+    @staticmethod
+    def load_search_index(content):
+        content = content.decode('utf-8')
+        return json.loads(content[content.index('(') + 1:content.rindex(')')])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,20 @@
 import os.path
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
 
-from esp_docs.esp_extensions.format_esp_target import StringSubstituter, check_content
+from docutils import io
+from sphinx.application import Sphinx
+from esp_docs.esp_extensions.format_esp_target import StringSubstituter, check_content, parse_local_sub_define
+
+INCLUDE_CONF = """
+extensions = ['esp_docs.esp_extensions.format_esp_target']
+
+
+def setup(app):
+    app.add_config_value('idf_target', 'esp32', 'env')
+    app.add_config_value('build_dir', {build_dir!r}, 'env')
+"""
 
 
 class TestStringSubstituterMultiTarget(unittest.TestCase):
@@ -84,6 +96,14 @@ class TestAddSub(unittest.TestCase):
         result = self.sub.substitute('Value is {IDF_TARGET_MY_VAL}')
         self.assertEqual(result, 'Value is 42')
 
+    def test_local_sub_overrides_global(self):
+        content = '{IDF_TARGET_NAME:default="Local"}\n{IDF_TARGET_NAME} on {IDF_TARGET_PATH_NAME}, {IDF_TARGET_UNKNOWN}'
+        self.assertEqual(self.sub.substitute(content), '\nLocal on esp32, {IDF_TARGET_UNKNOWN}')
+
+    def test_tag_with_other_characters(self):
+        self.sub.add_pair('{IDF_TARGET_FLASH-SIZE}', '4MB')
+        self.assertEqual(self.sub.substitute('{IDF_TARGET_FLASH-SIZE} of {IDF_TARGET_NAME}'), '4MB of ESP32')
+
 
 class TestCheckContent(unittest.TestCase):
 
@@ -137,6 +157,64 @@ class TestLocalSubGroupTargets(unittest.TestCase):
         result = self.sub.substitute(content)
         self.assertEqual(result, '\n\nIO1 and IO3')
 
+    def test_target_name_in_value(self):
+        content = '{IDF_TARGET_NOTE:default="Not on esp32c3", esp32="IO2"}{IDF_TARGET_NOTE}'
+        self.assertEqual(self.sub.substitute(content), 'Not on esp32c3')
+
+
+class TestParseLocalSubDefine(unittest.TestCase):
+
+    def test_values_of_all_targets(self):
+        self.assertEqual(parse_local_sub_define('default="ECDSA", esp32, esp32s2 = "RSA-3072",esp32c3="RSA, ECDSA"'),
+                         {'default': 'ECDSA', 'esp32': 'RSA-3072', 'esp32s2': 'RSA-3072', 'esp32c3': 'RSA, ECDSA'})
+
+    def test_define_is_parsed_once(self):
+        define = 'default="IO3", esp32="IO4"'
+        self.assertIs(parse_local_sub_define(define), parse_local_sub_define(define))
+
+    def test_default_must_be_first(self):
+        self.assertRaisesRegex(ValueError, 'No default value', parse_local_sub_define, 'esp32="IO4", default="IO3"')
+
+    def test_invalid_define(self):
+        for define in ['default="IO3", esp32', 'default="IO3", esp32=IO4', 'default="IO3"; esp32="IO4"', 'default=="IO3"']:
+            self.assertRaisesRegex(ValueError, 'define invalid', parse_local_sub_define, define)
+
+
+class TestFormatedIncludeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src_dir = os.path.join(self.temp_dir.name, 'src')
+        self.build_dir = os.path.join(self.temp_dir.name, '_build')
+        self._write('conf.py', INCLUDE_CONF.format(build_dir=self.build_dir))
+        self._write('snippet.inc', '{IDF_TARGET_PIN:default="IO1", esp32="IO2"}\nSnippet for {IDF_TARGET_NAME} on {IDF_TARGET_PIN}\n')
+        self._write('index.rst', 'Index\n=====\n\n.. toctree::\n\n    first\n    second\n')
+        self._write('first.rst', 'First\n=====\n\n.. include:: snippet.inc\n')
+        self._write('second.rst', 'Second\n======\n\n.. include:: snippet.inc\n\n.. include:: snippet.inc\n    :end-before: on\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, rel_path, content):
+        path = os.path.join(self.src_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_included_file_is_read_once(self):
+        app = Sphinx(self.src_dir, self.src_dir, os.path.join(self.build_dir, 'html'), os.path.join(self.build_dir, 'doctrees'),
+                     'html', status=None, warning=None, freshenv=True)
+
+        with patch('esp_docs.esp_extensions.format_esp_target.io.FileInput', wraps=io.FileInput) as file_input:
+            app.build()
+        self.assertEqual(file_input.call_count, 2)
+
+        self.assertEqual(app.env.dependencies['second'], {'snippet.inc'})
+        with open(os.path.join(self.build_dir, 'html', 'second.html')) as f:
+            html = f.read()
+        self.assertEqual(html.count('Snippet for ESP32 on IO2'), 1)
+        self.assertEqual(html.count('Snippet for ESP32'), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
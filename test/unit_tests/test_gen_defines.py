@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from esp_docs.idf_extensions import gen_defines
+
+
+@unittest.skipIf(shutil.which('gcc') is None, 'gcc is needed to preprocess the headers')
+class TestGenDefines(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_dir = os.path.join(self.temp_dir.name, 'config')
+        self.sdkconfig = self._write('config/sdkconfig.h', '#define CONFIG_FOO 1\n')
+        self._write('soc/soc_caps_extra.h', '#define SOC_EXTRA 1\n')
+        self.caps = self._write('soc/soc_caps.h', '#include "sdkconfig.h"\n#include "soc_caps_extra.h"\n'
+                                '#define SOC_UART_NUM (3)\n#define SOC_FUNC(x) x + 1\n')
+        self.rom_caps = self._write('rom/esp_rom_caps.h', '#define ESP_ROM_HAS_CRC 1\n')
+        self.headers = [self.sdkconfig, self.caps, self.rom_caps]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, rel_path, content):
+        path = os.path.join(self.temp_dir.name, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _get_defines(self):
+        return gen_defines.get_cached_defines(self.headers, self.config_dir, 'gcc', self.temp_dir.name)
+
+    def test_all_headers_in_one_pass(self):
+        with patch('subprocess.check_output', wraps=gen_defines.subprocess.check_output) as check_output:
+            defines = self._get_defines()
+
+        self.assertEqual(check_output.call_count, 1)
+        self.assertEqual(defines['CONFIG_FOO'], '1')
+        self.assertEqual(defines['SOC_UART_NUM'], '(3)')
+        self.assertEqual(defines['SOC_FUNC(x)'], '')
+        self.assertEqual(defines['ESP_ROM_HAS_CRC'], '1')
+
+    def test_warm_build_uses_cache(self):
+        defines = self._get_defines()
+
+        with patch('subprocess.check_output') as check_output:
+            self.assertEqual(self._get_defines(), defines)
+        check_output.assert_not_called()
+
+    def test_included_header_change_invalidates_cache(self):
+        self._get_defines()
+        # Only included by soc_caps.h, not passed in the list of headers
+        self._write('soc/soc_caps_extra.h', '#define SOC_EXTRA 2\n')
+
+        self.assertEqual(self._get_defines()['SOC_EXTRA'], '2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from esp_docs import git_info
+from esp_docs.git_info import GitInfo, parse_gitmodules, write_git_info
+
+GITMODULES = '''
+# Submodules of the project
+[submodule "components/bt/controller/lib_esp32"]
+\tpath = components/bt/controller/lib_esp32
+\turl = ../../espressif/esp32-bt-lib.git
+
+[submodule "mbedtls"]
+    path = components/mbedtls/mbedtls
+    URL = "https://github.com/espressif/mbedtls.git"  ; fork
+[core]
+\turl = ignored
+[submodule "lwip"]
+\tpath = components/lwip/lwip
+\turl = ../../espressif/esp-lwip.git # fork
+'''
+
+
+class TestGitInfo(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = os.path.join(self.temp_dir.name, 'repo')
+        os.makedirs(self.repo)
+        self._git('init', '-q')
+        self._git('-c', 'user.name=docs', '-c', 'user.email=docs@example.com', 'commit', '-q', '--allow-empty', '-m', 'Initial commit')
+        self._git('-c', 'user.name=docs', '-c', 'user.email=docs@example.com', 'tag', '-a', 'v5.1', '-m', 'v5.1')
+        self.info_file = os.path.join(self.temp_dir.name, git_info.GIT_INFO_FILE)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        git_info._git_info = None
+
+    def _git(self, *args):
+        return subprocess.check_output(['git'] + list(args), cwd=self.repo).strip().decode('utf-8')
+
+    def test_collected_values_are_not_queried_again(self):
+        write_git_info(self.info_file, cwd=self.repo)
+        short_rev = self._git('rev-parse', '--short', 'HEAD')
+
+        with patch.dict(os.environ, {git_info.GIT_INFO_ENV_VAR: self.info_file}), patch('subprocess.check_output') as check_output:
+            info = git_info.get_git_info()
+            self.assertEqual((info.exact_tag, info.describe, info.short_rev), ('v5.1', 'v5.1', short_rev))
+            self.assertEqual(info.submodules, {})
+            self.assertIs(git_info.get_git_info(), info)
+        check_output.assert_not_called()
+
+    def test_missing_values_are_queried(self):
+        info = GitInfo({'exact_tag': None}, cwd=self.repo)
+        self.assertIsNone(info.exact_tag)
+        self.assertEqual(info.branch, self._git('rev-parse', '--abbrev-ref', 'HEAD'))
+
+    def test_values_git_cannot_provide_are_left_out(self):
+        values = GitInfo(cwd=self.temp_dir.name).collect()
+        self.assertNotIn('short_rev', values)
+
+
+class TestParseGitmodules(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gitmodules_file = os.path.join(self.temp_dir.name, '.gitmodules')
+        with open(self.gitmodules_file, 'w') as f:
+            f.write(GITMODULES)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_same_urls_as_git_config(self):
+        submodules = parse_gitmodules(self.gitmodules_file)
+
+        self.assertEqual(list(submodules), ['components/bt/controller/lib_esp32', 'mbedtls', 'lwip'])
+        for name, values in submodules.items():
+            url = subprocess.check_output(['git', 'config', '--file', self.gitmodules_file, '--get', 'submodule.{}.url'.format(name)])
+            self.assertEqual(values['url'], url.decode('utf-8').rstrip('\n'))
+        self.assertEqual(submodules['mbedtls']['path'], 'components/mbedtls/mbedtls')
+
+    def test_submodules_read_gitmodules_once(self):
+        status = (' 1a2b3c4d5e6f components/bt/controller/lib_esp32 (heads/master)\n'
+                  '-2b3c4d5e6f7a components/mbedtls/mbedtls\n'
+                  '+3c4d5e6f7a8b components/lwip/lwip (v2.1.3)')
+        info = GitInfo({'toplevel': self.temp_dir.name})
+
+        with patch('esp_docs.git_info.git_output', return_value=status) as mock_git_output:
+            self.assertEqual(info.submodules, {'components/bt/controller/lib_esp32': ['espressif/esp32-bt-lib.git', '1a2b3c4'],
+                                               'components/mbedtls/mbedtls': ['https://github.com/espressif/mbedtls.git', '2b3c4d5'],
+                                               'components/lwip/lwip': ['espressif/esp-lwip.git', '3c4d5e6']})
+        mock_git_output.assert_called_once_with(['submodule', 'status'], cwd=self.temp_dir.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
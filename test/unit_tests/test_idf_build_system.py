@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from sphinx.errors import ExtensionError
+from sphinx.events import EventManager
+from esp_docs.idf_extensions.build_system import concurrent_generator, config_fingerprint, emit_project_build_info
+
+
+class TestConfigFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.idf_path = self.temp_dir.name
+        self._write('components/uart/CMakeLists.txt', 'idf_component_register()\n')
+        self._write('components/uart/Kconfig', 'menu "UART"\nendmenu\n')
+        self._write('components/uart/uart.c', 'int x;\n')
+        self._write('tools/cmake/project.cmake', '# project\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, rel_path, content):
+        path = os.path.join(self.idf_path, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_unchanged_inputs(self):
+        self.assertEqual(config_fingerprint(self.idf_path, 'esp32'), config_fingerprint(self.idf_path, 'esp32'))
+
+    def test_target_changes_fingerprint(self):
+        self.assertNotEqual(config_fingerprint(self.idf_path, 'esp32'), config_fingerprint(self.idf_path, 'esp32s2'))
+
+    def test_kconfig_changes_fingerprint(self):
+        before = config_fingerprint(self.idf_path, 'esp32')
+        self._write('components/uart/Kconfig', 'menu "UART"\n    config UART_ISR_IN_IRAM\n        bool\nendmenu\n')
+        self.assertNotEqual(before, config_fingerprint(self.idf_path, 'esp32'))
+
+    def test_root_kconfig_changes_fingerprint(self):
+        self._write('Kconfig', 'mainmenu "Espressif IoT Development Framework Configuration"\n')
+        before = config_fingerprint(self.idf_path, 'esp32')
+        self._write('Kconfig', 'mainmenu "Espressif IoT Development Framework Configuration"\nconfig IDF_TARGET_ESP32\n    bool\n')
+        self.assertNotEqual(before, config_fingerprint(self.idf_path, 'esp32'))
+
+    def test_sdkconfig_rename_and_generator_change_fingerprint(self):
+        before = config_fingerprint(self.idf_path, 'esp32')
+        self._write('sdkconfig.rename', 'CONFIG_OLD CONFIG_NEW\n')
+        after_rename = config_fingerprint(self.idf_path, 'esp32')
+        self._write('tools/kconfig_new/confgen.py', '# generator\n')
+
+        self.assertNotEqual(before, after_rename)
+        self.assertNotEqual(after_rename, config_fingerprint(self.idf_path, 'esp32'))
+
+    def test_new_component_changes_fingerprint(self):
+        before = config_fingerprint(self.idf_path, 'esp32')
+        self._write('components/spi/CMakeLists.txt', 'idf_component_register()\n')
+        self.assertNotEqual(before, config_fingerprint(self.idf_path, 'esp32'))
+
+    def test_source_files_are_ignored(self):
+        before = config_fingerprint(self.idf_path, 'esp32')
+        self._write('components/uart/uart.c', 'int y;\n')
+        self.assertEqual(before, config_fingerprint(self.idf_path, 'esp32'))
+
+
+class TestEmitProjectBuildInfo(unittest.TestCase):
+
+    def setUp(self):
+        self.app = SimpleNamespace(pdb=False)
+        self.app.events = EventManager(self.app)
+        self.app.emit = self.app.events.emit
+        self.app.events.add('project-build-info')
+        self.calls = []
+
+    def _on_main_thread(self):
+        return threading.current_thread() is threading.main_thread()
+
+    def _connect(self, name, concurrent=True, error=None, priority=500):
+        def handler(app, project_description):
+            self.calls.append((name, self._on_main_thread()))
+            time.sleep(0.2)
+            if error:
+                raise error
+            return lambda: self.calls.append((name + ' finish', self._on_main_thread()))
+
+        self.app.events.connect('project-build-info', concurrent_generator(handler) if concurrent else handler, priority)
+
+    def test_generators_run_concurrently(self):
+        self._connect('defines')
+        self._connect('kconfig')
+
+        start = time.time()
+        emit_project_build_info(self.app, {})
+
+        self.assertLess(time.time() - start, 0.35)
+        self.assertEqual(sorted(self.calls[:2]), [('defines', False), ('kconfig', False)])
+
+    def test_handlers_run_on_main_thread_in_priority_order(self):
+        self._connect('user_handler', concurrent=False, priority=400)
+        self._connect('defines')
+        self._connect('kconfig', priority=300)
+
+        emit_project_build_info(self.app, {})
+
+        self.assertEqual(sorted(self.calls[:2]), [('defines', False), ('kconfig', False)])
+        self.assertEqual(self.calls[2:], [('kconfig finish', True), ('user_handler', True), ('defines finish', True)])
+
+    def test_generator_error_is_raised_by_its_handler(self):
+        self._connect('defines', error=RuntimeError('gcc failed'))
+        self._connect('kconfig', priority=300)
+
+        with self.assertRaisesRegex(ExtensionError, 'gcc failed'):
+            emit_project_build_info(self.app, {})
+        self.assertEqual(self.calls[2:], [('kconfig finish', True)])
+
+    def test_event_emitted_directly(self):
+        self._connect('defines')
+
+        self.app.emit('project-build-info', {})
+
+        self.assertEqual(self.calls, [('defines', True), ('defines finish', True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from esp_docs.idf_extensions import kconfig_reference
+
+# Writes the Kconfig file of the uart component as the 'docs' output
+FAKE_CONFGEN = """
+import sys
+args = sys.argv[1:]
+output = args[args.index('--output') + 2]
+with open('components/uart/Kconfig') as src, open(output, 'w') as dst:
+    dst.write(src.read())
+"""
+
+
+class TestKconfigCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.idf_path = os.path.join(self.temp_dir.name, 'idf')
+        self.build_dir = os.path.join(self.temp_dir.name, '_build', 'en', 'esp32')
+        self._write(self.idf_path, 'components/uart/Kconfig', 'menu "UART"\nendmenu\n')
+        self._write(self.idf_path, 'tools/kconfig_new/prepare_kconfig_files.py', '')
+        self._write(self.idf_path, 'tools/kconfig_new/confgen.py', FAKE_CONFGEN)
+        os.makedirs(os.path.join(self.build_dir, 'inc'))
+
+        self.project_description = {'config_environment': {'COMPONENT_KCONFIGS': os.path.join(self.idf_path, 'components/uart/Kconfig'),
+                                                           'COMPONENT_KCONFIGS_PROJBUILD': ''}}
+
+        environ = patch.dict(os.environ, {'DOCS_GENERATOR_CACHE_DIR': os.path.join(self.temp_dir.name, '_build', 'generator_cache')})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, directory, rel_path, content):
+        path = os.path.join(directory, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _generate(self, language='en'):
+        build_dir = os.path.join(self.temp_dir.name, '_build', language, 'esp32')
+        os.makedirs(os.path.join(build_dir, 'inc'), exist_ok=True)
+        app = SimpleNamespace(doctreedir=os.path.join(build_dir, 'doctrees'),
+                              config=SimpleNamespace(project_path=self.idf_path, idf_target='esp32', build_dir=build_dir))
+
+        with patch('subprocess.check_call', wraps=subprocess.check_call) as check_call:
+            kconfig_reference.generate_reference(app, self.project_description)
+
+        with open(os.path.join(build_dir, 'inc', 'kconfig.inc')) as f:
+            return f.read(), check_call.call_count
+
+    def test_reused_by_other_language(self):
+        self.assertEqual(self._generate('en'), ('menu "UART"\nendmenu\n', 2))
+        self.assertEqual(self._generate('zh_CN'), ('menu "UART"\nendmenu\n', 0))
+
+    def test_kconfig_change_regenerates(self):
+        self._generate()
+        self._write(self.idf_path, 'components/uart/Kconfig', 'menu "UART driver"\nendmenu\n')
+
+        self.assertEqual(self._generate(), ('menu "UART driver"\nendmenu\n', 2))
+        self.assertEqual(len(os.listdir(os.path.join(self.temp_dir.name, '_build', 'generator_cache', kconfig_reference.KCONFIG_CACHE_DIR))), 1)
+
+    def test_sourced_kconfig_changes_fingerprint(self):
+        kconfigs = [os.path.join(self.idf_path, 'components/uart/Kconfig')]
+        before = kconfig_reference.kconfig_fingerprint(self.idf_path, 'esp32', kconfigs, [], set())
+        self._write(self.idf_path, 'components/uart/Kconfig.common', 'config UART_ISR_IN_IRAM\n    bool\n')
+
+        self.assertNotEqual(before, kconfig_reference.kconfig_fingerprint(self.idf_path, 'esp32', kconfigs, [], set()))
+
+    def test_target_changes_fingerprint(self):
+        kconfigs = [os.path.join(self.idf_path, 'components/uart/Kconfig')]
+        self.assertNotEqual(kconfig_reference.kconfig_fingerprint(self.idf_path, 'esp32', kconfigs, [], set()),
+                            kconfig_reference.kconfig_fingerprint(self.idf_path, 'esp32s2', kconfigs, [], set()))
+
+
+if __name__ == '__main__':
+    unittest.main()
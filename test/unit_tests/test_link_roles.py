@@ -1,6 +1,11 @@
+import os
+import subprocess
+import tempfile
 import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
 
-from esp_docs.esp_extensions.link_roles import url_join
+from esp_docs.esp_extensions.link_roles import PathCache, SubmoduleTrie, count_lines, index_project_paths, url_join
 
 
 class TestUrlJoin(unittest.TestCase):
@@ -30,5 +35,120 @@ class TestUrlJoin(unittest.TestCase):
         self.assertNotIn('//', result.replace('https://', ''))
 
 
+class TestSubmoduleTrie(unittest.TestCase):
+
+    def setUp(self):
+        self.trie = SubmoduleTrie({'components/bt/controller/lib_esp32': 'bt_lib',
+                                   'components/mbedtls/mbedtls': 'mbedtls',
+                                   'components/lwip/lwip': 'lwip'})
+
+    def test_path_in_submodule(self):
+        self.assertEqual(self.trie.find('/components/mbedtls/mbedtls/include/mbedtls/aes.h'), ('components/mbedtls/mbedtls', 'mbedtls'))
+        self.assertEqual(self.trie.find('components/bt/controller/lib_esp32/'), ('components/bt/controller/lib_esp32', 'bt_lib'))
+
+    def test_path_outside_submodules(self):
+        for path in ['/components/mbedtls/port/aes.c', '/components/mbedtls/mbedtls', '/components/lwip/lwip_extra/x.c', '/examples']:
+            self.assertIsNone(self.trie.find(path))
+
+
+class TestPathCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'uart.c')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, content):
+        with open(self.path, 'w', newline='') as f:
+            f.write(content)
+
+    def test_count_lines(self):
+        for content in ['', 'one line', 'one line\n', 'first\nsecond', 'first\r\nsecond\r\n\n']:
+            self._write(content)
+            with open(self.path, 'r') as f:
+                self.assertEqual(count_lines(self.path), len(f.readlines()), repr(content))
+
+    def test_paths_are_checked_once(self):
+        self._write('first\nsecond\n')
+        cache = PathCache()
+
+        self.assertEqual((cache.kind(self.path), cache.kind(self.temp_dir.name), cache.kind(self.path + '.h')), ('file', 'dir', None))
+        self.assertEqual(cache.line_count(self.path), 2)
+        with patch('os.stat') as mock_stat, patch('esp_docs.esp_extensions.link_roles.count_lines') as mock_count_lines:
+            self.assertEqual((cache.kind(self.path), cache.line_count(self.path)), ('file', 2))
+        mock_stat.assert_not_called()
+        mock_count_lines.assert_not_called()
+
+
+class TestIndexProjectPaths(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.project_path = os.path.realpath(self.temp_dir.name)
+        for rel_path in ['.gitignore', 'components/uart/uart.c', 'components/uart/old.c', 'build/uart.o', 'examples/uart/main.c']:
+            self._write(rel_path, 'build/\n' if rel_path == '.gitignore' else 'int x;\n')
+        self._git('init', '-q')
+        self._git('add', '.gitignore', 'components')
+        os.remove(self._path('components/uart/old.c'))
+
+        self.path_cache = PathCache()
+        self.app = SimpleNamespace(config=SimpleNamespace(link_roles_path_index=True, project_path=self.project_path))
+        index_project_paths(self.app, self.path_cache)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _path(self, rel_path):
+        return os.path.join(self.project_path, rel_path)
+
+    def _write(self, rel_path, content):
+        os.makedirs(os.path.dirname(self._path(rel_path)), exist_ok=True)
+        with open(self._path(rel_path), 'w') as f:
+            f.write(content)
+
+    def _git(self, *args):
+        subprocess.check_call(['git'] + list(args), cwd=self.project_path)
+
+    def test_indexed_paths_are_not_checked_on_filesystem(self):
+        rel_paths = ['components/uart/uart.c', 'components/uart', 'components', 'examples/uart/main.c']
+        with patch('os.stat') as mock_stat:
+            kinds = [self.path_cache.kind(self._path(rel_path)) for rel_path in rel_paths]
+        mock_stat.assert_not_called()
+        self.assertEqual(kinds, ['file', 'dir', 'dir', 'file'])
+
+    def test_other_paths_are_checked_on_filesystem(self):
+        self.assertNotIn(self._path('build/uart.o'), self.path_cache.kinds)
+        self.assertEqual(self.path_cache.kind(self._path('build/uart.o')), 'file')
+        self.assertIsNone(self.path_cache.kind(self._path('components/uart/old.c')))
+
+    def test_skip_worktree_paths_are_checked_on_filesystem(self):
+        self._git('update-index', '--skip-worktree', 'components/uart/uart.c')
+        os.remove(self._path('components/uart/uart.c'))
+        self.path_cache = PathCache()
+        index_project_paths(self.app, self.path_cache)
+
+        self.assertNotIn(self._path('components/uart/uart.c'), self.path_cache.kinds)
+        self.assertIsNone(self.path_cache.kind(self._path('components/uart/uart.c')))
+
+    def test_paths_deleted_from_submodules_are_not_indexed(self):
+        submodule_path = os.path.join(self.temp_dir.name, 'spi')
+        os.makedirs(submodule_path)
+        for rel_path in ['spi.c', 'old.c']:
+            with open(os.path.join(submodule_path, rel_path), 'w') as f:
+                f.write('int x;\n')
+        subprocess.check_call(['git', 'init', '-q'], cwd=submodule_path)
+        subprocess.check_call(['git', 'add', '.'], cwd=submodule_path)
+        subprocess.check_call(['git', '-c', 'user.name=test', '-c', 'user.email=test@test', 'commit', '-q', '-m', 'spi'], cwd=submodule_path)
+        self._git('-c', 'protocol.file.allow=always', 'submodule', 'add', '-q', submodule_path, 'components/spi')
+        os.remove(self._path('components/spi/old.c'))
+        self.path_cache = PathCache()
+        index_project_paths(self.app, self.path_cache)
+
+        self.assertEqual(self.path_cache.kinds[self._path('components/spi/spi.c')], 'file')
+        self.assertNotIn(self._path('components/spi/old.c'), self.path_cache.kinds)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from sphinx.events import EventManager
+from esp_docs.esp_extensions.profiling import PROFILE_STATS_FMT, WORKER_STATS_ATTR, Profiler
+
+
+def esp_docs_handler(app, env):
+    return 'handled'
+
+
+def other_handler(app, env):
+    return 'other'
+
+
+# Only the handlers of esp-docs modules are profiled
+esp_docs_handler.__module__ = 'esp_docs.esp_extensions.fake'
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = SimpleNamespace(config=SimpleNamespace(build_dir=self.temp_dir.name), builder=SimpleNamespace(name='html'))
+        self.app.events = EventManager(self.app)
+        self.profiler = Profiler(self.app)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_handlers_connected_before_and_after_install(self):
+        self.app.events.connect('env-updated', esp_docs_handler, 500)
+        self.profiler.install()
+        self.app.events.connect('env-updated', esp_docs_handler, 500)
+
+        self.assertEqual(self.app.events.emit('env-updated', None), ['handled', 'handled'])
+        self.assertEqual(self.profiler.stats['env-updated: esp_docs.esp_extensions.fake.esp_docs_handler']['calls'], 2)
+
+    def test_other_handlers_are_not_wrapped(self):
+        self.profiler.install()
+        self.app.events.connect('env-updated', other_handler, 500)
+
+        self.assertEqual(self.app.events.emit('env-updated', None), ['other'])
+        self.assertEqual(self.profiler.stats, {})
+
+    def test_worker_stats_are_merged(self):
+        self.profiler.stats = {'directive include': {'calls': 1, 'total': 0.5, 'max': 0.5}}
+        worker_env = SimpleNamespace(**{WORKER_STATS_ATTR: {'directive include': {'calls': 2, 'total': 1.0, 'max': 0.75}}})
+
+        self.profiler.merge_worker_stats(self.app, None, [], worker_env)
+
+        self.assertEqual(self.profiler.stats['directive include'], {'calls': 3, 'total': 1.5, 'max': 0.75})
+
+    def test_write_stats(self):
+        self.profiler.stats = {'fast': {'calls': 1, 'total': 0.1, 'max': 0.1}, 'slow': {'calls': 1, 'total': 2.0, 'max': 2.0}}
+        self.profiler.write_stats(self.app, None)
+
+        with open(os.path.join(self.temp_dir.name, PROFILE_STATS_FMT.format('html'))) as f:
+            self.assertEqual(list(json.load(f)), ['slow', 'fast'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import json
 import os
+import re
 import tempfile
 import unittest
 from types import SimpleNamespace
@@ -9,14 +10,67 @@ from esp_docs.modified_files import normalize_modified_file_path, parse_modified
 from esp_docs.esp_extensions.run_doxygen import (
     ApiPath,
     convert_api_xml_to_inc,
+    doxygen_config_hash,
     find_doxygen_dir,
+    get_api_directives,
     get_api_name,
     get_rst_header,
     header_to_xml_path,
+    fcntl,
+    run_doxygen_incremental,
+    run_doxygen_shared,
     should_keep_api_reference,
 )
 
 
+def fake_doxygen(doxyfile, doxy_env, build_dir, logfile, config_overrides=None):
+    # Writes the XML Doxygen would generate for the headers used by TestIncrementalDoxygen:
+    # a file compound per header, a compound per struct and the index. 'struct name {' declares
+    # a struct, 'struct name *' refers to one, declared in the INPUT headers or in the TAGFILES
+    config_overrides = config_overrides or {}
+    xml_dir = os.path.join(build_dir, config_overrides.get('XML_OUTPUT', 'xml'))
+    os.makedirs(xml_dir, exist_ok=True)
+    if 'INPUT' in config_overrides:
+        headers = re.findall(r'"([^"]+)"', config_overrides['INPUT'])
+    else:
+        with open(doxyfile) as f:
+            headers = [os.path.join(doxy_env['PROJECT_PATH'], path) for path in re.findall(r'\$\(PROJECT_PATH\)/(\S+)', f.read())]
+
+    contents = {}
+    for header in headers:
+        with open(header) as f:
+            contents[header] = f.read()
+    declared = {name: '' for content in contents.values() for name in re.findall(r'struct (\w+) {', content)}
+    for tag_path in re.findall(r'"([^"]+)"', config_overrides.get('TAGFILES', '')):
+        with open(tag_path) as f:
+            declared = dict({name: ' external="{}"'.format(tag_path) for name in f.read().split()}, **declared)
+
+    index = []
+    with open(logfile, 'w') as log:
+        for header, content in contents.items():
+            file_id = os.path.basename(header).replace('.h', '_8h')
+            structs = re.findall(r'struct (\w+) {', content)
+            inner = ''.join('<innerclass refid="struct{0}">{0}</innerclass>'.format(name) for name in structs)
+            refs = ''.join('<ref refid="struct{0}" kindref="compound"{1}>{0}</ref>'.format(name, declared[name])
+                           for name in re.findall(r'struct (\w+) \*', content) if name in declared)
+            with open(os.path.join(xml_dir, file_id + '.xml'), 'w') as f:
+                f.write('<doxygen><compounddef id="{}" kind="file">{}{}</compounddef></doxygen>'.format(file_id, inner, refs))
+            index.append('<compound refid="{}" kind="file"><name>{}</name></compound>'.format(file_id, os.path.basename(header)))
+            for name in structs:
+                with open(os.path.join(xml_dir, 'struct{}.xml'.format(name)), 'w') as f:
+                    f.write('<doxygen><compounddef id="struct{}" kind="struct"/></doxygen>'.format(name))
+                index.append('<compound refid="struct{0}" kind="struct"><name>{0}</name></compound>'.format(name))
+            log.write('{}:1: warning: {}\n'.format(header, os.path.basename(header)))
+
+    with open(os.path.join(xml_dir, 'index.xml'), 'w') as f:
+        f.write('<doxygenindex>{}</doxygenindex>'.format(''.join(index)))
+
+    tag_path = config_overrides.get('GENERATE_TAGFILE', '').strip('"')
+    if tag_path:
+        with open(os.path.join(build_dir, tag_path), 'w') as f:
+            f.write(' '.join(declared))
+
+
 class TestGetApiName(unittest.TestCase):
 
     def test_simple_header(self):
@@ -51,6 +105,49 @@ class TestHeaderToXmlPath(unittest.TestCase):
         self.assertTrue(result.endswith('_8hpp.xml'))
 
 
+UART_XML = """<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygen version="1.9.1">
+  <compounddef id="uart_8h" kind="file" language="C++">
+    <compoundname>uart.h</compoundname>
+    <innerclass refid="structuart__config__t" prot="public">uart_config_t</innerclass>
+    <innerclass refid="unionuart__data__t" prot="public">uart_data_t</innerclass>
+    <innerclass refid="structuart__data__t_1_1bits" prot="public">uart_data_t::bits</innerclass>
+    <sectiondef kind="define">
+      <memberdef kind="define" id="uart_8h_1a1"><name>UART_FIFO_LEN</name></memberdef>
+    </sectiondef>
+    <sectiondef kind="func">
+      <memberdef kind="function" id="uart_8h_1a2"><type>esp_err_t</type><name>uart_driver_install</name>
+        <detaileddescription><para>Install <ref refid="uart_8h_1a3">uart_driver_delete</ref> later</para></detaileddescription>
+      </memberdef>
+      <memberdef kind="function" id="uart_8h_1a3"><type>esp_err_t</type><name>uart_driver_delete</name></memberdef>
+    </sectiondef>
+    <sectiondef kind="var">
+      <memberdef kind="variable" id="uart_8h_1a4"><name>uart_count</name></memberdef>
+    </sectiondef>
+  </compounddef>
+</doxygen>
+"""
+
+
+class TestGetApiDirectives(unittest.TestCase):
+
+    def test_all_kinds_in_order(self):
+        with tempfile.TemporaryDirectory() as d:
+            xml_file_path = os.path.join(d, 'uart_8h.xml')
+            with open(xml_file_path, 'w') as f:
+                f.write(UART_XML)
+
+            self.assertEqual(get_api_directives(xml_file_path),
+                             get_rst_header('Functions')
+                             + '.. doxygenfunction:: uart_driver_install\n.. doxygenfunction:: uart_driver_delete\n\n'
+                             + get_rst_header('Unions')
+                             + '.. doxygenunion:: uart_data_t\n\n'
+                             + get_rst_header('Structures')
+                             + '.. doxygenstruct:: uart_config_t\n    :members:\n\n\n'
+                             + get_rst_header('Macros')
+                             + '.. doxygendefine:: UART_FIFO_LEN\n\n')
+
+
 class TestFindDoxygenDir(unittest.TestCase):
 
     def test_doxyfile_in_dir(self):
@@ -153,6 +250,32 @@ class TestConvertApiXmlToInc(unittest.TestCase):
             inc_file_path=os.path.join(build_dir, 'inc', 'uart.inc'),
         )
 
+    @patch('esp_docs.esp_extensions.run_doxygen.get_header_paths')
+    def test_parallel_jobs_generate_same_output(self, mock_get_header_paths):
+        outputs = []
+        for jobs in [1, 2]:
+            with tempfile.TemporaryDirectory() as build_dir:
+                os.makedirs(os.path.join(build_dir, 'xml'))
+                api_paths = [self.make_api_path(build_dir, 'components/driver/include/driver/{}.h'.format(name)) for name in ['uart', 'spi']]
+                for api_path in api_paths:
+                    api_path.xml_file_path = api_path.xml_file_path.replace('uart_8h', os.path.basename(api_path.header_path).replace('.h', '_8h'))
+                    api_path.inc_file_path = api_path.xml_file_path.replace('.xml', '.inc')
+                    with open(api_path.xml_file_path, 'w') as f:
+                        f.write(UART_XML)
+                mock_get_header_paths.return_value = api_paths
+
+                app = self.make_app(build_dir)
+                app.parallel = jobs
+                app.config.run_doxygen_header_edit_callback = None
+                convert_api_xml_to_inc(app, [])
+
+                for api_path in api_paths:
+                    with open(api_path.inc_file_path, 'r', encoding='utf-8') as inc_file:
+                        outputs.append(inc_file.read())
+
+        self.assertIn('.. doxygenfunction:: uart_driver_install', outputs[0])
+        self.assertEqual(outputs[:2], outputs[2:])
+
     @patch('esp_docs.esp_extensions.run_doxygen.generate_directives', return_value='generated rst')
     @patch('esp_docs.esp_extensions.run_doxygen.get_header_paths')
     def test_fast_build_without_modified_files_blanks_output(self, mock_get_header_paths, mock_generate_directives):
@@ -213,5 +336,162 @@ class TestConvertApiXmlToInc(unittest.TestCase):
             mock_generate_directives.assert_called_once()
 
 
+@patch('esp_docs.esp_extensions.run_doxygen.run_doxygen', side_effect=fake_doxygen)
+class TestIncrementalDoxygen(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.project_path = os.path.join(self.temp_dir.name, 'project')
+        self.build_dir = os.path.join(self.temp_dir.name, 'build')
+        os.makedirs(self.build_dir)
+        self.doxyfile = os.path.join(self.temp_dir.name, 'Doxyfile')
+        with open(self.doxyfile, 'w') as f:
+            f.write('INPUT = \\\n    $(PROJECT_PATH)/components/uart/include/uart.h \\\n    $(PROJECT_PATH)/components/spi/include/spi.h\n\n')
+        self.write_header('uart', 'void uart_init(void);\n')
+        self.write_header('spi', 'struct spi_config { int mode; };\n')
+        self.app = SimpleNamespace(config=SimpleNamespace(build_dir=self.build_dir, project_path=self.project_path, idf_target=None))
+        self.doxy_env = {'ENV_DOXYGEN_DEFINES': 'SOC_UART_NUM=3', 'PROJECT_PATH': self.project_path}
+        self.logfile = os.path.join(self.build_dir, 'doxygen-warning-log.txt')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_header(self, component, content):
+        path = os.path.join(self.project_path, 'components', component, 'include', component + '.h')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def run_incremental(self):
+        return run_doxygen_incremental(self.app, self.doxyfile, [self.doxyfile], self.doxy_env, self.logfile)
+
+    def read_index_refids(self):
+        with open(os.path.join(self.build_dir, 'xml', 'index.xml')) as f:
+            return re.findall(r'refid="(\w+)"', f.read())
+
+    def read_xml(self, name):
+        with open(os.path.join(self.build_dir, 'xml', name)) as f:
+            return f.read()
+
+    def test_first_build_is_full(self, mock_run_doxygen):
+        self.assertIsNone(self.run_incremental())
+        mock_run_doxygen.assert_called_once_with(self.doxyfile, self.doxy_env, self.build_dir, self.logfile,
+                                                 {'GENERATE_TAGFILE': '"{}"'.format(os.path.join(self.build_dir, 'doxygen.tag'))})
+
+    def test_unchanged_headers_skip_doxygen(self, mock_run_doxygen):
+        self.run_incremental()
+        self.assertEqual(self.run_incremental(), ([], []))
+        self.assertEqual(mock_run_doxygen.call_count, 1)
+
+    def test_changed_header_runs_partial_doxygen(self, mock_run_doxygen):
+        self.write_header('uart', 'struct uart_config { int baud; };\n')
+        self.run_incremental()
+        self.write_header('uart', 'struct uart_config { int baud; int parity; };\n')
+
+        self.assertEqual(self.run_incremental(), (['structuart_config.xml', 'uart_8h.xml', 'index.xml'], []))
+        self.assertIn('"{}"'.format(os.path.join(self.project_path, 'components', 'uart', 'include', 'uart.h')),
+                      mock_run_doxygen.call_args[0][4]['INPUT'])
+        self.assertNotIn('spi.h', mock_run_doxygen.call_args[0][4]['INPUT'])
+        self.assertEqual(self.read_index_refids(), ['uart_8h', 'structuart_config', 'spi_8h', 'structspi_config'])
+
+    def test_references_to_unchanged_headers_are_kept(self, mock_run_doxygen):
+        self.write_header('uart', 'void uart_init(struct spi_config *spi);\n')
+        self.run_incremental()
+        self.write_header('uart', 'void uart_init(struct spi_config *spi, int baud);\n')
+
+        self.assertEqual(self.run_incremental(), (['uart_8h.xml', 'index.xml'], []))
+        self.assertIn('<ref refid="structspi_config" kindref="compound">', self.read_xml('uart_8h.xml'))
+
+    def test_unresolved_references_run_full_doxygen(self, mock_run_doxygen):
+        self.write_header('uart', 'void uart_init(struct spi_config *spi);\n')
+        self.run_incremental()
+        # Declarations missing from the tag file
+        open(os.path.join(self.build_dir, 'doxygen.tag'), 'w').close()
+        self.write_header('uart', 'void uart_init(struct spi_config *spi, int baud);\n')
+
+        self.assertIsNone(self.run_incremental())
+        self.assertIn('<ref refid="structspi_config" kindref="compound">', self.read_xml('uart_8h.xml'))
+
+    def test_removed_struct_runs_full_doxygen(self, mock_run_doxygen):
+        self.run_incremental()
+        self.write_header('spi', 'void spi_init(void);\n')
+
+        # Other headers may refer to the struct
+        self.assertIsNone(self.run_incremental())
+        self.assertEqual(self.read_index_refids(), ['uart_8h', 'spi_8h'])
+        self.assertEqual(mock_run_doxygen.call_count, 3)
+
+    def test_added_struct_runs_full_doxygen(self, mock_run_doxygen):
+        self.run_incremental()
+        self.write_header('uart', 'struct uart_config { int baud; };\n')
+
+        self.assertIsNone(self.run_incremental())
+        self.assertEqual(self.read_index_refids(), ['uart_8h', 'structuart_config', 'spi_8h', 'structspi_config'])
+
+    def test_missing_doxyfile_in_config_hash(self, mock_run_doxygen):
+        self.assertNotEqual(doxygen_config_hash([self.doxyfile, self.doxyfile + '_esp32'], self.doxy_env),
+                            doxygen_config_hash([self.doxyfile], self.doxy_env))
+
+    def test_warnings_of_unchanged_headers_are_kept(self, mock_run_doxygen):
+        self.run_incremental()
+        self.write_header('uart', 'void uart_deinit(void);\n')
+        self.run_incremental()
+
+        with open(self.logfile) as f:
+            warnings = f.read().splitlines()
+        self.assertEqual(sorted(line.rsplit(' ', 1)[1] for line in warnings), ['spi.h', 'uart.h'])
+
+    def test_changed_defines_run_full_doxygen(self, mock_run_doxygen):
+        self.run_incremental()
+        self.doxy_env['ENV_DOXYGEN_DEFINES'] = 'SOC_UART_NUM=2'
+
+        self.assertIsNone(self.run_incremental())
+        self.assertEqual(mock_run_doxygen.call_count, 2)
+        self.assertNotIn('INPUT', mock_run_doxygen.call_args[0][4])
+
+
+@unittest.skipIf(fcntl is None, 'Doxygen output is only shared on POSIX systems')
+@patch('esp_docs.esp_extensions.run_doxygen.run_doxygen', side_effect=fake_doxygen)
+class TestSharedDoxygen(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.project_path = os.path.join(self.temp_dir.name, 'project')
+        self.shared_dir = os.path.join(self.temp_dir.name, '_build', 'doxygen_cache')
+        self.doxyfile = os.path.join(self.temp_dir.name, 'Doxyfile')
+        with open(self.doxyfile, 'w') as f:
+            f.write('INPUT = \\\n    $(PROJECT_PATH)/components/uart/include/uart.h\n\n')
+        header = os.path.join(self.project_path, 'components', 'uart', 'include', 'uart.h')
+        os.makedirs(os.path.dirname(header))
+        with open(header, 'w') as f:
+            f.write('struct uart_config { int baud; };\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_shared(self, language, target):
+        build_dir = os.path.join(self.temp_dir.name, '_build', language, target)
+        os.makedirs(build_dir, exist_ok=True)
+        app = SimpleNamespace(config=SimpleNamespace(build_dir=build_dir, project_path=self.project_path, idf_target=target))
+        doxy_env = {'ENV_DOXYGEN_DEFINES': 'IDF_TARGET_{}=1'.format(target.upper()), 'PROJECT_PATH': self.project_path, 'IDF_TARGET': target}
+        run_doxygen_shared(app, self.shared_dir, self.doxyfile, [self.doxyfile], doxy_env, os.path.join(build_dir, 'doxygen-warning-log.txt'))
+        return build_dir
+
+    def test_languages_share_output(self, mock_run_doxygen):
+        self.run_shared('en', 'esp32')
+        build_dir = self.run_shared('zh_CN', 'esp32')
+
+        self.assertEqual(mock_run_doxygen.call_count, 1)
+        self.assertEqual(sorted(os.listdir(os.path.join(build_dir, 'xml'))), ['index.xml', 'structuart_config.xml', 'uart_8h.xml'])
+        with open(os.path.join(build_dir, 'doxygen-warning-log.txt')) as f:
+            self.assertIn('warning: uart.h', f.read())
+
+    def test_targets_do_not_share_output(self, mock_run_doxygen):
+        self.run_shared('en', 'esp32')
+        self.run_shared('en', 'esp32s2')
+
+        self.assertEqual(mock_run_doxygen.call_count, 2)
+
+
 if __name__ == '__main__':
     unittest.main()
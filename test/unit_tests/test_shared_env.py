@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from sphinx.application import Sphinx
+from sphinx.util import tags
+from esp_docs.build_docs import seed_doctrees
+from esp_docs.esp_extensions import shared_env
+from esp_docs.esp_extensions.format_esp_target import StringSubstituter
+
+
+BREATHE_CONF = """
+extensions = ['breathe', 'esp_docs.esp_extensions.shared_env']
+breathe_default_project = 'api'
+
+
+def setup(app):
+    app.add_config_value('idf_target', None, 'env')
+    app.add_config_value('build_dir', None, 'env')
+"""
+
+DOXYGEN_INDEX = """<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygenindex version="1.9.1">
+  <compound refid="uart_8h" kind="file"><name>uart.h</name>
+    <member refid="uart_8h_1a0" kind="function"><name>uart_init</name></member>
+  </compound>
+</doxygenindex>
+"""
+
+DOXYGEN_HEADER = """<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygen version="1.9.1">
+  <compounddef id="uart_8h" kind="file" language="C++">
+    <compoundname>uart.h</compoundname>
+    <sectiondef kind="func">
+      <memberdef kind="function" id="uart_8h_1a0" prot="public" static="no" const="no" explicit="no" inline="no" virt="non-virtual">
+        <type>void</type>
+        <definition>void uart_init</definition>
+        <argsstring>(void)</argsstring>
+        <name>uart_init</name>
+        <briefdescription><para>Initialize the UART of the {}.</para></briefdescription>
+        <detaileddescription></detaileddescription>
+        <location file="uart.h" line="1"/>
+      </memberdef>
+    </sectiondef>
+    <briefdescription></briefdescription>
+    <detaileddescription></detaileddescription>
+    <location file="uart.h"/>
+  </compounddef>
+</doxygen>
+"""
+
+
+class TestSharedEnvBreathe(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src_dir = os.path.join(self.temp_dir.name, 'en')
+        os.makedirs(self.src_dir)
+        for name, content in [('conf.py', BREATHE_CONF), ('index.rst', 'Index\n=====\n\n.. toctree::\n\n    api\n'),
+                              ('api.rst', 'API\n===\n\n.. doxygenfunction:: uart_init\n')]:
+            with open(os.path.join(self.src_dir, name), 'w') as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _build(self, target):
+        build_dir = os.path.join(self.temp_dir.name, '_build', 'en', target)
+        xml_dir = os.path.join(build_dir, 'xml')
+        os.makedirs(xml_dir)
+        with open(os.path.join(xml_dir, 'index.xml'), 'w') as f:
+            f.write(DOXYGEN_INDEX)
+        with open(os.path.join(xml_dir, 'uart_8h.xml'), 'w') as f:
+            f.write(DOXYGEN_HEADER.format(target.upper()))
+
+        seed_doctrees(os.path.join(self.temp_dir.name, '_build', 'en', 'esp32', 'doctrees'), os.path.join(build_dir, 'doctrees'))
+        app = Sphinx(self.src_dir, self.src_dir, os.path.join(build_dir, 'html'), os.path.join(build_dir, 'doctrees'), 'html',
+                     confoverrides={'idf_target': target, 'build_dir': build_dir, 'shared_env': True, 'breathe_projects': {'api': xml_dir}},
+                     status=None, warning=None)
+        app.build()
+
+        with open(os.path.join(build_dir, 'html', 'api.html')) as f:
+            return app, f.read()
+
+    def test_breathe_docs_are_not_shared(self):
+        self._build('esp32')
+        app, html = self._build('esp32s2')
+
+        self.assertIn('Initialize the UART of the ESP32S2.', html)
+        self.assertIsNone(app.env.shared_env_fingerprints['api'])
+        self.assertIsNotNone(app.env.shared_env_fingerprints['index'])
+
+
+class TestSharedEnv(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src_dir = os.path.join(self.temp_dir.name, 'en')
+        self.build_dir = os.path.join(self.temp_dir.name, '_build', 'en', 'esp32s2')
+        self.doctree_dir = os.path.join(self.build_dir, 'doctrees')
+        os.makedirs(self.src_dir)
+        os.makedirs(self.doctree_dir)
+
+        self.env = SimpleNamespace(dependencies={}, doctreedir=self.doctree_dir,
+                                   doc2path=lambda docname: os.path.join(self.src_dir, docname + '.rst'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write_doc(self, docname, content):
+        with open(os.path.join(self.src_dir, docname + '.rst'), 'w') as f:
+            f.write(content)
+        open(os.path.join(self.doctree_dir, docname + '.doctree'), 'w').close()
+
+    def _make_app(self, target):
+        substituter = StringSubstituter()
+        config = MagicMock()
+        config.idf_target = target
+        config.build_dir = self.build_dir
+        substituter.init_sub_strings(config)
+
+        return SimpleNamespace(srcdir=self.src_dir, tags=tags.Tags([target]), esp_target_substituter=substituter,
+                               config=SimpleNamespace(idf_target=target, build_dir=self.build_dir, shared_env=True))
+
+    def _fingerprint(self, target, docname):
+        return shared_env.doc_fingerprint(self._make_app(target), self.env, docname)
+
+    def test_target_independent_doc_is_shared(self):
+        self._write_doc('index', 'Plain text without any target specific content\n')
+        self.assertEqual(self._fingerprint('esp32', 'index'), self._fingerprint('esp32s2', 'index'))
+
+    def test_target_substitution_changes_fingerprint(self):
+        self._write_doc('index', 'This is {IDF_TARGET_NAME}\n')
+        self.assertNotEqual(self._fingerprint('esp32', 'index'), self._fingerprint('esp32s2', 'index'))
+
+    def test_only_directive_changes_fingerprint(self):
+        self._write_doc('index', '.. only:: esp32\n\n    Only for ESP32\n')
+        self.assertNotEqual(self._fingerprint('esp32', 'index'), self._fingerprint('esp32s2', 'index'))
+
+    def test_toctree_filter_changes_fingerprint(self):
+        self._write_doc('index', '.. toctree::\n\n    :esp32: esp32_page\n    other_page\n')
+        self.assertNotEqual(self._fingerprint('esp32', 'index'), self._fingerprint('esp32s2', 'index'))
+
+    def test_build_dir_include_is_not_shared(self):
+        self._write_doc('index', '.. include-build-file:: inc/uart.inc\n')
+        self.env.dependencies['index'] = {os.path.relpath(os.path.join(self.build_dir, 'inc', 'uart.inc'), self.src_dir)}
+        self.assertIsNone(self._fingerprint('esp32', 'index'))
+
+    def test_skip_unchanged_docs(self):
+        self._write_doc('plain', 'Plain text\n')
+        self._write_doc('target', 'This is {IDF_TARGET_NAME}\n')
+
+        self.env.shared_env_target = 'esp32'
+        self.env.shared_env_fingerprints = {'plain': self._fingerprint('esp32', 'plain'),
+                                            'target': self._fingerprint('esp32', 'target')}
+
+        docnames = ['plain', 'target']
+        shared_env.skip_unchanged_docs(self._make_app('esp32s2'), self.env, docnames)
+
+        self.assertEqual(docnames, ['target'])
+
+    def test_no_skip_without_seed(self):
+        self._write_doc('plain', 'Plain text\n')
+        docnames = ['plain']
+        shared_env.skip_unchanged_docs(self._make_app('esp32s2'), self.env, docnames)
+        self.assertEqual(docnames, ['plain'])
+
+
+if __name__ == '__main__':
+    unittest.main()
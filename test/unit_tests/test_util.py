@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from esp_docs.util import util
+from esp_docs.util.util import FileManifest, call_with_python_cached, copy_if_modified, files_equal, inputs_fingerprint, store_cached_file, sync_tree
+
+
+class TestFileManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.temp_dir.name, util.MANIFEST_FILE)
+        self.inc_path = os.path.join(self.temp_dir.name, 'uart.inc')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_write_if_modified(self):
+        manifest = FileManifest(self.manifest_path)
+        self.assertTrue(manifest.write_if_modified(self.inc_path, 'API reference\n'))
+        self.assertFalse(manifest.write_if_modified(self.inc_path, 'API reference\n'))
+        self.assertTrue(manifest.write_if_modified(self.inc_path, 'Updated API reference\n'))
+
+        with open(self.inc_path) as f:
+            self.assertEqual(f.read(), 'Updated API reference\n')
+
+    def test_unchanged_file_is_not_read_again(self):
+        manifest = FileManifest(self.manifest_path)
+        manifest.write_if_modified(self.inc_path, 'API reference\n')
+        manifest.save()
+
+        with patch('esp_docs.util.util.hash_file') as mock_hash_file:
+            self.assertFalse(FileManifest(self.manifest_path).write_if_modified(self.inc_path, 'API reference\n'))
+        mock_hash_file.assert_not_called()
+
+    def test_file_modified_outside_manifest(self):
+        manifest = FileManifest(self.manifest_path)
+        manifest.write_if_modified(self.inc_path, 'API reference\n')
+        with open(self.inc_path, 'w') as f:
+            f.write('Edited by hand\n')
+
+        self.assertTrue(manifest.write_if_modified(self.inc_path, 'API reference\n'))
+
+    def test_concurrent_save(self):
+        manifest = FileManifest(self.manifest_path)
+        errors = []
+
+        def generate(name):
+            try:
+                for i in range(50):
+                    manifest.write_if_modified(os.path.join(self.temp_dir.name, '{}_{}.inc'.format(name, i)), 'API reference\n')
+                    manifest.save()
+            except OSError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=generate, args=(name,)) for name in ['kconfig', 'esp_err', 'idf_tools', 'version']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(FileManifest(self.manifest_path).entries), 200)
+
+
+class TestCopyIfModified(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src_dir = os.path.join(self.temp_dir.name, 'xml')
+        self.dst_dir = os.path.join(self.temp_dir.name, 'xml_in')
+        os.makedirs(os.path.join(self.src_dir, 'sub'))
+        for name, content in [('index.xml', '<index/>'), ('sub/uart_8h.xml', '<uart/>')]:
+            with open(os.path.join(self.src_dir, name), 'w') as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_copies_tree(self):
+        copy_if_modified(self.src_dir, self.dst_dir)
+        self.assertTrue(files_equal(os.path.join(self.src_dir, 'sub', 'uart_8h.xml'), os.path.join(self.dst_dir, 'sub', 'uart_8h.xml')))
+
+    def test_unchanged_files_are_not_copied(self):
+        copy_if_modified(self.src_dir, self.dst_dir)
+
+        with patch('shutil.copy') as mock_copy:
+            copy_if_modified(self.src_dir, self.dst_dir)
+        mock_copy.assert_not_called()
+
+    def test_modified_file_is_copied(self):
+        copy_if_modified(self.src_dir, self.dst_dir)
+        with open(os.path.join(self.src_dir, 'index.xml'), 'w') as f:
+            f.write('<index version="2"/>')
+
+        copy_if_modified(self.src_dir, self.dst_dir)
+
+        with open(os.path.join(self.dst_dir, 'index.xml')) as f:
+            self.assertEqual(f.read(), '<index version="2"/>')
+
+
+class TestSyncTree(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src_dir = os.path.join(self.temp_dir.name, 'xml')
+        self.dst_dir = os.path.join(self.temp_dir.name, 'xml_in')
+        self._write(self.src_dir, 'index.xml', '<index/>')
+        self._write(self.src_dir, 'sub/uart_8h.xml', '<uart/>')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, directory, rel_path, content):
+        path = os.path.join(directory, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_copy_keeps_mtime(self):
+        self.assertEqual(sorted(sync_tree(self.src_dir, self.dst_dir)[0]), ['index.xml', os.path.join('sub', 'uart_8h.xml')])
+        self.assertEqual(os.stat(os.path.join(self.src_dir, 'index.xml')).st_mtime_ns, os.stat(os.path.join(self.dst_dir, 'index.xml')).st_mtime_ns)
+        self.assertEqual(sync_tree(self.src_dir, self.dst_dir), ([], []))
+
+    def test_regenerated_file_with_same_content_is_not_copied(self):
+        sync_tree(self.src_dir, self.dst_dir)
+        path = self._write(self.src_dir, 'index.xml', '<index/>')
+        os.utime(path, ns=(0, 0))
+
+        self.assertEqual(sync_tree(self.src_dir, self.dst_dir), ([], []))
+
+    def test_same_size_different_content_is_copied(self):
+        sync_tree(self.src_dir, self.dst_dir)
+        path = self._write(self.src_dir, 'index.xml', '<INDEX/>')
+        os.utime(path, ns=(0, 0))
+
+        self.assertEqual(sync_tree(self.src_dir, self.dst_dir), (['index.xml'], []))
+        with open(os.path.join(self.dst_dir, 'index.xml')) as f:
+            self.assertEqual(f.read(), '<INDEX/>')
+
+    def test_delete_stale(self):
+        self._write(self.dst_dir, 'structold.xml', '<old/>')
+
+        self.assertEqual(sync_tree(self.src_dir, self.dst_dir)[1], [])
+        self.assertEqual(sync_tree(self.src_dir, self.dst_dir, delete_stale=True)[1], ['structold.xml'])
+        self.assertFalse(os.path.exists(os.path.join(self.dst_dir, 'structold.xml')))
+
+
+class TestCallWithPythonCached(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.project_path = os.path.join(self.temp_dir.name, 'idf')
+        self.cache_dir = os.path.join(self.temp_dir.name, 'generator_cache')
+        self._write('tools/gen_errors.py', 'import sys\nwith open(sys.argv[1], "w") as f:\n    f.write(open(sys.argv[2]).read())\n')
+        self._write('components/esp_common/esp_err.h', '#define ESP_FAIL -1\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, rel_path, content):
+        path = os.path.join(self.project_path, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _generate(self, output_name):
+        output_path = os.path.join(self.temp_dir.name, output_name)
+        cmd = '{0}/tools/gen_errors.py {{output}} {0}/components/esp_common/esp_err.h'.format(self.project_path)
+        with patch('esp_docs.util.util.call_with_python', wraps=util.call_with_python) as mock_call:
+            call_with_python_cached(cmd, output_path, ['tools/gen_errors.py', 'components/**/*.h'], self.project_path, self.cache_dir)
+
+        with open(output_path) as f:
+            return f.read(), mock_call.call_count
+
+    def test_unchanged_inputs_are_not_regenerated(self):
+        self.assertEqual(self._generate('esp_err_defs.inc'), ('#define ESP_FAIL -1\n', 1))
+        self.assertEqual(self._generate('esp_err_defs.inc'), ('#define ESP_FAIL -1\n', 0))
+
+    def test_modified_input_is_regenerated(self):
+        self._generate('esp_err_defs.inc')
+        self._write('components/esp_common/esp_err.h', '#define ESP_FAIL -1\n#define ESP_OK 0\n')
+
+        self.assertEqual(self._generate('esp_err_defs.inc'), ('#define ESP_FAIL -1\n#define ESP_OK 0\n', 1))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_generated_headers_are_not_inputs(self):
+        self._generate('esp_err_defs.inc')
+        # Written by each build of the documentation
+        self._write('docs/_build/en/esp32/build/config/sdkconfig.h', '#define CONFIG_IDF_TARGET "esp32"\n')
+
+        self.assertEqual(self._generate('esp_err_defs.inc'), ('#define ESP_FAIL -1\n', 0))
+
+    def test_fingerprint_skips_removed_files(self):
+        header_path = os.path.join(self.project_path, 'components/esp_common/esp_err.h')
+        fingerprint = inputs_fingerprint(self.project_path, ['tools/gen_errors.py'])
+        with patch('glob.glob', return_value=[os.path.join(self.project_path, 'tools/gen_errors.py'), header_path + '.removed']):
+            self.assertEqual(inputs_fingerprint(self.project_path, ['tools/gen_errors.py']), fingerprint)
+
+    def test_extra_env_is_only_set_for_the_script(self):
+        self._write('tools/gen_env.py', 'import os, sys\nwith open(sys.argv[1], "w") as f:\n    f.write(os.environ.get("IDF_MAINTAINER", "unset"))\n')
+        output_path = os.path.join(self.temp_dir.name, 'tools.rst')
+        cmd = '{}/tools/gen_env.py {{output}}'.format(self.project_path)
+        call_with_python_cached(cmd, output_path, ['tools/gen_env.py'], self.project_path, self.cache_dir, extra_env={'IDF_MAINTAINER': '1'})
+
+        with open(output_path) as f:
+            self.assertEqual(f.read(), '1')
+        self.assertNotIn('IDF_MAINTAINER', os.environ)
+
+    def test_store_leaves_other_builds_alone(self):
+        output_path = os.path.join(self.temp_dir.name, 'esp_err_defs.inc')
+        with open(output_path, 'w') as f:
+            f.write('#define ESP_FAIL -1\n')
+        os.makedirs(self.cache_dir)
+        # Being written by another build
+        other_tmp_path = os.path.join(self.cache_dir, 'esp_err_defs.inc-1234.inc.abcd.tmp')
+        open(other_tmp_path, 'w').close()
+
+        real_remove = os.remove
+
+        def remove(path):
+            # Stale entry removed by another build in the meantime
+            real_remove(path)
+            raise FileNotFoundError(path)
+
+        open(os.path.join(self.cache_dir, 'esp_err_defs.inc-1234'), 'w').close()
+        with patch('os.remove', side_effect=remove):
+            store_cached_file(output_path, os.path.join(self.cache_dir, 'esp_err_defs.inc-5678'), 'esp_err_defs.inc-')
+
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['esp_err_defs.inc-1234.inc.abcd.tmp', 'esp_err_defs.inc-5678'])
+
+
+if __name__ == '__main__':
+    unittest.main()